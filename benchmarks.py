@@ -0,0 +1,409 @@
+"""
+Benchmarks of the estimations.
+
+    python benchmarks.py run                                   # run all benchmarks and print the timings
+    python benchmarks.py run --max-size 1e5 --filter tax       # only small sizes of the tax benchmarks
+    python benchmarks.py run --save-baseline                   # run and save the timings as baseline
+    python benchmarks.py run --baseline benchmark_baseline.json --threshold 0.25
+    python benchmarks.py startup                               # cold start of cli.py, compared against the same baseline
+
+Every benchmark covers one hot path for a range of input sizes, from the 30 bins of the income distribution up to 10M individuals.
+The timings of a run can be saved as a JSON baseline, and later runs are compared against it: a benchmark whose minimum time grew by more
+than the threshold is flagged as regression and the exit code is 1. Baselines depend on the machine, so they should only be compared on the
+machine they were recorded on. The default baseline benchmark_baseline.json in the repository directory is therefore ignored by git and not
+meant to be committed, every machine keeps its own.
+
+The startup benchmark measures the cold start of the command line entry point (cli.py) in fresh Python processes. Compute-only
+subcommands must not import matplotlib, so their start should stay well below the one of the plot subcommand. Its timings are saved to and
+compared against the baseline in the same way as the ones of the run benchmarks.
+"""
+
+import numpy as np
+
+import os
+import sys
+import json
+import time
+import timeit
+import itertools
+import logging
+import argparse
+import platform
+import tempfile
+import subprocess
+
+from tax_autonomy_estimations import (IncomeDistribution, TaxCalculator, calculate_compound_capital_growth, calculate_income_support,
+                                      calculate_income_support_batched, calculate_number_of_years, calculate_number_of_years_batched,
+                                      calculate_years_to_reach_capital)
+
+
+repository_directory = os.path.dirname(os.path.abspath(__file__))
+
+default_baseline_path = os.path.join(repository_directory, "benchmark_baseline.json")
+
+# Input sizes of the array benchmarks, from the bins of a distribution to a population of individuals
+default_sizes = [30, 1_000, 100_000, 1_000_000, 10_000_000]
+
+# Scenario of the __main__ block of tax_autonomy_estimations
+annual_income_cap = 100e3
+number_of_citizens = 83e6
+economy_subsidy = 1000e9
+interest_rate_low_risk = 0.05
+interest_rates = [0.07, 0.14]
+
+
+def get_income_distribution() -> list:
+    return IncomeDistribution.cutoff_income_distribution(IncomeDistribution.income_distribution_germany_annual_pretax_2025, 20e3)
+
+
+def get_annual_incomes(size: int, seed: int = 0) -> np.ndarray:
+    """
+    Get reproducible annual incomes between 0 and 300k EUR.
+    """
+
+    return np.random.default_rng(seed).uniform(0, 300e3, size)
+
+
+def get_binned_distribution(size: int) -> np.ndarray:
+    """
+    Get an income distribution with the given number of bins as array of [income, probability] rows.
+    """
+
+    annual_incomes = np.linspace(5e3, 500e3, size)
+    probabilities = np.exp(-annual_incomes / 60e3)
+
+    return np.stack([annual_incomes, probabilities / probabilities.sum()], axis=1)
+
+
+def prepare_tax_scalar(size: int):
+    annual_incomes = get_annual_incomes(size).tolist()
+    return lambda: [TaxCalculator.calculate_german_income_tax(income) for income in annual_incomes]
+
+
+def prepare_tax_array(size: int):
+    annual_incomes = get_annual_incomes(size)
+    return lambda: TaxCalculator.calculate_german_income_tax(annual_incomes)
+
+
+def prepare_social_security_tax_array(size: int):
+    annual_incomes = get_annual_incomes(size)
+    return lambda: TaxCalculator.calculate_german_social_security_tax(annual_incomes)
+
+
+def prepare_pretax_inversion_distribution(size: int):
+    return lambda: IncomeDistribution.transform_distrubtion_to_annual_income()
+
+
+def prepare_pretax_inversion_array(size: int):
+    annual_incomes_net = TaxCalculator.calculcate_post_tax_income(get_annual_incomes(size))
+    return lambda: TaxCalculator.calculate_pretax_income(annual_incomes_net)
+
+
+def prepare_years_scalar(size: int):
+    annual_incomes = get_annual_incomes(size).tolist()
+    return lambda: [calculate_number_of_years(interest_rates[0], interest_rate_low_risk, income, annual_income_cap) for income in annual_incomes]
+
+
+def prepare_years_batched(size: int):
+    annual_incomes = get_annual_incomes(size)
+    return lambda: calculate_number_of_years_batched(interest_rates[0], interest_rate_low_risk, annual_incomes, annual_income_cap)
+
+
+def prepare_compound_capital_growth(size: int):
+    rng = np.random.default_rng(0)
+    annual_capital_increase = rng.uniform(0, 50e3, size)
+    years = rng.integers(0, 60, size)
+    return lambda: calculate_compound_capital_growth(annual_capital_increase, interest_rates[0], years, True)
+
+
+def prepare_income_support(size: int):
+    income_distribution = get_income_distribution()
+    return lambda: calculate_income_support(income_distribution, annual_income_cap, number_of_citizens, economy_subsidy)
+
+
+def prepare_income_support_batched(size: int):
+    income_distribution = get_binned_distribution(size)
+    annual_income_caps = np.linspace(50e3, 200e3, 16)
+    return lambda: calculate_income_support_batched(income_distribution, annual_income_caps, number_of_citizens, [0, 300e9, economy_subsidy])
+
+
+def prepare_scenario(size: int):
+    income_distribution = get_income_distribution()
+    return lambda: calculate_years_to_reach_capital(income_distribution, interest_rate_low_risk, interest_rates, annual_income_cap,
+                                                    number_of_citizens, economy_subsidy)
+
+
+def prepare_microsimulation(size: int):
+    from microsimulation import run_microsimulation
+
+    income_distribution = get_income_distribution()
+    return lambda: run_microsimulation(income_distribution, size, interest_rate_low_risk, interest_rates, annual_income_cap, number_of_citizens,
+                                       economy_subsidy)
+
+
+def prepare_sensitivity_samples(size: int):
+    from sensitivity_analysis import evaluate_parameter_samples, get_base_parameters
+
+    income_distribution = get_income_distribution()
+    base_parameters = get_base_parameters(annual_income_cap, economy_subsidy, interest_rates[0], interest_rate_low_risk, number_of_citizens)
+    samples = base_parameters * np.random.default_rng(0).uniform(0.9, 1.1, (size, len(base_parameters)))
+    return lambda: evaluate_parameter_samples(income_distribution, samples)
+
+
+def prepare_pipeline_change(size: int):
+    from pipeline import create_scenario_pipeline
+
+    pipeline = create_scenario_pipeline(get_income_distribution(), interest_rate_low_risk=interest_rate_low_risk, interest_rates=interest_rates,
+                                        annual_income_cap=annual_income_cap, number_of_citizens=number_of_citizens, economy_subsidy=economy_subsidy)
+    economy_subsidies = itertools.cycle([0.5 * economy_subsidy, economy_subsidy])
+
+    def change_economy_subsidy():
+        pipeline.set(economy_subsidy=next(economy_subsidies))
+        return pipeline.get("aggregates")
+
+    return change_economy_subsidy
+
+
+def prepare_cohort_simulation(size: int):
+    from cohort_simulation import simulate_cohort
+
+    income_distribution = get_binned_distribution(size)
+    return lambda: simulate_cohort(income_distribution, interest_rate_low_risk, interest_rates, annual_income_cap, number_of_citizens, economy_subsidy,
+                                   horizon=40)
+
+
+def prepare_scenario_metrics(size: int):
+    from metrics import calculate_scenario_metrics
+
+    income_distribution = get_binned_distribution(size)
+    annual_income_caps = np.linspace(50e3, 200e3, 16)
+    return lambda: calculate_scenario_metrics(income_distribution, annual_income_caps, number_of_citizens, [0, 300e9, economy_subsidy])
+
+
+def prepare_server_batch(size: int):
+    from scenario_server import ScenarioServer
+
+    scenario_server = ScenarioServer(get_income_distribution(), number_of_citizens, annual_income_cap, economy_subsidy, interest_rate_low_risk,
+                                     interest_rates)
+    annual_income_caps = np.random.default_rng(0).choice(np.linspace(50e3, 200e3, 16), size)
+    scenarios = [scenario_server.get_scenario({"query": ["years", "support", "metrics"][i % 3], "annual_income_cap": float(annual_income_cap)})
+                 for i, annual_income_cap in enumerate(annual_income_caps)]
+    return lambda: scenario_server.evaluate_batch(scenarios)
+
+
+# Name of the benchmark: (function that prepares the inputs of a size and returns the function to time, sizes)
+# The size is the number of incomes, bins or individuals. The inputs are prepared outside of the timing.
+benchmarks = {
+    "tax_scalar": (prepare_tax_scalar, [30, 1_000]),
+    "tax_array": (prepare_tax_array, default_sizes),
+    "social_security_tax_array": (prepare_social_security_tax_array, default_sizes),
+    "pretax_inversion_distribution": (prepare_pretax_inversion_distribution, [len(IncomeDistribution.income_distribution_germany_monthly_net_2025)]),
+    "pretax_inversion_array": (prepare_pretax_inversion_array, default_sizes),
+    "years_scalar": (prepare_years_scalar, [30, 1_000]),
+    "years_batched": (prepare_years_batched, default_sizes),
+    "compound_capital_growth": (prepare_compound_capital_growth, default_sizes),
+    "income_support": (prepare_income_support, [len(get_income_distribution())]),
+    "income_support_batched": (prepare_income_support_batched, default_sizes[:-1]),
+    "scenario": (prepare_scenario, [len(get_income_distribution())]),
+    "microsimulation": (prepare_microsimulation, default_sizes[2:]),
+    "sensitivity_samples": (prepare_sensitivity_samples, default_sizes[1:3]),
+    "pipeline_change": (prepare_pipeline_change, [len(get_income_distribution())]),
+    "cohort_simulation": (prepare_cohort_simulation, [30, 1_000, 10_000]),
+    "scenario_metrics": (prepare_scenario_metrics, default_sizes[:3]),
+    "server_batch": (prepare_server_batch, [1, 30, 1_000]),
+}
+
+
+def measure_function(function, repeats: int = 5) -> dict:
+    """
+    Measure the wall time of a function call. The number of calls per repeat is chosen such that a repeat takes at least 0.2 s
+    (see timeit.Timer.autorange).
+
+    params:
+        function: callable, function without arguments
+        repeats: int, number of repeats
+
+    returns:
+        timing: dict, minimum and median wall time per call in seconds and the number of calls per repeat
+    """
+
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+
+    wall_times = np.array(timer.repeat(repeats, number)) / number
+
+    return {"min": float(np.min(wall_times)), "median": float(np.median(wall_times)), "number": number}
+
+
+def run_benchmarks(names: list = None, max_size: int = None, repeats: int = 5) -> dict:
+    """
+    Run the benchmarks for all of their sizes.
+
+    params:
+        names: list, names of the benchmarks to run (see benchmarks), by default all
+        max_size: int, largest size to run, by default all sizes
+        repeats: int, number of repeats per benchmark and size
+
+    returns:
+        results: dict, timing (see measure_function) per benchmark and size, with keys like "tax_array[1000]"
+    """
+
+    results = {}
+
+    for name in names or benchmarks:
+        prepare, sizes = benchmarks[name]
+
+        for size in sizes:
+            if max_size is not None and size > max_size:
+                continue
+
+            results[f"{name}[{size}]"] = timing = measure_function(prepare(size), repeats)
+            logging.info(f"{name}[{size}]: median {timing['median']*1e3:.3f} ms, min {timing['min']*1e3:.3f} ms")
+
+    return results
+
+
+def compare_to_baseline(results: dict, baseline: dict, threshold: float = 0.25) -> dict:
+    """
+    Compare the timings of a run to a baseline. The minimum instead of the median time is compared, since it is the least affected by other
+    load on the machine.
+
+    params:
+        results: dict, timings as returned by run_benchmarks
+        baseline: dict, timings of the baseline in the same format
+        threshold: float, relative slowdown above which a benchmark is a regression, e.g. 0.25 for 25 %
+
+    returns:
+        comparison: dict, per benchmark of both runs the ratio of the minimum times (result / baseline) and whether it is a regression
+    """
+
+    return {key: {"ratio": timing["min"] / baseline[key]["min"],
+                  "regression": timing["min"] > baseline[key]["min"] * (1 + threshold)}
+            for key, timing in results.items() if key in baseline}
+
+
+def get_environment() -> dict:
+    return {"python": platform.python_version(), "numpy": np.__version__, "machine": platform.machine(), "processor": platform.processor(),
+            "cpu_count": os.cpu_count()}
+
+
+def measure_command(command: list, repeats: int = 5) -> dict:
+    """
+    Measure the wall time of a command in fresh processes.
+
+    params:
+        command: list, command and its arguments
+        repeats: int, number of runs
+
+    returns:
+        timing: dict, minimum and median wall time in seconds
+    """
+
+    wall_times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=repository_directory, check=True, stdout=subprocess.DEVNULL)
+        wall_times.append(time.perf_counter() - start)
+
+    return {"min": float(np.min(wall_times)), "median": float(np.median(wall_times))}
+
+
+def benchmark_startup(repeats: int = 5) -> dict:
+    """
+    Measure the cold start of the Python interpreter, of the imports and of the subcommands of cli.py.
+
+    params:
+        repeats: int, number of runs per command
+
+    returns:
+        timings: dict, timing (see measure_command) per command
+    """
+
+    with tempfile.TemporaryDirectory() as output_directory:
+        commands = {
+            "python": [sys.executable, "-c", "pass"],
+            "import_tax_autonomy_estimations": [sys.executable, "-c", "import tax_autonomy_estimations"],
+            "import_matplotlib_pyplot": [sys.executable, "-c", "import matplotlib.pyplot"],
+            "cli_years": [sys.executable, "cli.py", "years"],
+            "cli_invert": [sys.executable, "cli.py", "invert", "2000", "--monthly"],
+            "cli_plot": [sys.executable, "cli.py", "plot", "--output-directory", output_directory],
+        }
+
+        return {name: measure_command(command, repeats) for name, command in commands.items()}
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="run the benchmarks of the hot paths")
+    run_parser.add_argument("--filter", default="", help="only run the benchmarks whose name contains this text")
+    run_parser.add_argument("--max-size", type=float, default=None, help="largest input size to run")
+
+    startup_parser = subparsers.add_parser("startup", help="measure the cold start of cli.py")
+
+    # Both benchmarks are saved to and compared against the same baseline, the startup timings have keys like "startup[cli_years]"
+    for subparser in [run_parser, startup_parser]:
+        subparser.add_argument("--repeats", type=int, default=5)
+        subparser.add_argument("--output", default=None, help="save the timings of this run as JSON file")
+        subparser.add_argument("--baseline", default=default_baseline_path, help="JSON baseline to compare against, if it exists")
+        subparser.add_argument("--save-baseline", action="store_true", help="save the timings of this run as baseline")
+        subparser.add_argument("--threshold", type=float, default=0.25, help="relative slowdown that counts as regression")
+
+    arguments = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(funcName)s:  %(message)s')
+
+    if arguments.command == "startup":
+        results = {f"startup[{name}]": timing for name, timing in benchmark_startup(arguments.repeats).items()}
+
+        for key, timing in results.items():
+            logging.info(f"{key}: median {timing['median']*1e3:.1f} ms, min {timing['min']*1e3:.1f} ms")
+    else:
+        names = [name for name in benchmarks if arguments.filter in name]
+        max_size = int(arguments.max_size) if arguments.max_size is not None else None
+
+        results = run_benchmarks(names, max_size, arguments.repeats)
+
+    run = {"environment": get_environment(), "results": results}
+
+    if arguments.output:
+        with open(arguments.output, "w") as output_file:
+            json.dump(run, output_file, indent=2)
+
+    if arguments.save_baseline:
+        # Timings of benchmarks that were not part of this run are kept
+        baseline = {"environment": run["environment"], "results": {}}
+        if os.path.exists(arguments.baseline):
+            with open(arguments.baseline) as baseline_file:
+                baseline = json.load(baseline_file)
+
+        baseline["environment"] = run["environment"]
+        baseline["results"].update(run["results"])
+
+        with open(arguments.baseline, "w") as baseline_file:
+            json.dump(baseline, baseline_file, indent=2)
+
+        logging.info(f"Saved baseline {arguments.baseline}")
+        sys.exit(0)
+
+    if not os.path.exists(arguments.baseline):
+        logging.info(f"No baseline {arguments.baseline}, nothing to compare")
+        sys.exit(0)
+
+    with open(arguments.baseline) as baseline_file:
+        baseline = json.load(baseline_file)
+
+    if baseline["environment"] != run["environment"]:
+        logging.warning("The baseline was recorded in a different environment")
+
+    comparison = compare_to_baseline(run["results"], baseline["results"], arguments.threshold)
+    regressions = [key for key, entry in comparison.items() if entry["regression"]]
+
+    for key, entry in comparison.items():
+        logging.info(f"{key}: {entry['ratio']:.2f}x baseline{'  REGRESSION' if entry['regression'] else ''}")
+
+    logging.info(f"{len(regressions)} of {len(comparison)} benchmarks regressed by more than {arguments.threshold*100:.0f} %")
+
+    sys.exit(1 if regressions else 0)
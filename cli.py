@@ -0,0 +1,334 @@
+"""
+Command line entry point of the estimations.
+
+    python cli.py years --annual-income-cap 100e3 --economy-subsidy 1000e9 --number-of-citizens 83e6
+    python cli.py years --annual-income-cap 100e3 --export-directory scenario_results
+    python cli.py support --annual-income-cap 100e3
+    python cli.py invert 2000 3000 --monthly
+    python cli.py sweep --annual-income-caps 50e3 100e3 150e3 --economy-subsidies 0 300e9 --output-directory sweep_results
+    python cli.py plot --annual-income-cap 100e3 --output-directory figures
+    python cli.py solve economy_subsidy --target-years 20 --annual-income-cap 100e3
+    python cli.py sensitivity --annual-income-cap 100e3 --economy-subsidy 300e9 --sample-budget 10000
+    python cli.py serve --port 8765 --annual-income-cap 100e3
+
+The scenario parameters can also be given in a JSON config file (--config), with the argument names as keys, e.g.
+{"annual_income_cap": 100e3, "interest_rates": [0.07, 0.14]}. Arguments on the command line take precedence over the config file.
+
+matplotlib is only imported by the plot subcommand, so the compute subcommands start quickly.
+
+With --profile PATH the wall times of the computation stages and the counters of the run are saved as JSON report (see instrumentation.py).
+"""
+
+import numpy as np
+
+import os
+import sys
+import json
+import argparse
+import logging
+
+import instrumentation
+from tax_autonomy_estimations import (BinnedIncomeDistribution, IncomeDistribution, TaxCalculator, calculate_income_support,
+                                      calculate_years_to_reach_capital, get_binned_income_distribution, tax_schedules)
+
+
+# Named income distributions that can be selected with --distribution
+income_distributions = {
+    "germany_2025": IncomeDistribution.income_distribution_germany_annual_pretax_2025,
+    "toy": [[20e3,0.2], [50e3,0.3], [80e3,0.2], [100e3,0.1], [150e3,0.1], [200e3,0.05], [300e3,0.05]],
+    # Counts in USD, normalized to probabilities
+    "us_2022": BinnedIncomeDistribution.from_list(IncomeDistribution.income_distribution_us_annual_pretax_2022).normalize(),
+}
+
+
+def get_income_distribution(arguments: argparse.Namespace) -> BinnedIncomeDistribution | list:
+    """
+    Get the income distribution selected by the arguments: a named distribution or a JSON file with a list of [income, probability],
+    cut off at the --cutoff income.
+    """
+
+    if arguments.distribution in income_distributions:
+        income_distribution = income_distributions[arguments.distribution]
+    else:
+        with open(arguments.distribution) as distribution_file:
+            income_distribution = json.load(distribution_file)
+
+    return IncomeDistribution.cutoff_income_distribution(income_distribution, arguments.cutoff)
+
+
+def add_scenario_arguments(parser: argparse.ArgumentParser, sweep: bool = False) -> None:
+    """
+    Add the arguments that describe the distribution and the scenario to a subcommand parser.
+    With sweep=True the scenario parameters take lists of values.
+    """
+
+    parser.add_argument("--distribution", default="germany_2025",
+                        help=f"named income distribution ({', '.join(income_distributions)}) or JSON file with a list of [income, probability]")
+    parser.add_argument("--cutoff", type=float, default=20e3, help="remove all incomes below the cutoff in EUR")
+    parser.add_argument("--number-of-citizens", type=float, default=83e6)
+    parser.add_argument("--tax-year", type=int, default=2025, choices=sorted(tax_schedules))
+
+    if sweep:
+        parser.add_argument("--annual-income-caps", type=float, nargs="+", default=[100e3])
+        parser.add_argument("--economy-subsidies", type=float, nargs="+", default=[0.0])
+        parser.add_argument("--interest-rates-low-risk", type=float, nargs="+", default=[0.05])
+    else:
+        parser.add_argument("--annual-income-cap", type=float, default=100e3)
+        parser.add_argument("--economy-subsidy", type=float, default=0.0)
+        parser.add_argument("--interest-rate-low-risk", type=float, default=0.05)
+
+    parser.add_argument("--interest-rates", type=float, nargs="+", default=[0.07, 0.14])
+
+
+def add_cache_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--cache-directory", default=None, help="directory of a persistent result cache, by default nothing is cached")
+    parser.add_argument("--cache-max-bytes", type=float, default=1e9, help="size budget of the result cache in bytes")
+
+
+def get_result_cache(arguments: argparse.Namespace):
+    """
+    Get the result cache selected by --cache-directory, or None.
+    """
+
+    if not arguments.cache_directory:
+        return None
+
+    from result_cache import ResultCache
+
+    return ResultCache(arguments.cache_directory, arguments.cache_max_bytes)
+
+
+def run_years(arguments: argparse.Namespace) -> dict:
+    result = calculate_years_to_reach_capital(get_income_distribution(arguments), arguments.interest_rate_low_risk, arguments.interest_rates,
+                                              arguments.annual_income_cap, arguments.number_of_citizens, arguments.economy_subsidy, arguments.tax_year,
+                                              get_result_cache(arguments))
+
+    if arguments.export_directory:
+        from scenario_sweep import export_scenario_result
+        export_scenario_result(result, arguments.export_directory)
+
+    return {"annual_incomes": result.annual_incomes.tolist(),
+            "interest_rates": result.interest_rates.tolist(),
+            "years_to_reach_capital": result.years_to_reach_capital.tolist(),
+            "years_to_reach_capital_no_support": result.years_to_reach_capital_no_support.tolist()}
+
+
+def run_support(arguments: argparse.Namespace) -> dict:
+    income_distribution = get_income_distribution(arguments)
+    income_support, accumulated_support_difference = calculate_income_support(income_distribution, arguments.annual_income_cap,
+                                                                              arguments.number_of_citizens, arguments.economy_subsidy, arguments.tax_year)
+
+    return {"annual_incomes": get_binned_income_distribution(income_distribution).annual_incomes.tolist(),
+            "income_support": income_support.tolist(),
+            "accumulated_support_difference": accumulated_support_difference}
+
+
+def run_invert(arguments: argparse.Namespace) -> dict:
+    income_net = np.asarray(arguments.income_net, dtype=float) * (12 if arguments.monthly else 1)
+    income_pretax = TaxCalculator.calculate_pretax_income(income_net, arguments.tolerance, tax_schedule=arguments.tax_year)
+
+    return {"annual_income_net": income_net.tolist(), "annual_income_pretax": income_pretax.tolist()}
+
+
+def run_sweep(arguments: argparse.Namespace) -> dict:
+    from scenario_sweep import run_sweep
+
+    store = run_sweep(get_income_distribution(arguments), arguments.output_directory, arguments.annual_income_caps, arguments.economy_subsidies,
+                      arguments.interest_rates_low_risk, arguments.interest_rates, arguments.number_of_citizens, arguments.max_workers,
+                      tax_schedule=arguments.tax_year, cache=get_result_cache(arguments))
+
+    return {"output_directory": arguments.output_directory, "number_of_scenarios": len(store)}
+
+
+def run_solve(arguments: argparse.Namespace) -> dict:
+    from scenario_solver import solve_policy
+
+    income_distribution = get_income_distribution(arguments)
+    bounds = (arguments.lower, arguments.upper) if arguments.lower is not None and arguments.upper is not None else None
+
+    solutions = [solve_policy(income_distribution, arguments.lever, arguments.target_years, bounds, arguments.annual_income_cap, arguments.economy_subsidy,
+                              interest_rate, arguments.interest_rate_low_risk, arguments.number_of_citizens, arguments.percentile, arguments.tolerance,
+                              arguments.max_evaluations, tax_schedule=arguments.tax_year)
+                 for interest_rate in arguments.interest_rates]
+
+    return {"interest_rates": arguments.interest_rates,
+            # Solutions without a value (the target is met everywhere or nowhere) have null as value and metric
+            "solutions": [{"value": None if np.isnan(solution.value) else solution.value, "metric": None if np.isnan(solution.metric) else solution.metric,
+                           "status": solution.status, "evaluations": solution.evaluations, "bracket": list(solution.bracket)}
+                          for solution in solutions]}
+
+
+def run_sensitivity(arguments: argparse.Namespace) -> dict:
+    from sensitivity_analysis import parameter_names, run_sensitivity_analysis
+
+    income_distribution = get_income_distribution(arguments)
+
+    results = [run_sensitivity_analysis(income_distribution, arguments.annual_income_cap, arguments.economy_subsidy, interest_rate,
+                                        arguments.interest_rate_low_risk, arguments.number_of_citizens, arguments.relative_step, arguments.relative_range,
+                                        sample_budget=arguments.sample_budget, seed=arguments.seed, tax_schedule=arguments.tax_year)
+               for interest_rate in arguments.interest_rates]
+
+    def to_list(values):
+        # Undefined sensitivities are null
+        return np.where(np.isnan(values), None, values).tolist()
+
+    return {"interest_rates": arguments.interest_rates,
+            "parameter_names": parameter_names,
+            "annual_incomes": get_binned_income_distribution(income_distribution).annual_incomes.tolist(),
+            "results": [{"base_years": result.base_years.tolist(), "elasticities": to_list(result.elasticities),
+                         "first_order_indices": to_list(result.first_order_indices), "total_indices": to_list(result.total_indices),
+                         "evaluations": result.evaluations}
+                        for result in results]}
+
+
+def run_serve(arguments: argparse.Namespace) -> dict:
+    import asyncio
+    from scenario_server import ScenarioServer
+
+    scenario_server = ScenarioServer(get_income_distribution(arguments), arguments.number_of_citizens, arguments.annual_income_cap,
+                                     arguments.economy_subsidy, arguments.interest_rate_low_risk, arguments.interest_rates,
+                                     batch_window=arguments.batch_window, tax_schedule=arguments.tax_year)
+
+    # The server runs until it is interrupted, the latency statistics of the session are the result
+    try:
+        asyncio.run(scenario_server.serve(arguments.host, arguments.port, arguments.socket))
+    except KeyboardInterrupt:
+        pass
+
+    return scenario_server.get_latency_statistics()
+
+
+def run_plot(arguments: argparse.Namespace) -> dict:
+    from figures import render_income_distribution, save_years_to_reach_capital_figure
+
+    income_distribution = get_income_distribution(arguments)
+    os.makedirs(arguments.output_directory, exist_ok=True)
+
+    if arguments.income_distribution_chart:
+        figure_path = os.path.join(arguments.output_directory, arguments.income_distribution_chart)
+        render_income_distribution(income_distribution).savefig(figure_path)
+    else:
+        result = calculate_years_to_reach_capital(income_distribution, arguments.interest_rate_low_risk, arguments.interest_rates,
+                                                  arguments.annual_income_cap, arguments.number_of_citizens, arguments.economy_subsidy, arguments.tax_year,
+                                                  get_result_cache(arguments))
+        figure_path = save_years_to_reach_capital_figure(result, arguments.output_directory, arguments.suffix)
+
+    return {"figure_path": figure_path}
+
+
+def create_parser(config: dict = None) -> argparse.ArgumentParser:
+    """
+    Create the argument parser with one subparser per subcommand.
+
+    params:
+        config: dict, default values of the arguments (with the argument names as keys) that replace the built-in defaults
+
+    returns:
+        parser: argparse.ArgumentParser
+    """
+
+    parser = argparse.ArgumentParser(description="Estimations of the years to reach sufficient capital under tax redistribution scenarios.")
+    parser.add_argument("--config", help="JSON file with default values for the arguments")
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--profile", default=None, help="save a profile report of the computation stages as JSON file")
+
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    years_parser = subparsers.add_parser("years", help="years to reach sufficient capital per income bracket and interest rate")
+    add_scenario_arguments(years_parser)
+    add_cache_arguments(years_parser)
+    years_parser.add_argument("--export-directory", default=None, help="append the result to the store of single scenarios in this directory, rows that are already in it are skipped")
+    years_parser.set_defaults(run=run_years)
+
+    support_parser = subparsers.add_parser("support", help="income support per income bracket")
+    add_scenario_arguments(support_parser)
+    support_parser.set_defaults(run=run_support)
+
+    invert_parser = subparsers.add_parser("invert", help="annual pretax income for net incomes")
+    invert_parser.add_argument("income_net", type=float, nargs="+", help="net incomes in EUR")
+    invert_parser.add_argument("--monthly", action="store_true", help="the net incomes are monthly instead of annual incomes")
+    invert_parser.add_argument("--tolerance", type=float, default=0.1, help="tolerance of the pretax income in EUR")
+    invert_parser.add_argument("--tax-year", type=int, default=2025, choices=sorted(tax_schedules))
+    invert_parser.set_defaults(run=run_invert)
+
+    sweep_parser = subparsers.add_parser("sweep", help="run all combinations of the scenario parameters into a result store")
+    add_scenario_arguments(sweep_parser, sweep=True)
+    add_cache_arguments(sweep_parser)
+    sweep_parser.add_argument("--output-directory", default="sweep_results")
+    sweep_parser.add_argument("--max-workers", type=int, default=None)
+    sweep_parser.set_defaults(run=run_sweep)
+
+    solve_parser = subparsers.add_parser("solve", help="find the cap or subsidy at which a percentile of the years meets a target")
+    add_scenario_arguments(solve_parser)
+    solve_parser.add_argument("lever", choices=["annual_income_cap", "economy_subsidy"])
+    solve_parser.add_argument("--target-years", type=float, required=True, help="target for the percentile of the years")
+    solve_parser.add_argument("--percentile", type=float, default=50, help="population-weighted percentile of the years, 50 is the median")
+    solve_parser.add_argument("--lower", type=float, default=None, help="lower bound of the lever")
+    solve_parser.add_argument("--upper", type=float, default=None, help="upper bound of the lever")
+    solve_parser.add_argument("--tolerance", type=float, default=None)
+    solve_parser.add_argument("--max-evaluations", type=int, default=200)
+    solve_parser.set_defaults(run=run_solve)
+
+    sensitivity_parser = subparsers.add_parser("sensitivity", help="elasticities and Sobol indices of the years per parameter and income bracket")
+    add_scenario_arguments(sensitivity_parser)
+    sensitivity_parser.add_argument("--relative-step", type=float, default=0.01, help="relative step of the finite differences")
+    sensitivity_parser.add_argument("--relative-range", type=float, default=0.1, help="relative range of the parameters of the global analysis")
+    sensitivity_parser.add_argument("--sample-budget", type=int, default=10_000, help="number of samples of the global analysis")
+    sensitivity_parser.add_argument("--seed", type=int, default=0)
+    sensitivity_parser.set_defaults(run=run_sensitivity)
+
+    serve_parser = subparsers.add_parser("serve", help="answer years, support and metrics queries as JSON lines on a local socket")
+    add_scenario_arguments(serve_parser)
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8765)
+    serve_parser.add_argument("--socket", default=None, help="path of a Unix socket, used instead of the host and port")
+    serve_parser.add_argument("--batch-window", type=float, default=0.0005, help="time in seconds that requests wait to be evaluated in one batch")
+    serve_parser.set_defaults(run=run_serve)
+
+    plot_parser = subparsers.add_parser("plot", help="save the figure of a scenario")
+    add_scenario_arguments(plot_parser)
+    add_cache_arguments(plot_parser)
+    plot_parser.add_argument("--output-directory", default=".")
+    plot_parser.add_argument("--suffix", default="", help="suffix of the figure name, e.g. _tm")
+    plot_parser.add_argument("--income-distribution-chart", default="", help="save a bar chart of the income distribution with this name instead")
+    plot_parser.set_defaults(run=run_plot)
+
+    if config:
+        for subparser in subparsers.choices.values():
+            subparser.set_defaults(**config)
+
+    return parser
+
+
+def main(argv: list = None) -> int:
+    # Values of the config file replace the defaults of the subcommands, explicit arguments still take precedence
+    config_parser = argparse.ArgumentParser(add_help=False)
+    config_parser.add_argument("--config")
+    config_arguments, _ = config_parser.parse_known_args(argv)
+
+    config = None
+    if config_arguments.config:
+        with open(config_arguments.config) as config_file:
+            config = json.load(config_file)
+
+    arguments = create_parser(config).parse_args(argv)
+
+    logging.basicConfig(level=arguments.log_level, format='%(funcName)s:  %(message)s')
+
+    if arguments.profile:
+        with instrumentation.profiling() as profile:
+            result = arguments.run(arguments)
+
+        profile.save(arguments.profile)
+        logging.info("\n" + profile.format_report())
+    else:
+        result = arguments.run(arguments)
+
+    json.dump(result, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+"""
+Multi-year cohort simulation of the years to reach sufficient capital with growing wages and an indexed tax schedule.
+
+calculate_years_to_reach_capital assumes that every income, its income tax and its income support stay constant forever. Here the incomes
+of all brackets grow with the wages year by year, while the tax schedule, the income cap and the economy subsidy are indexed, e.g. to
+inflation. Every simulated year has its own indexed schedule (a stacked TaxSchedule, see TaxSchedule.indexed), so the incomes, income taxes,
+income support and required capital of all (years x income brackets) are computed as whole arrays:
+
+    1. incomes[t, b] = annual_income[b] * (1 + wage_growth)^t
+    2. income_taxes[t, b] and income_support[t, b] with the schedule, cap and subsidy of the year t
+    3. capital[t, b] = sum over s < t of (income_taxes[s, b] + income_support[s, b]) * (1 + r)^(t - 1 - s), i.e. with the annual payments
+       of calculate_number_of_years_batched, evaluated as a cumulative sum of discounted payments
+    4. The years to reach sufficient capital are the first t with capital[t, b] >= required_capital[t, b], where the required capital
+       maintains the (capped) net income of the year t.
+
+Without wage growth and indexation the result equals the one of calculate_years_to_reach_capital.
+"""
+
+import numpy as np
+
+import logging
+from dataclasses import dataclass
+
+import instrumentation
+from tax_autonomy_estimations import (BinnedIncomeDistribution, IncomeDistribution, TaxCalculator, TaxSchedule, calculate_income_support_stacked,
+                                      get_binned_income_distribution, get_tax_schedule)
+
+
+@dataclass(frozen=True, slots=True, eq=False)
+class CohortResult:
+    """
+    Trajectories of the income brackets over the simulated years, the years are the rows 0 ... horizon.
+    All amounts are nominal annual amounts in EUR.
+    """
+
+    annual_incomes: np.ndarray
+    interest_rates: np.ndarray
+
+    # Shape (years, income brackets)
+    incomes: np.ndarray
+    income_taxes: np.ndarray
+    income_support: np.ndarray
+    required_capital: np.ndarray
+
+    # Shape (interest rates, years, income brackets)
+    capital: np.ndarray
+
+    # Shape (interest rates, income brackets), horizon + 1 if the capital is not reached within the horizon
+    years_to_reach_capital: np.ndarray
+    years_to_reach_capital_no_support: np.ndarray
+
+
+def _get_years_to_reach(capital: np.ndarray, required_capital: np.ndarray, horizon: int) -> np.ndarray:
+    # First year with sufficient capital along the years axis
+    reached = capital >= required_capital
+
+    return np.where(np.any(reached, axis=-2), np.argmax(reached, axis=-2), horizon + 1)
+
+
+@instrumentation.staged
+def simulate_cohort(income_distribution: BinnedIncomeDistribution | list, interest_rate_low_risk: float = 0.05, interest_rates: list = [0.03, 0.07, 0.14, 0.2],
+                    annual_income_cap: float = 500e3, number_of_citizens: float = 1, economy_subsidy: float = 0, wage_growth: float | np.ndarray = 0.03,
+                    indexation_rate: float = 0.02, subsidy_growth: float = None, horizon: int = 40,
+                    tax_schedule: TaxSchedule | int = 2025) -> CohortResult:
+    """
+    Simulate the incomes, income taxes, income support and capital of all income brackets year by year, see the module docstring.
+
+    params:
+        income_distribution: BinnedIncomeDistribution or list, list of annual income values in the first year and their probabilities
+        interest_rate_low_risk: float, assumed annual interest rate for the time when the capital serves as passive income
+        interest_rates: list of assumed annual interest rates for the capital growth phase
+        annual_income_cap: float, annual income cap in EUR in the first year, indexed with the indexation rate
+        number_of_citizens: float, number of citizens in the country
+        economy_subsidy: float, additional income subsidy through economic profits in EUR in the first year
+        wage_growth: float or np.ndarray, annual nominal growth of the incomes, or one growth per income bracket
+        indexation_rate: float, annual indexation of the tax schedule (see TaxSchedule.indexed) and of the income cap, e.g. the inflation
+        subsidy_growth: float, annual growth of the economy subsidy, by default the mean wage growth
+        horizon: int, number of simulated years
+        tax_schedule: TaxSchedule or int, tax schedule or its year in the first year
+
+    returns:
+        result: CohortResult
+    """
+
+    distribution = get_binned_income_distribution(income_distribution)
+    IncomeDistribution.check_sum_probability(distribution)
+
+    tax_schedule = get_tax_schedule(tax_schedule)
+    interest_rates = np.asarray(interest_rates, dtype=float)
+    wage_growth = np.asarray(wage_growth, dtype=float)
+
+    if subsidy_growth is None:
+        subsidy_growth = float(np.mean(wage_growth))
+
+    # One row per simulated year, the income brackets are the last axis
+    elapsed_years = np.arange(horizon + 1)[:, None]
+    indexation = np.power(1 + indexation_rate, elapsed_years)
+
+    incomes = distribution.annual_incomes * np.power(1 + wage_growth, elapsed_years)
+    annual_income_caps = annual_income_cap * indexation
+    indexed_schedule = tax_schedule.indexed(indexation)
+
+    instrumentation.count("simulate_cohort.bracket_years", incomes.size)
+
+    income_taxes = TaxCalculator.calculate_german_income_tax(incomes, indexed_schedule)
+    income_support, _ = calculate_income_support_stacked(incomes, distribution.weights, annual_income_caps, number_of_citizens,
+                                                         economy_subsidy * np.power(1 + subsidy_growth, elapsed_years), indexed_schedule)
+
+    annual_income_net = TaxCalculator.calculcate_post_tax_income(np.minimum(incomes, annual_income_caps), indexed_schedule)
+    required_capital = annual_income_net / interest_rate_low_risk
+
+    # Capital at the start of every year from the payments of the previous years, discounted to the first year and summed up
+    growth = np.power(1 + interest_rates[:, None, None], elapsed_years)
+
+    def get_capital(annual_payments):
+        cumulative_discounted_payments = np.cumsum(annual_payments[:-1] / growth[:, 1:], axis=-2)
+        return growth * np.pad(cumulative_discounted_payments, [(0, 0), (1, 0), (0, 0)])
+
+    capital = get_capital(income_taxes + income_support)
+    capital_no_support = get_capital(income_taxes)
+
+    return CohortResult(annual_incomes=distribution.annual_incomes, interest_rates=interest_rates, incomes=incomes, income_taxes=income_taxes,
+                        income_support=income_support, required_capital=required_capital, capital=capital,
+                        years_to_reach_capital=_get_years_to_reach(capital, required_capital, horizon),
+                        years_to_reach_capital_no_support=_get_years_to_reach(capital_no_support, required_capital, horizon))
+
+
+if __name__ == "__main__":
+
+    logging.basicConfig(level=logging.INFO, format='%(funcName)s:  %(message)s')
+
+    income_distribution = IncomeDistribution.cutoff_income_distribution(IncomeDistribution.income_distribution_germany_annual_pretax_2025, 20e3)
+
+    for wage_growth, indexation_rate in [(0, 0), (0.03, 0.02), (0.03, 0), (0.02, 0.03)]:
+        result = simulate_cohort(income_distribution, interest_rates=[0.07], annual_income_cap=100e3, number_of_citizens=83e6, economy_subsidy=300e9,
+                                 wage_growth=wage_growth, indexation_rate=indexation_rate, horizon=60)
+        logging.info(f"Wage growth {wage_growth*100:.0f} %, indexation {indexation_rate*100:.0f} %: years {result.years_to_reach_capital[0]}")
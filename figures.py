@@ -0,0 +1,143 @@
+"""
+Rendering of the figures from computed results.
+
+All figures are drawn on explicit Figure objects without pyplot, i.e. without global state and without an interactive backend.
+Figures are only written to disk and never shown, so rendering does not block and also works on a server.
+"""
+
+import numpy as np
+
+import os
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+from matplotlib.figure import Figure
+from matplotlib.ticker import FuncFormatter
+
+import instrumentation
+from tax_autonomy_estimations import (BinnedIncomeDistribution, IncomeDistribution, ScenarioResult, calculate_years_to_reach_capital,
+                                      get_binned_income_distribution)
+
+
+@instrumentation.staged
+def render_years_to_reach_capital(result: ScenarioResult, figure: Figure = None) -> Figure:
+    """
+    Draw the number of years to reach a sufficient capital over the annual income for every interest rate of a scenario.
+    Dashed lines show the years without, solid lines the years with income support.
+
+    params:
+        result: ScenarioResult, result of calculate_years_to_reach_capital
+        figure: Figure, figure to draw on, by default a new figure
+
+    returns:
+        figure: Figure, figure with the plot
+    """
+
+    if figure is None:
+        figure = Figure()
+
+    axes = figure.add_subplot()
+
+    for years_to_reach_capital, years_to_reach_capital_no_support in zip(result.years_to_reach_capital, result.years_to_reach_capital_no_support):
+        line_temp, = axes.plot(result.annual_incomes, years_to_reach_capital_no_support, marker="o", alpha=0.5, linestyle="-.")
+        axes.plot(result.annual_incomes, years_to_reach_capital, marker="x", color = line_temp.get_color())
+
+    axes.legend([f"Annual return rate: {interest_rate*100:.1f} %" for interest_rate in np.repeat(result.interest_rates, 2)])
+
+    axes.set_xlabel("Annual Income in EUR")
+    axes.get_xaxis().set_major_formatter(FuncFormatter(lambda x, loc: "{:,}".format(int(x))))
+    axes.set_ylabel("Years to reach sufficient capital")
+
+    axes.grid()
+
+    return figure
+
+
+def render_income_distribution(income_distribution: BinnedIncomeDistribution | list, figure: Figure = None) -> Figure:
+    """
+    Draw the income distribution as a bar chart.
+
+    params:
+        income_distribution: BinnedIncomeDistribution or list, list of income values and their probabilities
+        figure: Figure, figure to draw on, by default a new figure
+
+    returns:
+        figure: Figure, figure with the bar chart
+    """
+
+    if figure is None:
+        figure = Figure()
+
+    distribution = get_binned_income_distribution(income_distribution)
+    income_values = distribution.annual_incomes
+    income_probabilities = distribution.weights*100
+
+    bin_width = (income_values[1] - income_values[0])*0.8
+
+    axes = figure.add_subplot()
+    axes.bar(income_values, income_probabilities, width=bin_width, edgecolor="black", alpha = 0.7)
+    axes.set_xlabel("Annual Pretax Income in EUR")
+    axes.set_ylabel("Part of Population [%]")
+    axes.grid()
+
+    return figure
+
+
+@instrumentation.staged
+def save_years_to_reach_capital_figure(result: ScenarioResult, output_directory: str = ".", suffix: str = "") -> str:
+    """
+    Render the figure of a scenario and save it under its figure name (see ScenarioResult.get_figure_name).
+
+    params:
+        result: ScenarioResult, result of calculate_years_to_reach_capital
+        output_directory: str, directory to save the figure in
+        suffix: str, suffix of the figure name
+
+    returns:
+        figure_path: str, path of the saved figure
+    """
+
+    figure_path = os.path.join(output_directory, result.get_figure_name(suffix))
+    render_years_to_reach_capital(result).savefig(figure_path)
+
+    return figure_path
+
+
+def render_sweep_figures(results: list, output_directory: str = ".", suffix: str = "", max_workers: int = None) -> list:
+    """
+    Render and save the figures of many scenarios in parallel worker processes.
+
+    params:
+        results: list, list of ScenarioResult
+        output_directory: str, directory to save the figures in
+        suffix: str, suffix of the figure names
+        max_workers: int, number of worker processes, by default the number of cores. With 1 the figures are rendered in the current process.
+
+    returns:
+        figure_paths: list, paths of the saved figures in the order of the results
+    """
+
+    os.makedirs(output_directory, exist_ok=True)
+
+    if max_workers == 1:
+        return [save_years_to_reach_capital_figure(result, output_directory, suffix) for result in results]
+
+    with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+        return list(executor.map(save_years_to_reach_capital_figure, results, [output_directory] * len(results), [suffix] * len(results)))
+
+
+if __name__ == "__main__":
+
+    logging.basicConfig(level=logging.INFO, format='%(funcName)s:  %(message)s')
+
+    income_distribution = IncomeDistribution.cutoff_income_distribution(IncomeDistribution.income_distribution_germany_annual_pretax_2025, 20e3)
+
+    # (annual_income_cap, economy_subsidy) of the figures of the article
+    scenarios = [(500e3, 0), (100e3, 0), (100e3, 300e9), (100e3, 1000e9)]
+
+    results = [calculate_years_to_reach_capital(income_distribution, interest_rate_low_risk=0.05, interest_rates=[0.07, 0.14],
+                                                annual_income_cap=annual_income_cap, number_of_citizens=83e6, economy_subsidy=economy_subsidy)
+               for annual_income_cap, economy_subsidy in scenarios]
+
+    for figure_path in render_sweep_figures(results):
+        logging.info(f"Saved {figure_path}")
@@ -0,0 +1,332 @@
+"""
+Continuous income density fitted to a binned income distribution, with aggregates from adaptive quadrature.
+
+Aggregates over a binned distribution, e.g. accumulated_income_tax_over_cap of calculate_income_support, are weighted sums over the bin
+midpoints, so their precision is tied to the number of bins. IncomeDensity.fit turns the bins into a continuous density instead:
+    - Body: the cumulative weight at the bin edges (see BinnedIncomeDistribution.get_cumulative_weights) is interpolated with a monotone
+      cubic (PCHIP) spline, whose derivative is a non-negative density with the weight of every bin.
+    - Tail: the top bin is the weight of all incomes above its income (149645.49 EUR for income_distribution_germany_annual_pretax_2025),
+      modelled as Pareto tail with the survival weight tail_weight * (tail_start / income)^pareto_alpha.
+
+Integrals of a function times the density are computed with vectorized adaptive Gauss-Kronrod (7-15) quadrature: all intervals are
+evaluated at once per round and the intervals whose error estimate is too large are split, until the estimated error is below the
+tolerance. The tail is mapped to the finite interval v in (0, 1] with income = tail_start * v^(-1 / (pareto_alpha - 1)), with which
+the integrand of functions that grow at most linearly with the income (e.g. taxes) stays bounded. The tolerance is the knob between
+precision and speed.
+"""
+
+import numpy as np
+
+import time
+import logging
+from dataclasses import dataclass
+
+import instrumentation
+from tax_autonomy_estimations import (BinnedIncomeDistribution, IncomeDistribution, TaxCalculator, TaxSchedule, calculate_income_support_batched,
+                                      get_bin_edges, get_binned_income_distribution, get_tax_schedule)
+
+
+# Nodes and weights of the 15-point Kronrod rule and of the embedded 7-point Gauss rule on [-1, 1]
+_kronrod_nodes = np.array([0.991455371120812639206854697526329, 0.949107912342758524526189684047851, 0.864864423359769072789712788640926,
+                           0.741531185599394439863864773280788, 0.586087235467691130294144845693013, 0.405845151377397166906606412076961,
+                           0.207784955007898467600689403773245, 0.0])
+_kronrod_nodes = np.concatenate([-_kronrod_nodes, _kronrod_nodes[-2::-1]])
+
+_kronrod_weights = np.array([0.022935322010529224963732008058970, 0.063092092629978553290700663189204, 0.104790010322250183839876322541518,
+                             0.140653259715525918745189590510238, 0.169004726639267902826583426598550, 0.190350578064785409913256402421014,
+                             0.204432940075298892414161999234649, 0.209482141084727828012999174891714])
+_kronrod_weights = np.concatenate([_kronrod_weights, _kronrod_weights[-2::-1]])
+
+_gauss_weights = np.zeros(15)
+_gauss_weights[1::2] = [0.129484966168869693270611432679082, 0.279705391489276667901467771423780, 0.381830050505118944950369775488975,
+                        0.417959183673469387755102040816327, 0.381830050505118944950369775488975, 0.279705391489276667901467771423780,
+                        0.129484966168869693270611432679082]
+
+
+def get_monotone_slopes(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """
+    Get the slopes of the monotone piecewise cubic Hermite (PCHIP, Fritsch-Carlson) interpolation of increasing values.
+
+    params:
+        x: np.ndarray, increasing knots
+        y: np.ndarray, non-decreasing values at the knots
+
+    returns:
+        slopes: np.ndarray, derivative of the interpolation at the knots
+    """
+
+    h = np.diff(x)
+    delta = np.diff(y) / h
+
+    slopes = np.zeros(len(x))
+
+    if len(x) == 2:
+        slopes[:] = delta[0]
+        return slopes
+
+    # Weighted harmonic mean of the neighbouring secants, zero at a local extremum or a flat secant
+    w1, w2 = 2 * h[1:] + h[:-1], h[1:] + 2 * h[:-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        interior_slopes = (w1 + w2) / (w1 / delta[:-1] + w2 / delta[1:])
+    slopes[1:-1] = np.where(delta[:-1] * delta[1:] > 0, interior_slopes, 0.0)
+
+    # Non-centered three-point formula at the ends, limited to keep the interpolation monotone
+    def get_end_slope(h0, h1, delta0, delta1):
+        slope = ((2 * h0 + h1) * delta0 - h0 * delta1) / (h0 + h1)
+        if np.sign(slope) != np.sign(delta0):
+            return 0.0
+        if np.sign(delta0) != np.sign(delta1) and abs(slope) > abs(3 * delta0):
+            return 3 * delta0
+        return slope
+
+    slopes[0] = get_end_slope(h[0], h[1], delta[0], delta[1])
+    slopes[-1] = get_end_slope(h[-1], h[-2], delta[-1], delta[-2])
+
+    return slopes
+
+
+def _integrate_adaptive(integrand, interval_edges: np.ndarray, tolerance: float, max_intervals: int) -> tuple:
+    # Adaptive Gauss-Kronrod quadrature over the intervals between the edges, the estimated error is distributed over the intervals
+    # in proportion to their length
+    lower, upper = interval_edges[:-1], interval_edges[1:]
+    total_length = upper[-1] - lower[0]
+
+    value, error = 0.0, 0.0
+
+    while len(lower) > 0:
+        centers, half_lengths = (lower + upper) / 2, (upper - lower) / 2
+        nodes = centers[:, None] + half_lengths[:, None] * _kronrod_nodes
+
+        values = integrand(nodes.ravel())
+        values = values.reshape(values.shape[:-1] + nodes.shape)
+
+        kronrod = half_lengths * (values @ _kronrod_weights)
+        interval_errors = np.abs(kronrod - half_lengths * (values @ _gauss_weights))
+        interval_errors = interval_errors.reshape(-1, len(lower)).max(axis=0)
+
+        instrumentation.count("income_density.intervals", len(lower))
+
+        # All remaining intervals are accepted once splitting them would exceed the maximum number of intervals, and intervals that
+        # cannot be split further (e.g. at a jump of the function) are accepted as well
+        accepted = (interval_errors <= tolerance * (upper - lower) / total_length) | (upper - lower <= 1e-12 * total_length)
+        if 2 * np.sum(~accepted) > max_intervals:
+            accepted[:] = True
+
+        value = value + np.sum(kronrod[..., accepted], axis=-1)
+        error += np.sum(interval_errors[accepted])
+
+        lower, centers, upper = lower[~accepted], centers[~accepted], upper[~accepted]
+        lower, upper = np.concatenate([lower, centers]), np.concatenate([centers, upper])
+
+    return value, error
+
+
+@dataclass(frozen=True, slots=True, eq=False)
+class IncomeDensity:
+    """
+    Continuous income density with a monotone spline body and a Pareto tail, see the module docstring. The density has the total weight
+    of the binned distribution, i.e. it integrates to 1 for probabilities.
+    """
+
+    # Knots of the spline of the cumulative weight, the last knot is the start of the tail
+    knots: np.ndarray
+    cumulative_weights: np.ndarray
+    slopes: np.ndarray
+
+    tail_start: float
+    tail_weight: float
+    pareto_alpha: float
+
+    @staticmethod
+    def fit(income_distribution: BinnedIncomeDistribution | list, pareto_alpha: float = None, tail_fit_weight: float = 0.1) -> "IncomeDensity":
+        """
+        Fit the density to a binned income distribution.
+
+        Without a given Pareto exponent it is fitted as the slope of the logarithm of the survival weight over the logarithm of the income
+        at the bin edges with a survival weight of at most tail_fit_weight (relative to the total weight).
+
+        params:
+            income_distribution: BinnedIncomeDistribution or list, list of annual income values and their probabilities
+            pareto_alpha: float, exponent of the Pareto tail, it has to be larger than 1 for a finite mean income
+            tail_fit_weight: float, share of the highest incomes that the Pareto exponent is fitted to
+
+        returns:
+            income_density: IncomeDensity
+        """
+
+        distribution = get_binned_income_distribution(income_distribution)
+        order = np.argsort(distribution.annual_incomes, kind="stable")
+        annual_incomes, weights = distribution.annual_incomes[order], distribution.weights[order]
+
+        if len(annual_incomes) < 3:
+            raise ValueError(f"Need at least 3 income bins to fit a density, got {len(annual_incomes)}")
+
+        # The edges of the body bins, the upper edge of the last body bin is moved to the income of the top bin, where the tail starts
+        knots = get_bin_edges(annual_incomes)[:-1]
+        knots[-1] = annual_incomes[-1]
+        cumulative_weights = np.concatenate([[0.0], np.cumsum(weights[:-1])])
+
+        tail_start, tail_weight = float(annual_incomes[-1]), float(weights[-1])
+
+        if pareto_alpha is None:
+            survival_weights = distribution.total_weight - cumulative_weights
+            fitted = (survival_weights <= tail_fit_weight * distribution.total_weight) & (survival_weights > 0)
+            fitted[-2:] = True
+            pareto_alpha = -np.polyfit(np.log(knots[fitted]), np.log(survival_weights[fitted]), 1)[0]
+
+        if pareto_alpha <= 1:
+            raise ValueError(f"The Pareto exponent has to be larger than 1 for a finite mean income, got {pareto_alpha}")
+
+        return IncomeDensity(knots=knots, cumulative_weights=cumulative_weights, slopes=get_monotone_slopes(knots, cumulative_weights),
+                             tail_start=tail_start, tail_weight=tail_weight, pareto_alpha=float(pareto_alpha))
+
+    @property
+    def total_weight(self) -> float:
+        return float(self.cumulative_weights[-1] + self.tail_weight)
+
+    def _get_hermite_segment(self, income: np.ndarray) -> tuple:
+        index = np.clip(np.searchsorted(self.knots, income, side="right") - 1, 0, len(self.knots) - 2)
+        h = self.knots[index + 1] - self.knots[index]
+        t = np.clip((income - self.knots[index]) / h, 0, 1)
+
+        return index, h, t
+
+    def cdf(self, income: float | np.ndarray) -> float | np.ndarray:
+        """
+        Get the weight of all incomes below the given incomes.
+        """
+
+        income = np.asarray(income, dtype=float)
+        index, h, t = self._get_hermite_segment(income)
+
+        body = (self.cumulative_weights[index] * (2 * t**3 - 3 * t**2 + 1) + h * self.slopes[index] * (t**3 - 2 * t**2 + t)
+                + self.cumulative_weights[index + 1] * (-2 * t**3 + 3 * t**2) + h * self.slopes[index + 1] * (t**3 - t**2))
+        tail = self.total_weight - self.tail_weight * np.power(self.tail_start / np.maximum(income, self.tail_start), self.pareto_alpha)
+
+        cdf = np.where(income < self.knots[0], 0.0, np.where(income < self.tail_start, body, tail))
+
+        if cdf.ndim == 0:
+            return float(cdf)
+
+        return cdf
+
+    def pdf(self, income: float | np.ndarray) -> float | np.ndarray:
+        """
+        Get the density of the weight at the given incomes.
+        """
+
+        income = np.asarray(income, dtype=float)
+        index, h, t = self._get_hermite_segment(income)
+
+        body = ((self.cumulative_weights[index] - self.cumulative_weights[index + 1]) * (6 * t**2 - 6 * t) / h
+                + self.slopes[index] * (3 * t**2 - 4 * t + 1) + self.slopes[index + 1] * (3 * t**2 - 2 * t))
+        tail = (self.tail_weight * self.pareto_alpha / self.tail_start
+                * np.power(self.tail_start / np.maximum(income, self.tail_start), self.pareto_alpha + 1))
+
+        pdf = np.where(income < self.knots[0], 0.0, np.where(income < self.tail_start, body, tail))
+
+        if pdf.ndim == 0:
+            return float(pdf)
+
+        return pdf
+
+    @instrumentation.staged
+    def integrate(self, function, breakpoints: np.ndarray = (), tolerance: float = 1e-6, max_intervals: int = 100_000) -> tuple:
+        """
+        Integrate a function of the income times the density, e.g. the mean income is integrate(lambda x: x).
+
+        The body and the tail get half of the tolerance each. Incomes where the function is not smooth (e.g. tax zone boundaries or an
+        income cap) should be given as breakpoints, so that no interval of the quadrature contains them.
+
+        params:
+            function: callable, vectorized function of a 1D array of incomes that returns an array with the incomes as last axis,
+                e.g. with a leading axis of caps to integrate for many caps at once
+            breakpoints: np.ndarray, incomes where the function is not smooth
+            tolerance: float, tolerance of the absolute error of the integral
+            max_intervals: int, maximum number of intervals per round, beyond it the remaining intervals are accepted
+
+        returns:
+            value: float or np.ndarray, integral with the shape of the function values without the last axis
+            error: float, estimated absolute error
+        """
+
+        breakpoints = np.asarray(breakpoints, dtype=float)
+
+        body_edges = np.unique(np.concatenate([self.knots, breakpoints[(breakpoints > self.knots[0]) & (breakpoints < self.tail_start)]]))
+        body_value, body_error = _integrate_adaptive(lambda income: function(income) * self.pdf(income), body_edges, tolerance / 2, max_intervals)
+
+        # In the tail the survival weight is tail_weight * v^exponent with the exponent pareto_alpha / (pareto_alpha - 1), i.e. the weight
+        # of dv is tail_weight * exponent * v^(exponent - 1)
+        exponent = self.pareto_alpha / (self.pareto_alpha - 1)
+
+        def tail_integrand(v):
+            return function(self.tail_start * np.power(v, -1 / (self.pareto_alpha - 1))) * self.tail_weight * exponent * np.power(v, exponent - 1)
+
+        tail_breakpoints = np.power(self.tail_start / breakpoints[breakpoints > self.tail_start], self.pareto_alpha - 1)
+        tail_value, tail_error = _integrate_adaptive(tail_integrand, np.unique(np.concatenate([[0.0, 1.0], tail_breakpoints])), tolerance / 2,
+                                                     max_intervals)
+
+        return body_value + tail_value, body_error + tail_error
+
+
+@instrumentation.staged
+def calculate_accumulated_income_taxes(income_density: IncomeDensity, annual_income_caps: float | np.ndarray, tolerance: float = 0.01,
+                                       tax_schedule: TaxSchedule | int = 2025) -> dict:
+    """
+    Continuous version of the accumulated income taxes below and above the annual income caps of calculate_income_support_batched.
+
+    params:
+        income_density: IncomeDensity, fitted density of the annual incomes
+        annual_income_caps: float or np.ndarray, 1D array of annual income caps in EUR
+        tolerance: float, tolerance of the absolute error of the accumulated income taxes in EUR (per unit of weight). Note that the income
+            tax is rounded to cents, which limits the attainable precision to about 1e-3 EUR.
+        tax_schedule: TaxSchedule or int, tax schedule or its year
+
+    returns:
+        taxes_at_caps: dict with the arrays (one element per cap)
+            income_taxes_at_cap: income tax at the cap
+            total_percentage_below_income_cap: weight of the incomes below the cap
+            accumulated_income_tax_under_cap: weighted difference of the income tax at the cap and the income taxes below the cap
+            accumulated_income_tax_over_cap: weighted difference of the income tax at the cap and the income taxes above the cap
+            accumulated_support_difference: accumulated_income_tax_under_cap minus the absolute accumulated_income_tax_over_cap
+            error: estimated absolute error of the integrals
+    """
+
+    tax_schedule = get_tax_schedule(tax_schedule)
+    annual_income_caps = np.atleast_1d(np.asarray(annual_income_caps, dtype=float))
+    income_taxes_at_cap = TaxCalculator.calculate_german_income_tax(annual_income_caps, tax_schedule)
+
+    def get_tax_differences(income):
+        tax_differences = income_taxes_at_cap[:, None] - TaxCalculator.calculate_german_income_tax(income, tax_schedule)
+        below_cap = income < annual_income_caps[:, None]
+        return np.stack([np.where(below_cap, tax_differences, 0.0), np.where(below_cap, 0.0, tax_differences)])
+
+    (under_cap, over_cap), error = income_density.integrate(get_tax_differences, np.concatenate([annual_income_caps, tax_schedule.zone_boundaries]),
+                                                            tolerance)
+
+    return {"income_taxes_at_cap": income_taxes_at_cap, "total_percentage_below_income_cap": income_density.cdf(annual_income_caps),
+            "accumulated_income_tax_under_cap": under_cap, "accumulated_income_tax_over_cap": over_cap,
+            "accumulated_support_difference": under_cap - np.abs(over_cap), "error": error}
+
+
+if __name__ == "__main__":
+
+    logging.basicConfig(level=logging.INFO, format='%(funcName)s:  %(message)s')
+
+    income_distribution = IncomeDistribution.income_distribution_germany_annual_pretax_2025
+    income_density = IncomeDensity.fit(income_distribution)
+    logging.info(f"Pareto exponent of the tail above {income_density.tail_start:.0f} EUR: {income_density.pareto_alpha:.2f}, "
+                 f"total weight {income_density.total_weight:.6f}")
+
+    mean_income, _ = income_density.integrate(lambda income: income)
+    logging.info(f"Mean annual income {mean_income / income_density.total_weight:.0f} EUR")
+
+    annual_income_caps = np.array([50e3, 100e3, 150e3, 250e3])
+    _, accumulated_support_difference = calculate_income_support_batched(income_distribution, annual_income_caps)
+    logging.info(f"Binned accumulated support difference: {accumulated_support_difference}")
+
+    for tolerance in [10, 1, 0.1, 0.01]:
+        start = time.perf_counter()
+        taxes_at_caps = calculate_accumulated_income_taxes(income_density, annual_income_caps, tolerance)
+        logging.info(f"Tolerance {tolerance:g}: {taxes_at_caps['accumulated_support_difference']} (estimated error {taxes_at_caps['error']:.2g}) "
+                     f"in {(time.perf_counter() - start)*1e3:.2f} ms")
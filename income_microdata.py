@@ -0,0 +1,202 @@
+"""
+Income distributions from raw income microdata, e.g. tax or survey records with one row per person.
+
+The files are streamed in chunks of fixed size, so the peak memory only depends on the chunk size and the number of bins and not on
+the size of the file:
+    - CSV files are read chunk by chunk with one column of incomes and optionally one column of weights (e.g. survey weights).
+    - Binary files are memory-mapped: .npy files with one column of incomes or two columns of incomes and weights, or raw files of
+      float values without header.
+
+Every chunk is binned with one vectorized binary search and np.bincount, which accumulates the weights and the weighted incomes per bin.
+The income of a bin is the weighted mean income of its rows. Net incomes can be converted to pretax incomes with the tax inversion
+(TaxCalculator.calculate_pretax_income) chunk by chunk before binning.
+
+    income_distribution = read_income_microdata("incomes.csv", income_column="net_income", monthly=True, net_incomes=True)
+
+The result is a normalized BinnedIncomeDistribution, which all calculation functions accept.
+"""
+
+import numpy as np
+
+import os
+import logging
+import itertools
+import tempfile
+
+import instrumentation
+from tax_autonomy_estimations import BinnedIncomeDistribution, TaxCalculator, TaxSchedule, calculate_years_to_reach_capital
+
+
+# Edges of the annual pretax income bins in EUR: geometric bins from 1000 EUR to 100 million EUR and one bin for the incomes below
+default_bin_edges = np.concatenate([[0.0], np.geomspace(1e3, 1e8, 101)])
+
+
+def read_csv_chunks(file_path: str, income_column: int | str = 0, weight_column: int | str = None, delimiter: str = ",", header: bool = True,
+                    chunk_size: int = 1_000_000):
+    """
+    Read the incomes and weights of a CSV file in chunks of rows.
+
+    params:
+        file_path: str, path of the CSV file
+        income_column: int or str, index or (with a header) name of the income column
+        weight_column: int or str, index or (with a header) name of the weight column, by default every row has the weight 1
+        delimiter: str, delimiter of the columns
+        header: bool, if True, the first line contains the names of the columns
+        chunk_size: int, maximum number of rows per chunk
+
+    yields:
+        incomes: np.ndarray, incomes of the rows of the chunk
+        weights: np.ndarray, weights of the rows of the chunk, or None
+    """
+
+    with open(file_path) as csv_file:
+        column_names = next(csv_file).strip().split(delimiter) if header else []
+
+        def get_column_index(column):
+            if isinstance(column, str):
+                if column not in column_names:
+                    raise ValueError(f"Column {column} not in the header of {file_path}: {column_names}")
+                return column_names.index(column)
+            return column
+
+        columns = [get_column_index(income_column)] + ([] if weight_column is None else [get_column_index(weight_column)])
+
+        while True:
+            lines = list(itertools.islice(csv_file, chunk_size))
+            if not lines:
+                return
+
+            values = np.loadtxt(lines, delimiter=delimiter, usecols=columns, ndmin=2)
+
+            yield values[:, 0], (values[:, 1] if weight_column is not None else None)
+
+
+def read_binary_chunks(file_path: str, dtype: str = "float64", chunk_size: int = 1_000_000):
+    """
+    Read the incomes and weights of a binary file in chunks of rows from a memory map.
+
+    params:
+        file_path: str, path of a .npy file with one column of incomes or two columns of incomes and weights, or of a raw file of incomes
+        dtype: str, data type of a raw file
+        chunk_size: int, maximum number of rows per chunk
+
+    yields:
+        incomes: np.ndarray, incomes of the rows of the chunk
+        weights: np.ndarray, weights of the rows of the chunk, or None
+    """
+
+    if file_path.endswith(".npy"):
+        values = np.load(file_path, mmap_mode="r")
+    else:
+        values = np.memmap(file_path, dtype=dtype, mode="r")
+
+    if values.ndim not in (1, 2) or (values.ndim == 2 and values.shape[1] not in (1, 2)):
+        raise ValueError(f"Expected one column of incomes or two columns of incomes and weights in {file_path}, got the shape {values.shape}")
+
+    for start in range(0, len(values), chunk_size):
+        chunk = np.asarray(values[start:start + chunk_size], dtype=float)
+
+        if chunk.ndim == 1:
+            yield chunk, None
+        else:
+            yield chunk[:, 0], (chunk[:, 1] if chunk.shape[1] == 2 else None)
+
+
+@instrumentation.staged
+def bin_income_chunks(chunks, bin_edges: np.ndarray = None, monthly: bool = False, net_incomes: bool = False, tolerance: float = 0.1,
+                      tax_schedule: TaxSchedule | int = 2025) -> BinnedIncomeDistribution:
+    """
+    Bin chunks of incomes into an income distribution in a single pass.
+
+    Incomes outside of the bin edges and missing (non-finite) incomes are dropped, in the same way as BinnedIncomeDistribution.rebin drops them.
+
+    params:
+        chunks: iterable of (incomes, weights) with weights None for unit weights, e.g. from read_csv_chunks or read_binary_chunks
+        bin_edges: np.ndarray, increasing edges of the annual pretax income bins in EUR, by default default_bin_edges
+        monthly: bool, if True, the incomes are monthly incomes, otherwise annual incomes
+        net_incomes: bool, if True, the incomes are net incomes that are converted to pretax incomes with TaxCalculator.calculate_pretax_income
+        tolerance: float, tolerance of the pretax incomes in EUR
+        tax_schedule: TaxSchedule or int, tax schedule or its year for the conversion of net incomes
+
+    returns:
+        income_distribution: BinnedIncomeDistribution, normalized distribution with the weighted mean income of every non-empty bin
+    """
+
+    bin_edges = default_bin_edges if bin_edges is None else np.asarray(bin_edges, dtype=float)
+    number_of_bins = len(bin_edges) - 1
+
+    bin_weights = np.zeros(number_of_bins)
+    bin_weighted_incomes = np.zeros(number_of_bins)
+
+    for incomes, weights in chunks:
+        annual_incomes = np.asarray(incomes, dtype=float) * (12 if monthly else 1)
+
+        if net_incomes:
+            annual_incomes = TaxCalculator.calculate_pretax_income(annual_incomes, tolerance, tax_schedule=tax_schedule)
+
+        bin_index = np.searchsorted(bin_edges, annual_incomes, side="right") - 1
+        in_bins = (bin_index >= 0) & (bin_index < number_of_bins)
+
+        weights = np.ones(len(annual_incomes)) if weights is None else np.asarray(weights, dtype=float)
+
+        bin_weights += np.bincount(bin_index[in_bins], weights[in_bins], minlength=number_of_bins)
+        bin_weighted_incomes += np.bincount(bin_index[in_bins], weights[in_bins] * annual_incomes[in_bins], minlength=number_of_bins)
+
+        instrumentation.count("bin_income_chunks.rows", len(annual_incomes))
+        instrumentation.count("bin_income_chunks.dropped_rows", int(np.sum(~in_bins)))
+
+    non_empty = bin_weights > 0
+    if not np.any(non_empty):
+        raise ValueError("No income within the bin edges")
+
+    return BinnedIncomeDistribution.create(bin_weighted_incomes[non_empty] / bin_weights[non_empty], bin_weights[non_empty]).normalize()
+
+
+def read_income_microdata(file_path: str, income_column: int | str = 0, weight_column: int | str = None, bin_edges: np.ndarray = None,
+                          monthly: bool = False, net_incomes: bool = False, tolerance: float = 0.1, chunk_size: int = 1_000_000,
+                          tax_schedule: TaxSchedule | int = 2025, **reader_options) -> BinnedIncomeDistribution:
+    """
+    Build an income distribution from a microdata file, CSV files (.csv) are read with read_csv_chunks, all others with read_binary_chunks.
+
+    params:
+        file_path: str, path of the file
+        income_column: int or str, income column of a CSV file
+        weight_column: int or str, weight column of a CSV file
+        bin_edges: np.ndarray, increasing edges of the annual pretax income bins in EUR, by default default_bin_edges
+        monthly: bool, if True, the incomes are monthly incomes, otherwise annual incomes
+        net_incomes: bool, if True, the incomes are net incomes that are converted to pretax incomes
+        tolerance: float, tolerance of the pretax incomes in EUR
+        chunk_size: int, maximum number of rows per chunk
+        tax_schedule: TaxSchedule or int, tax schedule or its year for the conversion of net incomes
+        reader_options: further options of the reader, e.g. delimiter and header of read_csv_chunks or dtype of read_binary_chunks
+
+    returns:
+        income_distribution: BinnedIncomeDistribution, normalized distribution, see bin_income_chunks
+    """
+
+    if file_path.endswith(".csv"):
+        chunks = read_csv_chunks(file_path, income_column, weight_column, chunk_size=chunk_size, **reader_options)
+    else:
+        chunks = read_binary_chunks(file_path, chunk_size=chunk_size, **reader_options)
+
+    return bin_income_chunks(chunks, bin_edges, monthly, net_incomes, tolerance, tax_schedule)
+
+
+if __name__ == "__main__":
+
+    logging.basicConfig(level=logging.INFO, format='%(funcName)s:  %(message)s')
+
+    # Synthetic microdata: log-normally distributed monthly net incomes of 10 million people
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, "monthly_net_incomes.npy")
+        np.save(file_path, np.random.default_rng(0).lognormal(np.log(2200), 0.6, 10_000_000))
+
+        with instrumentation.profiling() as profile:
+            income_distribution = read_income_microdata(file_path, monthly=True, net_incomes=True)
+
+        logging.info("\n" + profile.format_report())
+
+    logging.info(f"{len(income_distribution)} bins, median annual pretax income {income_distribution.quantile(0.5):.0f} EUR")
+
+    result = calculate_years_to_reach_capital(income_distribution.cutoff(20e3).normalize(), interest_rates=[0.07, 0.14], annual_income_cap=100e3)
+    logging.info(f"Years to reach sufficient capital at 7 %: {result.years_to_reach_capital[0]}")
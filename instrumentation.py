@@ -0,0 +1,265 @@
+"""
+Instrumentation of the computation stages.
+
+Stages, counters and samples are only recorded while a profile is enabled, otherwise every call returns right away:
+
+    import instrumentation
+
+    with instrumentation.profiling() as profile:
+        calculate_years_to_reach_capital(...)
+
+    print(profile.format_report())
+    profile.save("profile.json")
+
+Within the code, functions are timed as a whole with the @instrumentation.staged decorator and parts of functions with
+"with instrumentation.stage(name):". Nested stages are recorded under their path, e.g. "calculate_years_to_reach_capital/calculate_income_support_batched".
+instrumentation.count(name, n) adds to a counter, e.g. the solver iterations, and instrumentation.sample(name, value) keeps a sample of
+intermediate values. The value of a sample can be a function without arguments, which is only called when the sample is recorded.
+
+The profile is kept per process, so the stages of worker processes of a process pool are not part of the profile of the main process.
+A worker can record its own profile and return it, instrumentation.merge(profile) adds it to the current profile of the main process
+under the current stage. The times of parallel workers add up, so the shares of their stages can exceed the wall time.
+"""
+
+import numpy as np
+
+import json
+import time
+import functools
+import contextlib
+
+
+# Profile that is currently recorded, None if the instrumentation is disabled
+_profile = None
+
+# Stage that does nothing, returned by stage() while the instrumentation is disabled
+_disabled_stage = contextlib.nullcontext()
+
+
+class Profile:
+    """
+    Wall times of the stages, counters and samples of intermediate values of a single run.
+    """
+
+    def __init__(self, sample_every: int = 1, max_samples: int = 100):
+        """
+        params:
+            sample_every: int, only every sample_every-th value of a sample name is recorded
+            max_samples: int, maximum number of recorded values per sample name
+        """
+
+        self.sample_every = sample_every
+        self.max_samples = max_samples
+
+        # Stage path: {"calls", "total_time", "min_time", "max_time"} with the times in seconds
+        self.stages = {}
+        self.counters = {}
+        self.samples = {}
+
+        self._sample_calls = {}
+        self._stage_stack = []
+        self._start_time = time.perf_counter()
+        self.wall_time = None
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        self._stage_stack.append(name)
+        path = "/".join(self._stage_stack)
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self._stage_stack.pop()
+            self._add_stage(path, 1, elapsed, elapsed, elapsed)
+
+    def _add_stage(self, path: str, calls: int, total_time: float, min_time: float, max_time: float) -> None:
+        statistics = self.stages.get(path)
+
+        if statistics is None:
+            self.stages[path] = {"calls": calls, "total_time": total_time, "min_time": min_time, "max_time": max_time}
+            return
+
+        statistics["calls"] += calls
+        statistics["total_time"] += total_time
+        statistics["min_time"] = min(statistics["min_time"], min_time)
+        statistics["max_time"] = max(statistics["max_time"], max_time)
+
+    def count(self, name: str, n: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def sample(self, name: str, value) -> None:
+        calls = self._sample_calls.get(name, 0)
+        self._sample_calls[name] = calls + 1
+
+        values = self.samples.setdefault(name, [])
+        if calls % self.sample_every != 0 or len(values) >= self.max_samples:
+            return
+
+        if callable(value):
+            value = value()
+
+        values.append(np.asarray(value).tolist() if isinstance(value, (np.ndarray, np.generic)) else value)
+
+    def stop(self) -> None:
+        self.wall_time = time.perf_counter() - self._start_time
+
+    def merge(self, other: "Profile", prefix: str = "") -> None:
+        """
+        Add the stages, counters and samples of another profile, e.g. of a worker process.
+
+        params:
+            other: Profile, profile to add
+            prefix: str, stage path under which the stages of the other profile are added, by default they are added as they are
+        """
+
+        for path, statistics in other.stages.items():
+            self._add_stage(f"{prefix}/{path}" if prefix else path, statistics["calls"], statistics["total_time"], statistics["min_time"],
+                            statistics["max_time"])
+
+        for name, n in other.counters.items():
+            self.count(name, n)
+
+        for name, values in other.samples.items():
+            stored_values = self.samples.setdefault(name, [])
+            stored_values.extend(values[:self.max_samples - len(stored_values)])
+
+    def report(self) -> dict:
+        """
+        Get the profile as a JSON serializable dict. The share of a stage is its total time relative to the wall time of the run.
+        """
+
+        wall_time = self.wall_time if self.wall_time is not None else time.perf_counter() - self._start_time
+
+        return {"wall_time": wall_time,
+                "stages": {path: {**statistics, "share": statistics["total_time"] / wall_time if wall_time > 0 else 0.0}
+                           for path, statistics in self.stages.items()},
+                "counters": dict(self.counters),
+                "samples": dict(self.samples)}
+
+    def format_report(self) -> str:
+        """
+        Format the stages and counters as a text table.
+        """
+
+        report = self.report()
+        width = max([len(name) for name in [*report["stages"], *report["counters"]]], default=0) + 2
+
+        lines = [f"Wall time: {report['wall_time']*1e3:.3f} ms", "",
+                 f"{'Stage':<{width}} {'Calls':>8} {'Total [ms]':>12} {'Mean [ms]':>12} {'Share':>7}"]
+
+        for path, statistics in sorted(report["stages"].items()):
+            lines.append(f"{path:<{width}} {statistics['calls']:>8} {statistics['total_time']*1e3:>12.3f} "
+                         f"{statistics['total_time']/statistics['calls']*1e3:>12.3f} {statistics['share']*100:>6.1f}%")
+
+        if report["counters"]:
+            lines += ["", f"{'Counter':<{width}} {'Value':>8}"]
+            lines += [f"{name:<{width}} {value:>8}" for name, value in sorted(report["counters"].items())]
+
+        return "\n".join(lines)
+
+    def save(self, path: str) -> None:
+        with open(path, "w") as report_file:
+            json.dump(self.report(), report_file, indent=2)
+
+
+def enable(sample_every: int = 1, max_samples: int = 100) -> Profile:
+    """
+    Start recording a new profile.
+
+    params:
+        sample_every: int, only every sample_every-th value of a sample name is recorded
+        max_samples: int, maximum number of recorded values per sample name
+
+    returns:
+        profile: Profile, profile that is recorded until disable is called
+    """
+
+    global _profile
+    _profile = Profile(sample_every, max_samples)
+
+    return _profile
+
+
+def disable() -> Profile:
+    """
+    Stop recording.
+
+    returns:
+        profile: Profile, the recorded profile or None if no profile was recorded
+    """
+
+    global _profile
+    profile, _profile = _profile, None
+
+    if profile is not None:
+        profile.stop()
+
+    return profile
+
+
+def get_profile() -> Profile:
+    return _profile
+
+
+@contextlib.contextmanager
+def profiling(sample_every: int = 1, max_samples: int = 100):
+    """
+    Record a profile within a with block, see enable.
+    """
+
+    profile = enable(sample_every, max_samples)
+
+    try:
+        yield profile
+    finally:
+        disable()
+
+
+def stage(name: str):
+    """
+    Time a part of a function as stage of the current profile.
+    """
+
+    if _profile is None:
+        return _disabled_stage
+
+    return _profile.stage(name)
+
+
+def staged(function):
+    """
+    Decorator that times every call of the function as stage of the current profile, named after the function.
+    """
+
+    name = function.__qualname__
+
+    @functools.wraps(function)
+    def staged_function(*args, **kwargs):
+        if _profile is None:
+            return function(*args, **kwargs)
+
+        with _profile.stage(name):
+            return function(*args, **kwargs)
+
+    return staged_function
+
+
+def count(name: str, n: int = 1) -> None:
+    if _profile is not None:
+        _profile.count(name, n)
+
+
+def sample(name: str, value) -> None:
+    if _profile is not None:
+        _profile.sample(name, value)
+
+
+def merge(profile: Profile) -> None:
+    """
+    Add a profile, e.g. the one returned by a worker process, to the current profile under the current stage.
+    """
+
+    if _profile is not None and profile is not None:
+        _profile.merge(profile, "/".join(_profile._stage_stack))
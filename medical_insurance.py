@@ -1,24 +1,156 @@
-import sys
-
 """
-It has been stages in some Twitter and LinkedIn posts that public health insurance in Germany is mind boggling high due to the number
-of people in it who get services but don't contibute to it.
+It has been stated in some Twitter and LinkedIn posts that public health insurance in Germany is mind boggling high due to the number
+of people in it who get services but don't contribute to it.
+
+This started as a very quick back of the envelope calculation to check this hypothesis, with the crude approximation that on average
+every person would contribute 350 EUR/month. That is not right due to the income distribution in Germany and the scheme of paying
+14.6 % (plus the additional rate) of the income up to the contribution ceiling.
 
-This was a very quick back on the envelope calculation to check this hypothesis.
+The model therefore computes the contributions per income bracket with the medical insurance rate and the social security limits of a
+TaxSchedule (the same parameters as TaxCalculator.calculate_german_social_security_tax) and the cross-subsidy between the contributing
+members and the insured people without own contributions (e.g. family members). It works on any income distribution, e.g. a
+microsimulation sample as BinnedIncomeDistribution.create(annual_incomes, np.ones(len(annual_incomes))).
 
-There is crude approximation that on average every person would contribute at least 350 EUR/month according to his/her income.
+Contribution rate scenarios are evaluated at once with a stacked schedule (see TaxSchedule), e.g.
 
-That might not be competely right due to the income distribution in Germany (and the according scheme of paying 14.6 % of income for public medical insurrance.)
+    tax_schedule = tax_schedules[2025].with_parameters(medical_insurance_rate=np.array([0.08, 0.09, 0.1])[:, None])
 
+gives one row of results per rate.
 """
 
-insurance_cost = 350
+import numpy as np
+
+import logging
+from dataclasses import dataclass
+
+import instrumentation
+from tax_autonomy_estimations import BinnedIncomeDistribution, IncomeDistribution, TaxSchedule, get_binned_income_distribution, get_tax_schedule
+
+
+@dataclass(frozen=True, slots=True, eq=False)
+class MedicalInsuranceResult:
+    """
+    Contributions and cross-subsidies of the public medical insurance, see calculate_medical_insurance_model.
+
+    All values are annual values in EUR. The values per bracket have the income brackets as last axis, in front of it are the axes of a
+    stacked schedule (e.g. one row per contribution rate).
+    """
+
+    annual_incomes: np.ndarray
+
+    # Contribution of a single member per income bracket
+    contributions: np.ndarray
+
+    # Contribution minus the cost per insured person per income bracket, positive for members who pay for others
+    cross_subsidies: np.ndarray
+
+    total_contributions: np.ndarray
+    cost_per_insured: np.ndarray
+
+    # Cost of the insured people without own contributions, i.e. the part of the contributions that pays for them
+    non_contributor_cost: np.ndarray
+
+    # Total contributions minus the total cost of all insured people, 0 if the cost per insured person is not given
+    balance: np.ndarray
+
+
+def calculate_medical_insurance_contribution(income: float | np.ndarray, tax_schedule: TaxSchedule | int = 2025,
+                                             include_employer_part: bool = True) -> float | np.ndarray:
+    """
+    Calculate the public medical insurance contribution of an annual income.
+
+    As for the social security tax there is no contribution up to the lower limit and the contribution is capped at the upper limit
+    (the contribution ceiling).
+
+    params:
+        income: float or np.ndarray, annual income in EUR
+        tax_schedule: TaxSchedule or int, tax schedule or its year, can be a stacked schedule that is broadcast against the income
+        include_employer_part: bool, if True, the employer pays the same contribution on top of the employee part of the schedule
+
+    returns:
+        contribution: float or np.ndarray, annual contribution in EUR with the broadcast shape of income and the schedule
+    """
+
+    tax_schedule = get_tax_schedule(tax_schedule)
+
+    income_array = np.asarray(income, dtype=float)
+
+    contributing_income = np.where(income_array <= tax_schedule.social_security_lower_limit, 0.0,
+                                   np.minimum(income_array, tax_schedule.social_security_upper_limit))
+    contribution = contributing_income * tax_schedule.medical_insurance_rate * (2 if include_employer_part else 1)
+
+    if contribution.ndim == 0:
+        return float(contribution)
+
+    return contribution
+
+
+@instrumentation.staged
+def calculate_medical_insurance_model(income_distribution: BinnedIncomeDistribution | list, number_of_members: float = 58e6,
+                                      number_of_non_contributors: float = 16e6, annual_cost_per_insured: float | np.ndarray = None,
+                                      include_employer_part: bool = True, tax_schedule: TaxSchedule | int = 2025) -> MedicalInsuranceResult:
+    """
+    Calculate the contributions per income bracket and the cross-subsidy between the members and the insured people without own contributions.
+
+    The members are distributed over the income brackets according to the income distribution. Members below the lower social security
+    limit do not contribute either, but they are counted as members. Without a given cost per insured person the insurance breaks even,
+    i.e. the cost per insured person is the total contribution divided by all insured people.
+
+    params:
+        income_distribution: BinnedIncomeDistribution or list, list of annual income values of the members and their probabilities
+        number_of_members: float, number of insured people with own income (members)
+        number_of_non_contributors: float, number of insured people without own contributions
+        annual_cost_per_insured: float or np.ndarray, annual cost of the insurance per insured person in EUR, by default the break-even cost
+        include_employer_part: bool, if True, the employer pays the same contribution on top of the employee part of the schedule
+        tax_schedule: TaxSchedule or int, tax schedule or its year, can be a stacked schedule, e.g. for many contribution rates
+
+    returns:
+        result: MedicalInsuranceResult
+    """
+
+    distribution = get_binned_income_distribution(income_distribution)
+    members_per_bracket = number_of_members * distribution.weights / distribution.total_weight
+
+    contributions = calculate_medical_insurance_contribution(distribution.annual_incomes, tax_schedule, include_employer_part)
+    total_contributions = np.sum(contributions * members_per_bracket, axis=-1)
+
+    number_of_insured = number_of_members + number_of_non_contributors
+
+    if annual_cost_per_insured is None:
+        cost_per_insured = total_contributions / number_of_insured
+    else:
+        cost_per_insured = np.broadcast_to(np.asarray(annual_cost_per_insured, dtype=float), total_contributions.shape)
+
+    instrumentation.count("calculate_medical_insurance_model.brackets", contributions.size)
+
+    return MedicalInsuranceResult(annual_incomes=distribution.annual_incomes, contributions=contributions,
+                                  cross_subsidies=contributions - np.asarray(cost_per_insured)[..., None], total_contributions=total_contributions,
+                                  cost_per_insured=cost_per_insured, non_contributor_cost=cost_per_insured * number_of_non_contributors,
+                                  balance=total_contributions - cost_per_insured * number_of_insured)
+
+
+if __name__ == "__main__":
+
+    logging.basicConfig(level=logging.INFO, format='%(funcName)s:  %(message)s')
+
+    # The original back of the envelope estimate: 350 EUR/month per member, paid for all insured people
+    insurance_cost = 350
+    total_payers = 58e6
+    total_nonpayers = 74e6-58e6
+    logging.info(f"Flat estimate of the effective monthly payment per member: {(total_payers+total_nonpayers)/total_payers*insurance_cost:.0f} EUR")
 
-total_payers = 58e6 
-total_nonpayers = 74e6-58e6
+    result = calculate_medical_insurance_model(IncomeDistribution.income_distribution_germany_annual_pretax_2025, total_payers, total_nonpayers)
+    logging.info(f"Total contributions: {result.total_contributions/1e9:.1f} billion EUR, break-even cost per insured person: "
+                 f"{result.cost_per_insured/12:.0f} EUR/month, paid for people without contributions: {result.non_contributor_cost/1e9:.1f} billion EUR")
 
-total_payments = insurance_cost * total_payers
+    for annual_income, contribution, cross_subsidy in zip(result.annual_incomes, result.contributions, result.cross_subsidies):
+        logging.info(f"Income {annual_income:>9.0f} EUR: contribution {contribution/12:6.0f} EUR/month, cross-subsidy {cross_subsidy/12:6.0f} EUR/month")
 
-effective_monthly_payment = (total_payers+total_nonpayers)/total_payers*insurance_cost
+    # Contribution rate scenarios (employee part, the employer pays the same) in one evaluation
+    medical_insurance_rates = np.linspace(0.07, 0.1, 7)
+    tax_schedule = get_tax_schedule(2025).with_parameters(medical_insurance_rate=medical_insurance_rates[:, None])
+    result = calculate_medical_insurance_model(IncomeDistribution.income_distribution_germany_annual_pretax_2025, total_payers, total_nonpayers,
+                                               annual_cost_per_insured=4000, tax_schedule=tax_schedule)
 
-print(effective_monthly_payment)
\ No newline at end of file
+    for medical_insurance_rate, balance in zip(medical_insurance_rates, result.balance):
+        logging.info(f"Rate {2*medical_insurance_rate*100:.1f} %: balance at 4000 EUR per insured person {balance/1e9:7.1f} billion EUR")
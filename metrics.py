@@ -0,0 +1,260 @@
+"""
+Inequality and fiscal balance metrics of the incomes before and after the redistribution of the income cap and the economy subsidy.
+
+The outcome of an income bracket (or of an individual of a microsimulation) is its annual post tax income, i.e. after the income tax and the
+social security tax. Before the redistribution this is the post tax income alone, after the redistribution the income support is added,
+which is positive below the cap and the (negative) difference to the income tax at the cap above it.
+
+All metrics are vectorized over leading scenario axes, e.g. the (caps, subsidies, income brackets) support of
+calculate_income_support_batched gives metrics with the shape (caps, subsidies):
+    - the Lorenz curve, from one sort along the income brackets and cumulative sums of the weights and weighted incomes
+    - the Gini coefficient as the area between the Lorenz curve and the diagonal, exact for incomes that are constant within a bracket
+    - the share of the total income of the top decile, interpolated on the Lorenz curve
+    - the total income tax, the total support paid below the cap, the total difference collected above it and the net balance
+
+The totals are scaled to the number of citizens. They are compensated sums (see compensated_sum), so that the totals over a population
+(e.g. 83 million individuals of a microsimulation) do not depend on the order or the number of the summands. The support per bracket is
+taken as the annual support per person, as in calculate_years_to_reach_capital, so the support paid and the difference collected are not
+balanced by construction.
+"""
+
+import numpy as np
+
+import logging
+from dataclasses import dataclass
+
+import instrumentation
+from tax_autonomy_estimations import (BinnedIncomeDistribution, IncomeDistribution, TaxCalculator, TaxSchedule, calculate_income_support_batched,
+                                      get_binned_income_distribution)
+
+
+@dataclass(frozen=True, slots=True, eq=False)
+class RedistributionMetrics:
+    """
+    Metrics before and after the redistribution, see calculate_redistribution_metrics.
+    The metrics have the leading (scenario) axes of the income support, the Lorenz curves have one more axis with the brackets plus one points.
+    The Lorenz curve before the redistribution does not depend on the scenario and only has the axis of the points.
+    Totals are annual totals in EUR for all citizens.
+    """
+
+    # Cumulative population and income shares, starting at 0 and ending at 1
+    population_shares_before: np.ndarray
+    income_shares_before: np.ndarray
+    population_shares_after: np.ndarray
+    income_shares_after: np.ndarray
+
+    gini_before: np.ndarray
+    gini_after: np.ndarray
+    top_decile_share_before: np.ndarray
+    top_decile_share_after: np.ndarray
+
+    total_income_tax: np.ndarray
+
+    # Support paid to the brackets below the cap and tax difference collected from the brackets above it, both positive
+    total_support_paid: np.ndarray
+    total_support_collected: np.ndarray
+
+    # Collected minus paid, negative if the scheme has to be financed, e.g. by the economy subsidy
+    fiscal_balance: np.ndarray
+
+
+def compensated_sum(values: np.ndarray, axis: int = -1) -> np.ndarray:
+    """
+    Sum along an axis with compensation of the rounding errors.
+
+    The values are added pairwise in log2(n) vectorized passes. The rounding error of every addition is computed exactly (TwoSum) and the
+    errors are added to the result at the end, which gives the correctly rounded sum for all but extremely ill-conditioned sums.
+
+    params:
+        values: np.ndarray, values to sum
+        axis: int, axis to sum along
+
+    returns:
+        total: np.ndarray, sums with the shape of the values without the axis
+    """
+
+    values = np.moveaxis(np.asarray(values, dtype=float), axis, -1)
+    errors = np.zeros(values.shape[:-1])
+
+    if values.shape[-1] == 0:
+        return errors
+
+    while values.shape[-1] > 1:
+        # The first half is added to the second half, which reads both halves contiguously
+        half = values.shape[-1] // 2
+        first, second = values[..., :half], values[..., half:2*half]
+        total = first + second
+
+        # TwoSum: the exact rounding error of first + second
+        second_rounded = total - first
+        errors += np.sum((first - (total - second_rounded)) + (second - second_rounded), axis=-1)
+
+        values = np.concatenate([total, values[..., 2*half:]], axis=-1) if values.shape[-1] % 2 else total
+
+    return values[..., 0] + errors
+
+
+def get_lorenz_curve(incomes: np.ndarray, weights: np.ndarray) -> tuple:
+    """
+    Get the Lorenz curve of incomes with weights, the incomes of every row of the leading axes are sorted separately.
+
+    params:
+        incomes: np.ndarray, incomes with the income brackets (or individuals) as last axis
+        weights: np.ndarray, weights of the incomes, broadcast against the incomes
+
+    returns:
+        population_shares: np.ndarray, cumulative population shares with the shape (..., n + 1), starting at 0
+        income_shares: np.ndarray, cumulative income shares with the shape (..., n + 1), starting at 0
+    """
+
+    incomes = np.asarray(incomes, dtype=float)
+    weights = np.broadcast_to(np.asarray(weights, dtype=float), incomes.shape)
+
+    # Equal incomes give the same curve in any order, so the sort does not need to be stable
+    order = np.argsort(incomes, axis=-1)
+    sorted_incomes = np.take_along_axis(incomes, order, axis=-1)
+    sorted_weights = np.take_along_axis(weights, order, axis=-1)
+
+    # The cumulative sums are scaled with their last values, so the curves end exactly at 1
+    cumulative_weights = np.cumsum(sorted_weights, axis=-1)
+    cumulative_incomes = np.cumsum(sorted_weights * sorted_incomes, axis=-1)
+
+    population_shares = cumulative_weights / cumulative_weights[..., -1:]
+    income_shares = cumulative_incomes / cumulative_incomes[..., -1:]
+
+    padding = [(0, 0)] * (incomes.ndim - 1) + [(1, 0)]
+
+    return np.pad(population_shares, padding), np.pad(income_shares, padding)
+
+
+def get_gini_coefficient(population_shares: np.ndarray, income_shares: np.ndarray) -> np.ndarray:
+    """
+    Get the Gini coefficient of a Lorenz curve, i.e. one minus twice the area below the curve.
+
+    params:
+        population_shares: np.ndarray, cumulative population shares as returned by get_lorenz_curve
+        income_shares: np.ndarray, cumulative income shares as returned by get_lorenz_curve
+
+    returns:
+        gini: np.ndarray, Gini coefficients with the leading axes of the curve
+    """
+
+    return 1 - np.sum(np.diff(population_shares, axis=-1) * (income_shares[..., 1:] + income_shares[..., :-1]), axis=-1)
+
+
+def get_top_share(population_shares: np.ndarray, income_shares: np.ndarray, top_fraction: float = 0.1) -> np.ndarray:
+    """
+    Get the share of the total income of the richest fraction of the population, interpolated linearly on the Lorenz curve.
+
+    params:
+        population_shares: np.ndarray, cumulative population shares as returned by get_lorenz_curve
+        income_shares: np.ndarray, cumulative income shares as returned by get_lorenz_curve
+        top_fraction: float, fraction of the population, e.g. 0.1 for the top decile
+
+    returns:
+        top_share: np.ndarray, income shares with the leading axes of the curve
+    """
+
+    population_share = 1 - top_fraction
+
+    # Segment of the Lorenz curve that contains the population share
+    end = np.clip(np.sum(population_shares < population_share, axis=-1, keepdims=True), 1, population_shares.shape[-1] - 1)
+    start_population, end_population = np.take_along_axis(population_shares, end - 1, axis=-1), np.take_along_axis(population_shares, end, axis=-1)
+    start_income, end_income = np.take_along_axis(income_shares, end - 1, axis=-1), np.take_along_axis(income_shares, end, axis=-1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fraction = np.where(end_population > start_population, (population_share - start_population) / (end_population - start_population), 0.0)
+
+    return 1 - (start_income + fraction * (end_income - start_income))[..., 0]
+
+
+@instrumentation.staged
+def calculate_redistribution_metrics(annual_incomes: np.ndarray, weights: np.ndarray, income_support: np.ndarray, number_of_citizens: float = 1,
+                                     tax_schedule: TaxSchedule | int = 2025) -> RedistributionMetrics:
+    """
+    Calculate the inequality and fiscal balance metrics before and after the redistribution, see the module docstring.
+
+    params:
+        annual_incomes: np.ndarray, annual pretax incomes in EUR of the income brackets or of the individuals of a microsimulation
+        weights: np.ndarray, probabilities of the income brackets, or ones for individuals
+        income_support: np.ndarray, income support per income bracket with leading scenario axes, e.g. from calculate_income_support_batched
+        number_of_citizens: float, number of citizens in the country, the weights are normalized to it
+        tax_schedule: TaxSchedule or int, tax schedule or its year
+
+    returns:
+        metrics: RedistributionMetrics
+    """
+
+    annual_incomes = np.asarray(annual_incomes, dtype=float)
+    weights = np.broadcast_to(np.asarray(weights, dtype=float), annual_incomes.shape)
+    income_support = np.asarray(income_support, dtype=float)
+
+    citizens = number_of_citizens * weights / compensated_sum(weights)
+
+    income_taxes = TaxCalculator.calculate_german_income_tax(annual_incomes, tax_schedule)
+    post_tax_incomes = annual_incomes - income_taxes - TaxCalculator.calculate_german_social_security_tax(annual_incomes, tax_schedule)
+
+    instrumentation.count("calculate_redistribution_metrics.brackets", income_support.size)
+
+    population_shares_before, income_shares_before = get_lorenz_curve(post_tax_incomes, citizens)
+    population_shares_after, income_shares_after = get_lorenz_curve(post_tax_incomes + income_support, citizens)
+
+    total_support_paid = compensated_sum(citizens * np.maximum(income_support, 0))
+    total_support_collected = compensated_sum(citizens * np.maximum(-income_support, 0))
+
+    # The metrics before the redistribution are the same for all scenarios
+    def broadcast_to_scenarios(values):
+        return np.broadcast_to(values, total_support_paid.shape)
+
+    return RedistributionMetrics(population_shares_before=population_shares_before, income_shares_before=income_shares_before,
+                                 population_shares_after=population_shares_after, income_shares_after=income_shares_after,
+                                 gini_before=broadcast_to_scenarios(get_gini_coefficient(population_shares_before, income_shares_before)),
+                                 gini_after=get_gini_coefficient(population_shares_after, income_shares_after),
+                                 top_decile_share_before=broadcast_to_scenarios(get_top_share(population_shares_before, income_shares_before)),
+                                 top_decile_share_after=get_top_share(population_shares_after, income_shares_after),
+                                 total_income_tax=broadcast_to_scenarios(compensated_sum(citizens * income_taxes)),
+                                 total_support_paid=total_support_paid, total_support_collected=total_support_collected,
+                                 fiscal_balance=total_support_collected - total_support_paid)
+
+
+def calculate_scenario_metrics(income_distribution: BinnedIncomeDistribution | list, annual_income_caps: float | np.ndarray, number_of_citizens: float = 1,
+                               economy_subsidies: float | np.ndarray = 0, tax_schedule: TaxSchedule | int = 2025) -> RedistributionMetrics:
+    """
+    Calculate the metrics of all combinations of annual income caps and economy subsidies with the support of calculate_income_support_batched.
+
+    params:
+        income_distribution: BinnedIncomeDistribution or list, list of annual income values and their probabilities
+        annual_income_caps: float or np.ndarray, 1D array of annual income caps in EUR
+        number_of_citizens: float, number of citizens in the country
+        economy_subsidies: float or np.ndarray, 1D array of additional income subsidies through economic profits in EUR
+        tax_schedule: TaxSchedule or int, tax schedule or its year
+
+    returns:
+        metrics: RedistributionMetrics, with the shape (caps, subsidies)
+    """
+
+    distribution = get_binned_income_distribution(income_distribution)
+    income_support, _ = calculate_income_support_batched(distribution, annual_income_caps, number_of_citizens, economy_subsidies, tax_schedule)
+
+    return calculate_redistribution_metrics(distribution.annual_incomes, distribution.weights, income_support, number_of_citizens, tax_schedule)
+
+
+if __name__ == "__main__":
+
+    logging.basicConfig(level=logging.INFO, format='%(funcName)s:  %(message)s')
+
+    income_distribution = IncomeDistribution.cutoff_income_distribution(IncomeDistribution.income_distribution_germany_annual_pretax_2025, 20e3)
+
+    annual_income_caps = np.array([60e3, 100e3, 200e3])
+    economy_subsidies = np.array([0, 300e9, 1000e9])
+    metrics = calculate_scenario_metrics(income_distribution, annual_income_caps, 83e6, economy_subsidies)
+
+    logging.info(f"Before the redistribution: Gini {metrics.gini_before[0, 0]:.3f}, top decile share {metrics.top_decile_share_before[0, 0]*100:.1f} %, "
+                 f"income tax {metrics.total_income_tax[0, 0]/1e9:.0f} billion EUR")
+
+    for i, annual_income_cap in enumerate(annual_income_caps):
+        for j, economy_subsidy in enumerate(economy_subsidies):
+            logging.info(f"Cap {annual_income_cap/1e3:.0f}k EUR, subsidy {economy_subsidy/1e9:4.0f} billion EUR: Gini {metrics.gini_after[i, j]:.3f}, "
+                         f"top decile share {metrics.top_decile_share_after[i, j]*100:.1f} %, "
+                         f"paid {metrics.total_support_paid[i, j]/1e9:6.0f}, collected {metrics.total_support_collected[i, j]/1e9:4.0f}, "
+                         f"balance {metrics.fiscal_balance[i, j]/1e9:6.0f} billion EUR")
@@ -0,0 +1,209 @@
+import numpy as np
+
+import logging
+
+import instrumentation
+from tax_autonomy_estimations import (BinnedIncomeDistribution, IncomeDistribution, TaxCalculator, TaxSchedule, calculate_number_of_years_batched,
+                                      get_binned_income_distribution)
+
+
+def sample_individuals(income_distribution: BinnedIncomeDistribution | list, number_of_individuals: int, seed: int = 0, chunk_size: int = 1_000_000):
+    """
+    Draw synthetic individuals from a binned income distribution in chunks of fixed size.
+
+    The bin of every individual is drawn according to the probabilities of the distribution, the income is drawn uniformly
+    between the edges of the bin (see get_bin_edges). The same seed always gives the same individuals, so the population can be
+    generated again instead of keeping it in memory.
+
+    params:
+        income_distribution: BinnedIncomeDistribution or list, list of annual income values and their probabilities
+        number_of_individuals: int, total number of individuals to draw
+        seed: int, seed of the random number generator
+        chunk_size: int, maximum number of individuals per chunk
+
+    yields:
+        bin_index: np.ndarray, index of the income bin (in the order of income_distribution) of every individual of the chunk
+        annual_incomes: np.ndarray, annual income in EUR of every individual of the chunk
+    """
+
+    distribution = get_binned_income_distribution(income_distribution)
+    order, bin_edges = distribution.get_bin_edges()
+    probabilities = distribution.weights[order] / distribution.total_weight
+
+    rng = np.random.default_rng(seed)
+
+    for start in range(0, number_of_individuals, chunk_size):
+        size = min(chunk_size, number_of_individuals - start)
+
+        sorted_bin_index = rng.choice(len(probabilities), size=size, p=probabilities)
+        annual_incomes = bin_edges[sorted_bin_index] + rng.random(size) * (bin_edges[sorted_bin_index + 1] - bin_edges[sorted_bin_index])
+
+        yield order[sorted_bin_index], annual_incomes
+
+
+def get_years_percentile(years_histogram: np.ndarray, percentile: float) -> np.ndarray:
+    """
+    Get a percentile of the years to reach sufficient capital from the histograms returned by run_microsimulation.
+
+    params:
+        years_histogram: np.ndarray, number of individuals per year count, the last axis is the number of years
+        percentile: float, percentile in percent
+
+    returns:
+        years: np.ndarray, smallest number of years that at least the given percentage of the individuals need
+    """
+
+    cumulative_counts = np.cumsum(years_histogram, axis=-1)
+    threshold = cumulative_counts[..., -1:] * percentile / 100
+
+    return np.argmax(cumulative_counts >= threshold, axis=-1)
+
+
+@instrumentation.staged
+def run_microsimulation(income_distribution: BinnedIncomeDistribution | list, number_of_individuals: int, interest_rate_low_risk: float = 0.05,
+                        interest_rates: list = [0.03, 0.07, 0.14, 0.2], annual_income_cap: float = 500e3, number_of_citizens: float = 1,
+                        economy_subsidy: float = 0, seed: int = 0, chunk_size: int = 1_000_000, max_years: int = 100,
+                        tax_schedule: TaxSchedule | int = 2025) -> dict:
+    """
+    Microsimulation of the tax, income support and years-to-capital pipeline for synthetic individuals instead of bin midpoints.
+
+    The individuals are drawn with sample_individuals and processed in chunks, so the peak memory only depends on the chunk size and not on
+    the number of individuals. The population is generated twice from the same seed:
+        1. The first pass accumulates the income tax above the annual income cap and the share of individuals below the cap per bin.
+        2. The second pass distributes the support in the same way as calculate_income_support does for the bins, i.e. individuals below the
+           cap get the support of their bin and individuals above the cap pay the difference to the income tax at the cap. Afterwards the
+           years to reach sufficient capital are computed and all statistics are accumulated.
+
+    params:
+        income_distribution: BinnedIncomeDistribution or list, list of annual income values and their probabilities
+        number_of_individuals: int, number of synthetic individuals, e.g. the number of citizens
+        interest_rate_low_risk: float, assumed annual interest rate for the time when the capital serves as passive income
+        interest_rates: list of assumed annual interest rates for the capital growth phase
+        annual_income_cap: float, annual income in EUR that would represent "the maximum income needed" even if the current annual income is higher.
+        number_of_citizens: float, number of citizens in the country - used to compute the additional income subsidy through profits of the companies in a country.
+        economy_subsidy: float, additional income subsidy through economic profits in EUR
+        seed: int, seed of the random number generator
+        chunk_size: int, number of individuals that are processed at once
+        max_years: int, maximum number of years that are considered
+        tax_schedule: TaxSchedule or int, tax schedule or its year
+
+    returns:
+        statistics: dict, with the entries
+            number_of_individuals: int, number of simulated individuals
+            mean_income: float, mean annual income in EUR
+            mean_income_tax: float, mean annual income tax in EUR
+            mean_social_security_tax: float, mean annual social security tax in EUR
+            mean_income_support: float, mean annual income support in EUR
+            accumulated_support_difference: float, accumulated income tax difference above the annual income cap, normalized like calculate_income_support
+            years_histogram: np.ndarray, number of individuals per number of years with the shape (interest rates, max_years + 2)
+            years_no_support_histogram: np.ndarray, same as years_histogram without the income support
+            counts_per_bin: np.ndarray, number of individuals per bin of the distribution
+            mean_years_per_bin: np.ndarray, mean number of years per bin with the shape (interest rates, bins)
+            mean_income_support_per_bin: np.ndarray, mean annual income support per bin in EUR
+    """
+
+    income_distribution = get_binned_income_distribution(income_distribution)
+
+    interest_rates = np.asarray(interest_rates, dtype=float)
+    number_of_bins = len(income_distribution)
+    number_of_year_counts = max_years + 2
+
+    income_tax_at_cap = TaxCalculator.calculate_german_income_tax(annual_income_cap, tax_schedule)
+
+    # First pass: accumulate the income tax above the cap and the number of individuals below the cap per bin
+    income_tax_over_cap = 0.0
+    income_tax_under_cap = 0.0
+    counts_below_cap_per_bin = np.zeros(number_of_bins)
+
+    for bin_index, annual_incomes in sample_individuals(income_distribution, number_of_individuals, seed, chunk_size):
+        income_taxes = TaxCalculator.calculate_german_income_tax(annual_incomes, tax_schedule)
+        below_cap = annual_incomes < annual_income_cap
+
+        income_tax_under_cap += np.sum(income_tax_at_cap - income_taxes[below_cap])
+        income_tax_over_cap += np.sum(income_tax_at_cap - income_taxes[~below_cap])
+        counts_below_cap_per_bin += np.bincount(bin_index[below_cap], minlength=number_of_bins)
+
+    # Every individual carries the same share of the total probability of the (possibly cut off) distribution, as the bins do
+    percentage_per_individual = income_distribution.total_weight / number_of_individuals
+
+    income_tax_under_cap *= percentage_per_individual
+    income_tax_over_cap *= percentage_per_individual
+    percentage_below_cap_per_bin = counts_below_cap_per_bin * percentage_per_individual
+    total_percentage_below_income_cap = percentage_below_cap_per_bin.sum()
+
+    number_of_citizens_below_income_cap = number_of_citizens * total_percentage_below_income_cap
+    support_per_bin_below_cap = ((np.abs(income_tax_over_cap) + economy_subsidy / number_of_citizens_below_income_cap)
+                                 * percentage_below_cap_per_bin / total_percentage_below_income_cap)
+
+    instrumentation.sample("run_microsimulation.total_percentage_below_income_cap", total_percentage_below_income_cap)
+
+    # Second pass: income support, years to reach sufficient capital and statistics
+    sum_income = 0.0
+    sum_income_tax = 0.0
+    sum_social_security_tax = 0.0
+    sum_income_support = 0.0
+
+    counts_per_bin = np.zeros(number_of_bins)
+    sum_years_per_bin = np.zeros((len(interest_rates), number_of_bins))
+    sum_income_support_per_bin = np.zeros(number_of_bins)
+
+    years_histogram = np.zeros((len(interest_rates), number_of_year_counts), dtype=np.int64)
+    years_no_support_histogram = np.zeros((len(interest_rates), number_of_year_counts), dtype=np.int64)
+    histogram_offsets = (np.arange(len(interest_rates)) * number_of_year_counts)[:, None]
+
+    for bin_index, annual_incomes in sample_individuals(income_distribution, number_of_individuals, seed, chunk_size):
+        instrumentation.count("run_microsimulation.chunks")
+        instrumentation.count("run_microsimulation.individuals", len(annual_incomes))
+
+        income_taxes = TaxCalculator.calculate_german_income_tax(annual_incomes, tax_schedule)
+
+        income_support = np.where(annual_incomes < annual_income_cap, support_per_bin_below_cap[bin_index], income_tax_at_cap - income_taxes)
+
+        years, _ = calculate_number_of_years_batched(interest_rates[:, None], interest_rate_low_risk, annual_incomes[None, :], annual_income_cap,
+                                                     income_support[None, :], max_years, tax_schedule)
+        years_no_support, _ = calculate_number_of_years_batched(interest_rates[:, None], interest_rate_low_risk, annual_incomes[None, :],
+                                                                annual_income_cap, 0.0, max_years, tax_schedule)
+
+        sum_income += np.sum(annual_incomes)
+        sum_income_tax += np.sum(income_taxes)
+        sum_social_security_tax += np.sum(TaxCalculator.calculate_german_social_security_tax(annual_incomes, tax_schedule))
+        sum_income_support += np.sum(income_support)
+
+        counts_per_bin += np.bincount(bin_index, minlength=number_of_bins)
+        sum_income_support_per_bin += np.bincount(bin_index, weights=income_support, minlength=number_of_bins)
+        for rate_index in range(len(interest_rates)):
+            sum_years_per_bin[rate_index] += np.bincount(bin_index, weights=years[rate_index], minlength=number_of_bins)
+
+        years_histogram += np.bincount((years + histogram_offsets).ravel(), minlength=years_histogram.size).reshape(years_histogram.shape)
+        years_no_support_histogram += np.bincount((years_no_support + histogram_offsets).ravel(),
+                                                  minlength=years_histogram.size).reshape(years_histogram.shape)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_years_per_bin = sum_years_per_bin / counts_per_bin
+        mean_income_support_per_bin = sum_income_support_per_bin / counts_per_bin
+
+    return {"number_of_individuals": number_of_individuals,
+            "mean_income": sum_income / number_of_individuals,
+            "mean_income_tax": sum_income_tax / number_of_individuals,
+            "mean_social_security_tax": sum_social_security_tax / number_of_individuals,
+            "mean_income_support": sum_income_support / number_of_individuals,
+            "accumulated_support_difference": income_tax_under_cap - np.abs(income_tax_over_cap),
+            "years_histogram": years_histogram,
+            "years_no_support_histogram": years_no_support_histogram,
+            "counts_per_bin": counts_per_bin,
+            "mean_years_per_bin": mean_years_per_bin,
+            "mean_income_support_per_bin": mean_income_support_per_bin}
+
+
+if __name__ == "__main__":
+
+    logging.basicConfig(level=logging.INFO, format='%(funcName)s:  %(message)s')
+
+    income_distribution = IncomeDistribution.cutoff_income_distribution(IncomeDistribution.income_distribution_germany_annual_pretax_2025, 20e3)
+    interest_rates = [0.07, 0.14]
+
+    statistics = run_microsimulation(income_distribution, number_of_individuals=int(10e6), interest_rate_low_risk=0.05, interest_rates=interest_rates,
+                                     annual_income_cap=100e3, number_of_citizens=83e6, economy_subsidy=1000e9)
+
+    for interest_rate, median_years in zip(interest_rates, get_years_percentile(statistics["years_histogram"], 50)):
+        logging.info(f"Annual return rate: {interest_rate*100:.1f} % - median years to reach sufficient capital: {median_years}")
@@ -0,0 +1,159 @@
+import numpy as np
+
+import os
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+import instrumentation
+from tax_autonomy_estimations import IncomeDistribution, TaxCalculator, TaxSchedule, calculate_income_support
+from microsimulation import get_years_percentile
+
+
+def draw_annual_returns(rng: np.random.Generator, return_model: dict, number_of_paths: int, number_of_years: int) -> np.ndarray:
+    """
+    Draw annual returns for many return paths.
+
+    Two return models are supported:
+        {"mean": 0.07, "volatility": 0.15}: lognormal returns, i.e. log(1 + return) is normally distributed with the given volatility
+            and the expected annual return equals the mean.
+        {"historical_returns": [...]}: annual returns are bootstrapped, i.e. drawn with replacement from the given historical returns.
+
+    params:
+        rng: np.random.Generator, random number generator
+        return_model: dict, description of the return model, see above
+        number_of_paths: int, number of return paths
+        number_of_years: int, number of years per path
+
+    returns:
+        annual_returns: np.ndarray, annual returns with the shape (paths, years) (e.g. 20% would be 0.2)
+    """
+
+    if "historical_returns" in return_model:
+        historical_returns = np.asarray(return_model["historical_returns"], dtype=float)
+        return rng.choice(historical_returns, size=(number_of_paths, number_of_years))
+
+    volatility = return_model["volatility"]
+    mean_log_return = np.log1p(return_model["mean"]) - volatility**2 / 2
+
+    return np.expm1(rng.normal(mean_log_return, volatility, size=(number_of_paths, number_of_years)))
+
+
+@instrumentation.staged
+def _simulate_years_histogram(seed_sequence: np.random.SeedSequence, return_model: dict, number_of_paths: int, capital_ratios: np.ndarray,
+                              max_years: int) -> np.ndarray:
+    """
+    Simulate one chunk of return paths and count the years to reach sufficient capital per income bracket.
+
+    Since the capital of every bracket is its annual payment times the capital of a payment of 1 EUR per year, all brackets share the
+    same paths. The capital of 1 EUR per year after n years is A_n = G_n * sum_{k<=n} 1/G_k with the cumulative growth G_n, and a bracket
+    has reached sufficient capital once A_n is at least its ratio of required capital to annual payment.
+
+    returns:
+        years_histogram: np.ndarray, number of paths per number of years with the shape (brackets, max_years + 2)
+    """
+
+    instrumentation.count("simulate_years_to_capital.paths", number_of_paths)
+
+    rng = np.random.default_rng(seed_sequence)
+    annual_returns = draw_annual_returns(rng, return_model, number_of_paths, max_years)
+
+    cumulative_growth = np.cumprod(1 + annual_returns, axis=1)
+    unit_capital = cumulative_growth * np.cumsum(1 / cumulative_growth, axis=1)
+
+    # Capital can fall after losses, but a bracket is finished the first time it is reached, so only the running maximum matters
+    np.maximum.accumulate(unit_capital, axis=1, out=unit_capital)
+
+    # Number of brackets that are reached in every year and path
+    sorted_ratios = np.sort(capital_ratios)
+    brackets_reached = np.searchsorted(sorted_ratios, unit_capital, side="right")
+
+    # Per path: number of years in which at most L brackets are reached, for L = 0 ... number of brackets
+    number_of_brackets = len(capital_ratios)
+    path_offsets = (np.arange(number_of_paths) * (number_of_brackets + 1))[:, None]
+    years_with_at_most = np.cumsum(np.bincount((brackets_reached + path_offsets).ravel(), minlength=number_of_paths * (number_of_brackets + 1))
+                                   .reshape(number_of_paths, number_of_brackets + 1), axis=1)
+
+    # A bracket is not yet reached as long as at most the number of brackets with a strictly smaller ratio are reached
+    brackets_below = np.searchsorted(sorted_ratios, capital_ratios, side="left")
+    years = 1 + years_with_at_most[:, brackets_below]
+
+    years = np.where(capital_ratios[None, :] <= 0, 0, years)
+    years = np.where(np.isinf(capital_ratios)[None, :], max_years + 1, years)
+
+    bracket_offsets = (np.arange(number_of_brackets) * (max_years + 2))[None, :]
+    return np.bincount((years + bracket_offsets).ravel(), minlength=number_of_brackets * (max_years + 2)).reshape(number_of_brackets, max_years + 2)
+
+
+@instrumentation.staged
+def simulate_years_to_capital(annual_incomes: np.ndarray, return_models: list, interest_rate_low_risk: float = 0.05, annual_income_cap: float = 500e3,
+                              income_support: float | np.ndarray = 0.0, number_of_paths: int = 100_000, max_years: int = 100, seed: int = 0,
+                              chunk_size: int = 100_000, max_workers: int = 1, tax_schedule: TaxSchedule | int = 2025) -> np.ndarray:
+    """
+    Monte Carlo version of calculate_number_of_years with stochastic instead of fixed annual returns.
+
+    For every return model the paths are simulated in chunks of chunk_size paths (see _simulate_years_histogram). Every chunk has its own
+    random stream spawned from the seed, so the result does not depend on the number of workers. The chunks can run in a process pool.
+
+    params:
+        annual_incomes: np.ndarray, annual incomes in EUR
+        return_models: list, list of return models, see draw_annual_returns
+        interest_rate_low_risk: float, annual interest rate for the time when the capital serves as passive income
+        annual_income_cap: float, annual income in EUR that would represent "the maximum income needed" even if the current annual income is higher.
+        income_support: float or np.ndarray, annual income support in EUR per income
+        number_of_paths: int, number of return paths per return model
+        max_years: int, maximum number of years that are considered, paths that need longer count as max_years + 1
+        seed: int, seed of the random number generator
+        chunk_size: int, number of paths that are simulated at once
+        max_workers: int, number of worker processes. With 1 the simulation runs in the current process, None uses all cores.
+        tax_schedule: TaxSchedule or int, tax schedule or its year
+
+    returns:
+        years_histogram: np.ndarray, number of paths per number of years with the shape (return models, incomes, max_years + 2),
+            see microsimulation.get_years_percentile for percentiles
+    """
+
+    annual_incomes = np.asarray(annual_incomes, dtype=float)
+
+    annual_income_net = TaxCalculator.calculcate_post_tax_income(np.minimum(annual_incomes, annual_income_cap), tax_schedule)
+    total_required_capital = annual_income_net / interest_rate_low_risk
+    annual_payment = TaxCalculator.calculate_german_income_tax(annual_incomes, tax_schedule) + np.broadcast_to(np.asarray(income_support, dtype=float), annual_incomes.shape)
+
+    with np.errstate(divide="ignore"):
+        capital_ratios = np.where(annual_payment > 0, total_required_capital / np.where(annual_payment > 0, annual_payment, 1.0), np.inf)
+    capital_ratios = np.where(total_required_capital <= 0, 0.0, capital_ratios)
+
+    chunk_sizes = [min(chunk_size, number_of_paths - start) for start in range(0, number_of_paths, chunk_size)]
+    seed_sequences = np.random.SeedSequence(seed).spawn(len(return_models) * len(chunk_sizes))
+
+    tasks = [(seed_sequences[model_index * len(chunk_sizes) + chunk_index], return_model, size, capital_ratios, max_years)
+             for model_index, return_model in enumerate(return_models) for chunk_index, size in enumerate(chunk_sizes)]
+
+    if max_workers == 1:
+        chunk_histograms = [_simulate_years_histogram(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+            chunk_histograms = list(executor.map(_simulate_years_histogram, *zip(*tasks)))
+
+    return np.stack([np.sum(chunk_histograms[model_index * len(chunk_sizes):(model_index + 1) * len(chunk_sizes)], axis=0)
+                     for model_index in range(len(return_models))])
+
+
+if __name__ == "__main__":
+
+    logging.basicConfig(level=logging.INFO, format='%(funcName)s:  %(message)s')
+
+    income_distribution = IncomeDistribution.cutoff_income_distribution(IncomeDistribution.income_distribution_germany_annual_pretax_2025, 20e3)
+    annual_incomes = np.array([x[0] for x in income_distribution])
+
+    annual_income_cap = 100e3
+    income_support, _ = calculate_income_support(income_distribution, annual_income_cap, number_of_citizens=83e6, economy_subsidy=1000e9)
+
+    return_models = [{"mean": 0.07, "volatility": 0.15}, {"mean": 0.14, "volatility": 0.25}]
+
+    years_histogram = simulate_years_to_capital(annual_incomes, return_models, interest_rate_low_risk=0.05, annual_income_cap=annual_income_cap,
+                                                income_support=income_support, number_of_paths=int(1e6), max_workers=None)
+
+    for return_model, histogram in zip(return_models, years_histogram):
+        logging.info(f"Return model: {return_model}")
+        for percentile in [10, 50, 90]:
+            logging.info(f"  {percentile}th percentile of years per income bracket: {get_years_percentile(histogram, percentile)}")
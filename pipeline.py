@@ -0,0 +1,240 @@
+"""
+Incremental recomputation of a scenario for interactive parameter exploration.
+
+The model is a pipeline of memoized stages with explicit dependencies on the inputs and on other stages:
+
+    income_distribution -> gross_incomes -> brackets -> income_taxes -> taxes_at_cap -> income_support -> years -> aggregates
+
+Setting an input only drops the values of the stages downstream of it, which are recomputed when they are requested the next time.
+E.g. a new economy_subsidy only recomputes the distribution of the support, the years and the aggregates, while the inversion of the
+net incomes, the income taxes and the accumulation of the taxes above the cap are kept:
+
+    pipeline = create_scenario_pipeline(IncomeDistribution.income_distribution_germany_monthly_net_2025, net_incomes=True, cutoff=20e3)
+    pipeline.get("aggregates")
+
+    pipeline.set(economy_subsidy=300e9)
+    pipeline.get("aggregates")
+
+Inputs are compared with their previous value, setting an equal value does not recompute anything.
+"""
+
+import numpy as np
+
+import time
+import logging
+from dataclasses import dataclass
+
+import instrumentation
+from tax_autonomy_estimations import (BinnedIncomeDistribution, IncomeDistribution, TaxSchedule, accumulate_income_taxes_at_caps,
+                                      calculate_number_of_years_batched, distribute_income_support, get_binned_income_distribution,
+                                      get_tax_schedule, get_weighted_years_percentile, sort_income_taxes)
+
+
+@dataclass(frozen=True, slots=True, eq=False)
+class Stage:
+    """
+    Stage of a pipeline, the function is called with the values of the dependencies (inputs or stages) as keyword arguments.
+    """
+
+    name: str
+    function: object
+    dependencies: tuple
+
+
+def _is_unchanged(value, new_value) -> bool:
+    if value is new_value:
+        return True
+
+    try:
+        return bool(np.array_equal(value, new_value))
+    except (TypeError, ValueError):
+        return False
+
+
+class Pipeline:
+    """
+    Memoized stages with explicit dependencies, see the module docstring.
+    """
+
+    def __init__(self, stages: list, **inputs):
+        """
+        params:
+            stages: list, list of Stage
+            inputs: values of the inputs, i.e. of all dependencies that are not stages
+        """
+
+        self.stages = {stage.name: stage for stage in stages}
+        self.input_names = {dependency for stage in stages for dependency in stage.dependencies} - set(self.stages)
+
+        # Stages that depend directly on an input or a stage
+        self.dependents = {name: [] for name in [*self.input_names, *self.stages]}
+        for stage in stages:
+            for dependency in stage.dependencies:
+                self.dependents[dependency].append(stage.name)
+
+        self.inputs = {}
+        self.values = {}
+
+        # Number of computations per stage
+        self.computations = {name: 0 for name in self.stages}
+
+        self.set(**inputs)
+
+    def set(self, **inputs) -> None:
+        """
+        Set inputs and drop the values of all stages downstream of the changed inputs.
+        """
+
+        unknown_inputs = set(inputs) - self.input_names
+        if unknown_inputs:
+            raise ValueError(f"Unknown inputs {sorted(unknown_inputs)}, available inputs: {sorted(self.input_names)}")
+
+        for name, value in inputs.items():
+            if name in self.inputs and _is_unchanged(self.inputs[name], value):
+                continue
+
+            self.inputs[name] = value
+            self._invalidate(name)
+
+    def _invalidate(self, name: str) -> None:
+        for dependent in self.dependents[name]:
+            self.values.pop(dependent, None)
+            self._invalidate(dependent)
+
+    def get(self, name: str):
+        """
+        Get the value of an input or a stage, the stage and the stages it depends on are computed if their values are not memoized.
+        """
+
+        if name in self.inputs:
+            return self.inputs[name]
+
+        if name in self.input_names:
+            raise ValueError(f"Input {name} is not set")
+
+        if name not in self.values:
+            stage = self.stages[name]
+            arguments = {dependency: self.get(dependency) for dependency in stage.dependencies}
+
+            with instrumentation.stage(name):
+                self.values[name] = stage.function(**arguments)
+
+            self.computations[name] += 1
+            instrumentation.count("pipeline.computations")
+
+        return self.values[name]
+
+
+def _get_gross_incomes(income_distribution: BinnedIncomeDistribution | list, net_incomes: bool, tax_schedule: TaxSchedule | int) -> BinnedIncomeDistribution:
+    distribution = get_binned_income_distribution(income_distribution)
+
+    if net_incomes:
+        return IncomeDistribution.transform_distrubtion_to_annual_income(distribution, tax_schedule=tax_schedule)
+
+    return distribution
+
+
+def _get_brackets(gross_incomes: BinnedIncomeDistribution, cutoff: float) -> BinnedIncomeDistribution:
+    brackets = gross_incomes.cutoff(cutoff)
+    IncomeDistribution.check_sum_probability(brackets)
+
+    return brackets
+
+
+def _get_income_taxes(brackets: BinnedIncomeDistribution, tax_schedule: TaxSchedule | int) -> dict:
+    return sort_income_taxes(brackets, tax_schedule)
+
+
+def _get_taxes_at_cap(income_taxes: dict, annual_income_cap: float, tax_schedule: TaxSchedule | int) -> dict:
+    return accumulate_income_taxes_at_caps(income_taxes, np.atleast_1d(np.asarray(annual_income_cap, dtype=float)), tax_schedule)
+
+
+def _get_income_support(income_taxes: dict, taxes_at_cap: dict, number_of_citizens: float, economy_subsidy: float) -> np.ndarray:
+    return distribute_income_support(income_taxes, taxes_at_cap, number_of_citizens, np.atleast_1d(np.asarray(economy_subsidy, dtype=float)))[0, 0]
+
+
+def _get_years(brackets: BinnedIncomeDistribution, income_support: np.ndarray, interest_rates: list, interest_rate_low_risk: float,
+               annual_income_cap: float, max_years: int, tax_schedule: TaxSchedule | int) -> np.ndarray:
+    # Years with the shape (interest rates, income brackets)
+    years, _ = calculate_number_of_years_batched(np.asarray(interest_rates, dtype=float)[:, None], interest_rate_low_risk, brackets.annual_incomes[None, :],
+                                                 annual_income_cap, income_support[None, :], max_years, tax_schedule)
+
+    return years
+
+
+def _get_years_no_support(brackets: BinnedIncomeDistribution, interest_rates: list, interest_rate_low_risk: float, annual_income_cap: float,
+                          max_years: int, tax_schedule: TaxSchedule | int) -> np.ndarray:
+    return _get_years(brackets, np.zeros(len(brackets)), interest_rates, interest_rate_low_risk, annual_income_cap, max_years, tax_schedule)
+
+
+def _get_aggregates(brackets: BinnedIncomeDistribution, years: np.ndarray, years_no_support: np.ndarray, taxes_at_cap: dict) -> dict:
+    weights = brackets.weights / brackets.total_weight
+
+    return {"mean_years": np.sum(years * weights, axis=-1),
+            "median_years": get_weighted_years_percentile(years, weights, 50),
+            "mean_years_no_support": np.sum(years_no_support * weights, axis=-1),
+            "median_years_no_support": get_weighted_years_percentile(years_no_support, weights, 50),
+            "accumulated_support_difference": float(taxes_at_cap["accumulated_support_difference"][0])}
+
+
+# Stages of the scenario of calculate_years_to_reach_capital
+scenario_stages = [
+    Stage("gross_incomes", _get_gross_incomes, ("income_distribution", "net_incomes", "tax_schedule")),
+    Stage("brackets", _get_brackets, ("gross_incomes", "cutoff")),
+    Stage("income_taxes", _get_income_taxes, ("brackets", "tax_schedule")),
+    Stage("taxes_at_cap", _get_taxes_at_cap, ("income_taxes", "annual_income_cap", "tax_schedule")),
+    Stage("income_support", _get_income_support, ("income_taxes", "taxes_at_cap", "number_of_citizens", "economy_subsidy")),
+    Stage("years", _get_years, ("brackets", "income_support", "interest_rates", "interest_rate_low_risk", "annual_income_cap", "max_years", "tax_schedule")),
+    Stage("years_no_support", _get_years_no_support,
+          ("brackets", "interest_rates", "interest_rate_low_risk", "annual_income_cap", "max_years", "tax_schedule")),
+    Stage("aggregates", _get_aggregates, ("brackets", "years", "years_no_support", "taxes_at_cap")),
+]
+
+
+def create_scenario_pipeline(income_distribution: BinnedIncomeDistribution | list, net_incomes: bool = False, cutoff: float = 0,
+                             interest_rate_low_risk: float = 0.05, interest_rates: list = [0.03, 0.07, 0.14, 0.2], annual_income_cap: float = 500e3,
+                             number_of_citizens: float = 1, economy_subsidy: float = 0, max_years: int = 100,
+                             tax_schedule: TaxSchedule | int = 2025) -> Pipeline:
+    """
+    Create the pipeline of a scenario, its stages give the same values as calculate_years_to_reach_capital.
+
+    params:
+        income_distribution: BinnedIncomeDistribution or list, list of income values and their probabilities
+        net_incomes: bool, if True, the distribution has monthly net incomes that are transformed to annual pretax incomes
+            (see IncomeDistribution.transform_distrubtion_to_annual_income), otherwise annual pretax incomes
+        cutoff: float, remove all annual pretax incomes below the cutoff in EUR
+        interest_rate_low_risk: float, assumed annual interest rate for the time when the capital serves as passive income
+        interest_rates: list of assumed annual interest rates for the capital growth phase
+        annual_income_cap: float, annual income in EUR that would represent "the maximum income needed"
+        number_of_citizens: float, number of citizens in the country
+        economy_subsidy: float, additional income subsidy through economic profits in EUR
+        max_years: int, maximum number of years that are considered
+        tax_schedule: TaxSchedule or int, tax schedule or its year
+
+    returns:
+        pipeline: Pipeline, with the inputs named as the parameters
+    """
+
+    return Pipeline(scenario_stages, income_distribution=income_distribution, net_incomes=net_incomes, cutoff=cutoff,
+                    interest_rate_low_risk=interest_rate_low_risk, interest_rates=interest_rates, annual_income_cap=annual_income_cap,
+                    number_of_citizens=number_of_citizens, economy_subsidy=economy_subsidy, max_years=max_years,
+                    tax_schedule=get_tax_schedule(tax_schedule))
+
+
+if __name__ == "__main__":
+
+    logging.basicConfig(level=logging.INFO, format='%(funcName)s:  %(message)s')
+
+    pipeline = create_scenario_pipeline(IncomeDistribution.income_distribution_germany_monthly_net_2025, net_incomes=True, cutoff=20e3,
+                                        interest_rates=[0.07, 0.14], annual_income_cap=100e3, number_of_citizens=83e6)
+
+    for change in [{}, {"economy_subsidy": 300e9}, {"economy_subsidy": 1000e9}, {"annual_income_cap": 150e3}, {"interest_rates": [0.05, 0.1]},
+                   {"cutoff": 30e3}, {"tax_schedule": get_tax_schedule(2024)}]:
+        computations = dict(pipeline.computations)
+        start = time.perf_counter()
+
+        pipeline.set(**change)
+        aggregates = pipeline.get("aggregates")
+
+        recomputed = [name for name in pipeline.stages if pipeline.computations[name] > computations[name]]
+        logging.info(f"{change}: {(time.perf_counter() - start)*1e3:.2f} ms, median years {aggregates['median_years']}, recomputed {recomputed}")
@@ -0,0 +1,242 @@
+"""
+Persistent on-disk cache of computed arrays, addressed by the content of their inputs.
+
+The key of an entry is a hash of the computing function, the source code of its module and of tax_autonomy_estimations, and all parameters
+(income distribution, tax schedule, scenario parameters). Changing the code therefore changes all keys, so entries of an old code version
+are never returned and are evicted over time.
+
+Every entry is a directory with one .npy file per array, which is opened memory-mapped when it is read. Entries are written to a temporary
+directory and renamed in one step, so concurrent processes (e.g. the workers of a sweep) never read a partially written entry.
+Reading an entry updates its modification time, and when the cache grows beyond its size budget the least recently used entries are removed.
+"""
+
+import numpy as np
+
+import os
+import sys
+import shutil
+import hashlib
+import tempfile
+import dataclasses
+
+import instrumentation
+import tax_autonomy_estimations
+
+
+def _update_hash(hash_object, value) -> None:
+    """
+    Add a parameter value to the hash. Lists, numbers and arrays with the same values give the same hash,
+    dataclasses (e.g. TaxSchedule) are hashed by their fields.
+    """
+
+    if value is None or isinstance(value, (bool, str)):
+        hash_object.update(repr(value).encode())
+    elif isinstance(value, dict):
+        hash_object.update(b"dict")
+        for name in sorted(value):
+            hash_object.update(name.encode())
+            _update_hash(hash_object, value[name])
+    elif dataclasses.is_dataclass(value):
+        hash_object.update(type(value).__name__.encode())
+        for field in dataclasses.fields(value):
+            hash_object.update(field.name.encode())
+            _update_hash(hash_object, getattr(value, field.name))
+    else:
+        array = np.ascontiguousarray(value, dtype=float)
+        hash_object.update(repr(array.shape).encode())
+        hash_object.update(array.tobytes())
+
+
+_code_versions = {}
+
+
+def get_code_version(module_name: str) -> str:
+    """
+    Get a hash of the source code of a module and of tax_autonomy_estimations, on which all computations depend.
+    """
+
+    if module_name not in _code_versions:
+        hash_object = hashlib.sha256()
+        for file_path in sorted({sys.modules[module_name].__file__, tax_autonomy_estimations.__file__}):
+            with open(file_path, "rb") as source_file:
+                hash_object.update(source_file.read())
+        _code_versions[module_name] = hash_object.hexdigest()
+
+    return _code_versions[module_name]
+
+
+def get_input_fingerprint(**parameters) -> str:
+    """
+    Get a hash of input parameters, independent of the code version, e.g. to check that results stored earlier were computed for the same
+    income distribution, number of citizens and tax schedule.
+
+    params:
+        parameters: parameter values. An int tax_schedule is replaced by its TaxSchedule and a list income_distribution by its
+            BinnedIncomeDistribution, so that both give the same fingerprint.
+
+    returns:
+        fingerprint: str, hex digest of the hash
+    """
+
+    if "tax_schedule" in parameters:
+        parameters["tax_schedule"] = tax_autonomy_estimations.get_tax_schedule(parameters["tax_schedule"])
+    if "income_distribution" in parameters:
+        parameters["income_distribution"] = tax_autonomy_estimations.get_binned_income_distribution(parameters["income_distribution"])
+
+    hash_object = hashlib.sha256()
+    _update_hash(hash_object, parameters)
+
+    return hash_object.hexdigest()
+
+
+class ResultCache:
+    """
+    On-disk cache of the arrays computed by a function for given parameters, see get_or_compute.
+    """
+
+    def __init__(self, cache_directory: str, max_bytes: float = 1e9):
+        """
+        params:
+            cache_directory: str, directory of the cache, created if it does not exist
+            max_bytes: float, size budget of the cache in bytes
+        """
+
+        self.cache_directory = cache_directory
+        self.max_bytes = max_bytes
+
+        os.makedirs(cache_directory, exist_ok=True)
+
+    def get_key(self, function, **parameters) -> str:
+        """
+        Get the key of the result of a function for the given parameters.
+
+        params:
+            function: callable, computing function
+            parameters: parameters of the function, see get_input_fingerprint
+
+        returns:
+            key: str, hex digest of the hash
+        """
+
+        hash_object = hashlib.sha256()
+        hash_object.update(get_code_version(function.__module__).encode())
+        hash_object.update(function.__qualname__.encode())
+        hash_object.update(get_input_fingerprint(**parameters).encode())
+
+        return hash_object.hexdigest()
+
+    def get(self, key: str) -> dict:
+        """
+        Get the arrays of an entry.
+
+        params:
+            key: str, key of the entry
+
+        returns:
+            arrays: dict, mapping of name to a read-only memory-mapped array, or None if there is no entry for the key
+        """
+
+        entry_directory = os.path.join(self.cache_directory, key)
+
+        try:
+            file_names = os.listdir(entry_directory)
+            arrays = {file_name[:-len(".npy")]: np.load(os.path.join(entry_directory, file_name), mmap_mode="r")
+                      for file_name in file_names if file_name.endswith(".npy")}
+            os.utime(entry_directory)
+        except FileNotFoundError:
+            # Not cached or evicted in the meantime by another process
+            instrumentation.count("result_cache.misses")
+            return None
+
+        instrumentation.count("result_cache.hits")
+
+        return arrays
+
+    def put(self, key: str, arrays: dict, evict: bool = True) -> None:
+        """
+        Store the arrays of an entry and evict the least recently used entries if the cache is above its size budget.
+
+        params:
+            key: str, key of the entry
+            arrays: dict, mapping of name to array or number
+            evict: bool, if False, the size budget is not checked, e.g. to call evict once after storing many small entries
+        """
+
+        temporary_directory = tempfile.mkdtemp(prefix=".tmp_", dir=self.cache_directory)
+
+        for name, array in arrays.items():
+            np.save(os.path.join(temporary_directory, name + ".npy"), np.asarray(array))
+
+        try:
+            os.rename(temporary_directory, os.path.join(self.cache_directory, key))
+        except OSError:
+            # Another process stored the same entry in the meantime
+            shutil.rmtree(temporary_directory, ignore_errors=True)
+
+        if evict:
+            self.evict()
+
+    def get_or_compute(self, function, **parameters) -> dict:
+        """
+        Get the arrays computed by function(**parameters) from the cache, or compute and store them.
+
+        params:
+            function: callable, function that returns a dict of arrays
+            parameters: parameters of the function
+
+        returns:
+            arrays: dict, mapping of name to array
+        """
+
+        key = self.get_key(function, **parameters)
+
+        arrays = self.get(key)
+        if arrays is None:
+            arrays = function(**parameters)
+            self.put(key, arrays)
+
+        return arrays
+
+    def get_entries(self) -> list:
+        """
+        Get all entries of the cache.
+
+        returns:
+            entries: list, list of (last access time, size in bytes, entry directory) sorted from the least to the most recently used entry
+        """
+
+        entries = []
+
+        for entry_name in os.listdir(self.cache_directory):
+            entry_directory = os.path.join(self.cache_directory, entry_name)
+            if entry_name.startswith(".tmp_"):
+                continue
+
+            try:
+                size = sum(entry.stat().st_size for entry in os.scandir(entry_directory))
+                entries.append((os.stat(entry_directory).st_mtime, size, entry_directory))
+            except FileNotFoundError:
+                continue
+
+        return sorted(entries)
+
+    def evict(self) -> None:
+        """
+        Remove the least recently used entries until the cache is within its size budget.
+        """
+
+        entries = self.get_entries()
+        total_size = sum(size for _, size, _ in entries)
+
+        for _, size, entry_directory in entries:
+            if total_size <= self.max_bytes:
+                break
+
+            shutil.rmtree(entry_directory, ignore_errors=True)
+            total_size -= size
+
+            instrumentation.count("result_cache.evictions")
+
+    def clear(self) -> None:
+        for _, _, entry_directory in self.get_entries():
+            shutil.rmtree(entry_directory, ignore_errors=True)
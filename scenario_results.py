@@ -0,0 +1,158 @@
+import numpy as np
+
+import json
+import os
+import logging
+
+
+class ScenarioResultStore:
+    """
+    Columnar on-disk storage for scenario results.
+
+    Every column is stored as a raw binary file (<column>.bin) in the output directory and the schema (dtype and per-row shape of every
+    column) together with the number of committed rows is kept in schema.json. Rows are appended in chunks: first the data of all columns
+    is written, afterwards the row count in schema.json is updated atomically. A chunk that was only partially written (e.g. because the
+    sweep was interrupted) is therefore discarded when the store is opened again.
+
+    Reading returns memory mapped numpy arrays, i.e. no data is copied until it is used.
+
+    The store can record a fingerprint of the inputs that all rows were computed for (e.g. income distribution and tax schedule). Opening
+    the store with another fingerprint raises a ValueError, so that results of incompatible inputs are never mixed.
+    """
+
+    schema_file_name = "schema.json"
+
+    def __init__(self, output_directory: str, columns: dict = None, fingerprint: str = None):
+        """
+        Open an existing store or create a new one.
+
+        params:
+            output_directory: str, directory that contains the column files
+            columns: dict, mapping of column name to (dtype, per-row shape), only needed to create a new store
+            fingerprint: str, fingerprint of the inputs of the rows, must match the fingerprint of an existing store if given
+        """
+
+        self.output_directory = output_directory
+        schema_path = os.path.join(output_directory, ScenarioResultStore.schema_file_name)
+
+        if os.path.exists(schema_path):
+            with open(schema_path) as schema_file:
+                schema = json.load(schema_file)
+
+            self.columns = {name: (np.dtype(column["dtype"]), tuple(column["shape"])) for name, column in schema["columns"].items()}
+            self.number_of_rows = schema["rows"]
+            self.fingerprint = schema.get("fingerprint")
+
+            if columns is not None and self._normalize_columns(columns) != self.columns:
+                raise ValueError(f"Columns of the existing store in {output_directory} do not match the requested columns")
+            if fingerprint is not None and fingerprint != self.fingerprint:
+                raise ValueError(f"The existing store in {output_directory} was computed for other inputs (fingerprint {self.fingerprint} "
+                                 f"instead of {fingerprint}), use another output directory")
+
+            self._truncate_to_committed_rows()
+
+        else:
+            if columns is None:
+                raise ValueError(f"No result store found in {output_directory} and no columns given to create one")
+
+            os.makedirs(output_directory, exist_ok=True)
+            self.columns = self._normalize_columns(columns)
+            self.number_of_rows = 0
+            self.fingerprint = fingerprint
+
+            for name in self.columns:
+                open(self._column_path(name), "wb").close()
+
+            self._write_schema()
+
+    def __len__(self) -> int:
+        return self.number_of_rows
+
+    @staticmethod
+    def _normalize_columns(columns: dict) -> dict:
+        return {name: (np.dtype(dtype).newbyteorder("<"), tuple(shape)) for name, (dtype, shape) in columns.items()}
+
+    def _column_path(self, name: str) -> str:
+        return os.path.join(self.output_directory, name + ".bin")
+
+    def _row_size(self, name: str) -> int:
+        dtype, shape = self.columns[name]
+        return dtype.itemsize * int(np.prod(shape, dtype=int))
+
+    def _write_schema(self) -> None:
+        schema = {"columns": {name: {"dtype": dtype.str, "shape": list(shape)} for name, (dtype, shape) in self.columns.items()},
+                  "rows": self.number_of_rows,
+                  "fingerprint": self.fingerprint}
+
+        schema_path = os.path.join(self.output_directory, ScenarioResultStore.schema_file_name)
+        with open(schema_path + ".tmp", "w") as schema_file:
+            json.dump(schema, schema_file, indent=2)
+
+        os.replace(schema_path + ".tmp", schema_path)
+
+    def _truncate_to_committed_rows(self) -> None:
+        for name in self.columns:
+            committed_size = self.number_of_rows * self._row_size(name)
+
+            if os.path.getsize(self._column_path(name)) > committed_size:
+                logging.info(f"Discarding uncommitted rows of column {name}")
+                with open(self._column_path(name), "r+b") as column_file:
+                    column_file.truncate(committed_size)
+
+    def append(self, rows: dict) -> None:
+        """
+        Append rows to all columns and commit them.
+
+        params:
+            rows: dict, mapping of every column name to an array with the shape (number of rows,) + per-row shape
+        """
+
+        if set(rows) != set(self.columns):
+            raise ValueError("Rows must contain exactly the columns " + str(sorted(self.columns)))
+
+        number_of_new_rows = {len(values) for values in rows.values()}
+        if len(number_of_new_rows) != 1:
+            raise ValueError("All columns must have the same number of rows")
+
+        for name, (dtype, shape) in self.columns.items():
+            values = np.ascontiguousarray(rows[name], dtype=dtype)
+
+            if values.shape[1:] != shape:
+                raise ValueError(f"Column {name} has the row shape {values.shape[1:]} instead of {shape}")
+
+            with open(self._column_path(name), "ab") as column_file:
+                column_file.write(values.tobytes())
+                column_file.flush()
+                os.fsync(column_file.fileno())
+
+        self.number_of_rows += number_of_new_rows.pop()
+        self._write_schema()
+
+    def read(self, column_names: list = None) -> dict:
+        """
+        Read columns as memory mapped arrays.
+
+        params:
+            column_names: list, names of the columns to read, by default all columns
+
+        returns:
+            columns: dict, mapping of column name to a read-only array with the shape (number of rows,) + per-row shape
+        """
+
+        if column_names is None:
+            column_names = list(self.columns)
+
+        unknown_columns = set(column_names) - set(self.columns)
+        if unknown_columns:
+            raise ValueError(f"Unknown columns {sorted(unknown_columns)}, available columns: {list(self.columns)}")
+
+        columns = {}
+        for name in column_names:
+            dtype, shape = self.columns[name]
+
+            if self.number_of_rows == 0:
+                columns[name] = np.empty((0,) + shape, dtype=dtype)
+            else:
+                columns[name] = np.memmap(self._column_path(name), dtype=dtype, mode="r", shape=(self.number_of_rows,) + shape)
+
+        return columns
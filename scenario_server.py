@@ -0,0 +1,360 @@
+"""
+Long-running local server that answers scenario queries of a dashboard without the start of a process per query.
+
+The server keeps the income distribution and its sorted income tax table (see sort_income_taxes) in memory. Requests and responses are
+JSON objects, one per line, over a localhost TCP socket or a Unix socket:
+
+    {"id": 1, "query": "years", "annual_income_cap": 100e3, "economy_subsidy": 300e9, "interest_rates": [0.07, 0.14]}
+    {"id": 2, "query": "support", "annual_income_cap": 150e3}
+    {"id": 3, "query": "metrics", "annual_income_cap": 150e3, "economy_subsidy": 1000e9}
+    {"id": 4, "query": "stats"}
+
+Missing scenario parameters take the defaults of the server. The id is returned with the response, so a client can send many requests
+on one connection without waiting for the responses, which can arrive out of order.
+
+Requests that arrive within the batch window (of all connections) are coalesced into one batch evaluation: the support of all unique caps
+and subsidies of the batch comes from one calculate_income_support_batched-style evaluation on the sorted tax table, the years of all
+(request, interest rate) rows from one calculate_number_of_years_batched call and the metrics from one calculate_redistribution_metrics
+call. The stats query returns the number of requests and batches and the p50/p99 latency between receiving a request and its response.
+
+    python cli.py serve --port 8765
+    python cli.py serve --socket /tmp/scenarios.sock
+"""
+
+import numpy as np
+
+import json
+import time
+import asyncio
+import logging
+from collections import deque
+
+import instrumentation
+from metrics import calculate_redistribution_metrics
+from tax_autonomy_estimations import (BinnedIncomeDistribution, IncomeDistribution, TaxSchedule, accumulate_income_taxes_at_caps,
+                                      calculate_number_of_years_batched, distribute_income_support, get_binned_income_distribution,
+                                      get_tax_schedule, sort_income_taxes)
+
+
+# Queries that are evaluated in batches, the stats query is answered right away
+batch_queries = ["years", "support", "metrics"]
+
+# Scenario parameters of a query and their types
+query_parameters = {"annual_income_cap": float, "economy_subsidy": float, "interest_rate_low_risk": float, "interest_rates": list}
+
+
+class ScenarioServer:
+    """
+    Scenario query server, see the module docstring.
+    """
+
+    def __init__(self, income_distribution: BinnedIncomeDistribution | list, number_of_citizens: float = 1, annual_income_cap: float = 100e3,
+                 economy_subsidy: float = 0, interest_rate_low_risk: float = 0.05, interest_rates: list = [0.07, 0.14], max_years: int = 100,
+                 batch_window: float = 0.0005, max_batch_size: int = 4096, latency_window: int = 100_000, tax_schedule: TaxSchedule | int = 2025):
+        """
+        params:
+            income_distribution: BinnedIncomeDistribution or list, list of annual income values and their probabilities
+            number_of_citizens: float, number of citizens in the country
+            annual_income_cap: float, default annual income cap of the queries in EUR
+            economy_subsidy: float, default economy subsidy of the queries in EUR
+            interest_rate_low_risk: float, default annual interest rate for the time when the capital serves as passive income
+            interest_rates: list, default annual interest rates for the capital growth phase
+            max_years: int, maximum number of years that are considered
+            batch_window: float, time in seconds that the first request of a batch waits for further requests
+            max_batch_size: int, number of requests that triggers the evaluation of a batch before the end of the window
+            latency_window: int, number of most recent requests of the latency percentiles
+            tax_schedule: TaxSchedule or int, tax schedule or its year
+        """
+
+        self.income_distribution = get_binned_income_distribution(income_distribution)
+        IncomeDistribution.check_sum_probability(self.income_distribution)
+
+        self.number_of_citizens = number_of_citizens
+        self.defaults = {"annual_income_cap": annual_income_cap, "economy_subsidy": economy_subsidy, "interest_rate_low_risk": interest_rate_low_risk,
+                         "interest_rates": list(interest_rates)}
+        self.max_years = max_years
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self.tax_schedule = get_tax_schedule(tax_schedule)
+
+        # The sorted income taxes only depend on the distribution and the schedule
+        self.sorted_income_taxes = sort_income_taxes(self.income_distribution, self.tax_schedule)
+
+        # Requests of the current batch as (scenario, future, receive time)
+        self.pending = []
+        self.flush_handle = None
+
+        self.latencies = deque(maxlen=latency_window)
+        self.number_of_requests = 0
+        self.number_of_batches = 0
+
+    def get_scenario(self, request: dict) -> dict:
+        """
+        Get the query and the scenario parameters of a request, with the defaults of the server for missing parameters.
+        """
+
+        query = request.get("query")
+        if query not in batch_queries:
+            raise ValueError(f"Unknown query {query}, available queries: {batch_queries + ['stats']}")
+
+        unknown_parameters = set(request) - set(query_parameters) - {"id", "query"}
+        if unknown_parameters:
+            raise ValueError(f"Unknown parameters {sorted(unknown_parameters)}, available parameters: {list(query_parameters)}")
+
+        scenario = {"query": query}
+        for name, parameter_type in query_parameters.items():
+            value = request.get(name, self.defaults[name])
+            scenario[name] = [float(rate) for rate in value] if parameter_type is list else float(value)
+
+        return scenario
+
+    @instrumentation.staged
+    def evaluate_batch(self, scenarios: list) -> list:
+        """
+        Evaluate the scenarios of a batch in one pass of the batched engines.
+
+        params:
+            scenarios: list, scenarios as returned by get_scenario
+
+        returns:
+            responses: list, one response dict per scenario
+        """
+
+        instrumentation.count("scenario_server.scenarios", len(scenarios))
+
+        annual_incomes = self.income_distribution.annual_incomes
+
+        annual_income_caps = np.array([scenario["annual_income_cap"] for scenario in scenarios])
+        economy_subsidies = np.array([scenario["economy_subsidy"] for scenario in scenarios])
+
+        unique_caps, cap_index = np.unique(annual_income_caps, return_inverse=True)
+        unique_subsidies, subsidy_index = np.unique(economy_subsidies, return_inverse=True)
+
+        taxes_at_caps = accumulate_income_taxes_at_caps(self.sorted_income_taxes, unique_caps, self.tax_schedule)
+        income_support = distribute_income_support(self.sorted_income_taxes, taxes_at_caps, self.number_of_citizens,
+                                                    unique_subsidies)[cap_index, subsidy_index]
+        accumulated_support_difference = taxes_at_caps["accumulated_support_difference"][cap_index]
+
+        annual_incomes_list = annual_incomes.tolist()
+        responses = [{"annual_incomes": annual_incomes_list} for _ in scenarios]
+
+        # One row per (years scenario, interest rate)
+        years_index = [i for i, scenario in enumerate(scenarios) if scenario["query"] == "years"]
+        if years_index:
+            rows = [(i, interest_rate) for i in years_index for interest_rate in scenarios[i]["interest_rates"]]
+            row_index = np.array([i for i, _ in rows])
+            interest_rates = np.array([interest_rate for _, interest_rate in rows])[:, None]
+            interest_rates_low_risk = np.array([scenarios[i]["interest_rate_low_risk"] for i in row_index])[:, None]
+
+            years, _ = calculate_number_of_years_batched(interest_rates, interest_rates_low_risk, annual_incomes[None, :],
+                                                         annual_income_caps[row_index, None], income_support[row_index], self.max_years,
+                                                         self.tax_schedule)
+            years_no_support, _ = calculate_number_of_years_batched(interest_rates, interest_rates_low_risk, annual_incomes[None, :],
+                                                                    annual_income_caps[row_index, None], 0.0, self.max_years, self.tax_schedule)
+
+            start = 0
+            for i in years_index:
+                end = start + len(scenarios[i]["interest_rates"])
+                responses[i].update({"interest_rates": scenarios[i]["interest_rates"],
+                                     "years_to_reach_capital": years[start:end].tolist(),
+                                     "years_to_reach_capital_no_support": years_no_support[start:end].tolist()})
+                start = end
+
+        for i, scenario in enumerate(scenarios):
+            if scenario["query"] == "support":
+                responses[i].update({"income_support": income_support[i].tolist(),
+                                     "accumulated_support_difference": float(accumulated_support_difference[i])})
+
+        metrics_index = [i for i, scenario in enumerate(scenarios) if scenario["query"] == "metrics"]
+        if metrics_index:
+            metrics = calculate_redistribution_metrics(annual_incomes, self.income_distribution.weights, income_support[metrics_index],
+                                                       self.number_of_citizens, self.tax_schedule)
+
+            for row, i in enumerate(metrics_index):
+                responses[i].update({name: float(getattr(metrics, name)[row])
+                                     for name in ["gini_before", "gini_after", "top_decile_share_before", "top_decile_share_after",
+                                                  "total_income_tax", "total_support_paid", "total_support_collected", "fiscal_balance"]})
+
+        return responses
+
+    def get_latency_statistics(self) -> dict:
+        """
+        Get the number of requests and batches and the latency percentiles in ms of the most recent requests.
+        """
+
+        latencies = np.array(self.latencies) * 1e3
+        p50, p99 = np.percentile(latencies, [50, 99]) if len(latencies) else (np.nan, np.nan)
+
+        return {"requests": self.number_of_requests, "batches": self.number_of_batches,
+                "mean_batch_size": self.number_of_requests / self.number_of_batches if self.number_of_batches else 0.0,
+                # Undefined percentiles (no requests yet) are null
+                "p50_ms": None if np.isnan(p50) else float(p50), "p99_ms": None if np.isnan(p99) else float(p99)}
+
+    async def submit(self, request: dict) -> dict:
+        """
+        Answer a request, requests of the batch queries wait for the evaluation of their batch.
+        """
+
+        if request.get("query") == "stats":
+            return self.get_latency_statistics()
+
+        received = time.perf_counter()
+        future = asyncio.get_running_loop().create_future()
+
+        self.pending.append((self.get_scenario(request), future, received))
+
+        if len(self.pending) >= self.max_batch_size:
+            self.flush()
+        elif self.flush_handle is None:
+            self.flush_handle = asyncio.get_running_loop().call_later(self.batch_window, self.flush)
+
+        return await future
+
+    def flush(self) -> None:
+        """
+        Evaluate the pending requests as one batch and resolve their futures.
+        """
+
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+
+        pending, self.pending = self.pending, []
+        if not pending:
+            return
+
+        try:
+            responses = self.evaluate_batch([scenario for scenario, _, _ in pending])
+        except Exception as error:
+            logging.exception("Evaluation of a batch failed")
+            responses = [error] * len(pending)
+
+        answered = time.perf_counter()
+        self.number_of_batches += 1
+        self.number_of_requests += len(pending)
+
+        for (_, future, received), response in zip(pending, responses):
+            self.latencies.append(answered - received)
+
+            if future.cancelled():
+                continue
+            if isinstance(response, Exception):
+                future.set_exception(response)
+            else:
+                future.set_result(response)
+
+    async def _answer(self, line: bytes, writer: asyncio.StreamWriter) -> None:
+        # Only a JSON object can carry an id, e.g. "id" in "valid" would be a substring check
+        request = {}
+        try:
+            decoded = json.loads(line)
+            if not isinstance(decoded, dict):
+                raise ValueError("A request must be a JSON object")
+            request = decoded
+            response = await self.submit(request)
+        except Exception as error:
+            response = {"error": f"{type(error).__name__}: {error}"}
+
+        if "id" in request:
+            response = {"id": request["id"], **response}
+
+        writer.write(json.dumps(response).encode() + b"\n")
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Answer the requests of a connection, every line is answered concurrently, so that pipelined requests share a batch.
+        """
+
+        answers = set()
+        try:
+            while line := await reader.readline():
+                if line.strip():
+                    answer = asyncio.create_task(self._answer(line, writer))
+                    answers.add(answer)
+                    answer.add_done_callback(answers.discard)
+
+            await asyncio.gather(*answers)
+            await writer.drain()
+        except ConnectionError:
+            logging.info("Connection closed by the client")
+        finally:
+            writer.close()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8765, socket_path: str = None) -> asyncio.AbstractServer:
+        """
+        Start listening on a localhost TCP port or, if a socket path is given, on a Unix socket.
+        """
+
+        if socket_path:
+            server = await asyncio.start_unix_server(self.handle_connection, path=socket_path)
+        else:
+            server = await asyncio.start_server(self.handle_connection, host, port)
+
+        logging.info(f"Listening on {socket_path or server.sockets[0].getsockname()}")
+
+        return server
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8765, socket_path: str = None) -> None:
+        """
+        Serve until the task is cancelled, e.g. by an interrupt.
+        """
+
+        server = await self.start(host, port, socket_path)
+
+        async with server:
+            await server.serve_forever()
+
+
+async def send_requests(requests: list, host: str = "127.0.0.1", port: int = 8765, socket_path: str = None) -> list:
+    """
+    Send requests on one connection without waiting for the responses in between, and collect the responses.
+
+    params:
+        requests: list, request dicts
+        host: str, host of the server
+        port: int, port of the server
+        socket_path: str, path of the Unix socket of the server, used instead of host and port
+
+    returns:
+        responses: list, response dicts in the order of their arrival
+    """
+
+    if socket_path:
+        reader, writer = await asyncio.open_unix_connection(socket_path)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+
+    writer.write(b"".join(json.dumps(request).encode() + b"\n" for request in requests))
+    await writer.drain()
+
+    responses = [json.loads(await reader.readline()) for _ in requests]
+
+    writer.close()
+    await writer.wait_closed()
+
+    return responses
+
+
+if __name__ == "__main__":
+
+    logging.basicConfig(level=logging.INFO, format='%(funcName)s:  %(message)s')
+
+    income_distribution = IncomeDistribution.cutoff_income_distribution(IncomeDistribution.income_distribution_germany_annual_pretax_2025, 20e3)
+
+    async def run_dashboard_load():
+        scenario_server = ScenarioServer(income_distribution, number_of_citizens=83e6)
+        server = await scenario_server.start(port=0)
+        port = server.sockets[0].getsockname()[1]
+
+        # 50 dashboards that each ask 20 what-if questions at once
+        rng = np.random.default_rng(0)
+        requests = [[{"id": i, "query": ["years", "support", "metrics"][i % 3], "annual_income_cap": float(rng.choice([60e3, 100e3, 150e3])),
+                      "economy_subsidy": float(rng.choice([0, 300e9, 1000e9]))} for i in range(20)] for _ in range(50)]
+
+        async with server:
+            responses = await asyncio.gather(*[send_requests(dashboard_requests, port=port) for dashboard_requests in requests])
+            statistics = (await send_requests([{"query": "stats"}], port=port))[0]
+
+        logging.info(f"{sum(len(dashboard_responses) for dashboard_responses in responses)} responses: {statistics}")
+
+    asyncio.run(run_dashboard_load())
@@ -0,0 +1,185 @@
+import numpy as np
+
+import logging
+from dataclasses import dataclass
+
+import instrumentation
+from tax_autonomy_estimations import (BinnedIncomeDistribution, IncomeDistribution, TaxSchedule, calculate_income_support_batched,
+                                      calculate_number_of_years_batched, get_binned_income_distribution, get_weighted_years_percentile)
+
+
+# Policy levers that can be solved for
+policy_levers = ["annual_income_cap", "economy_subsidy"]
+
+
+@dataclass(frozen=True, slots=True, eq=False)
+class PolicySolution:
+    """
+    Result of solve_policy.
+
+    The status is one of
+        "converged": the value was found within the tolerance
+        "budget_exhausted": the evaluation budget was used up before the tolerance was reached, the value is the best one found
+        "target_met_everywhere": the target is met for all values in the bounds, the value is nan
+        "target_never_met": the target is not met for any value in the bounds, the value is nan
+    """
+
+    lever: str
+    value: float
+    metric: float
+    target_years: float
+    status: str
+    evaluations: int
+
+    # Final bracket of the lever, the target is met at one end and not at the other
+    bracket: tuple
+
+
+@instrumentation.staged
+def evaluate_policies(income_distribution: BinnedIncomeDistribution | list, annual_income_caps: float | np.ndarray, economy_subsidies: float | np.ndarray,
+                      interest_rate: float = 0.07, interest_rate_low_risk: float = 0.05, number_of_citizens: float = 1, percentile: float = 50,
+                      max_years: int = 100, tax_schedule: TaxSchedule | int = 2025) -> np.ndarray:
+    """
+    Evaluate the population-weighted percentile of the years to reach sufficient capital (with income support) for many policies at once.
+
+    params:
+        income_distribution: BinnedIncomeDistribution or list, list of annual income values and their probabilities
+        annual_income_caps: float or np.ndarray, annual income caps in EUR
+        economy_subsidies: float or np.ndarray, additional income subsidies through economic profits in EUR, broadcast against annual_income_caps
+        interest_rate: float, annual interest rate for the capital growth phase
+        interest_rate_low_risk: float, annual interest rate for the time when the capital serves as passive income
+        number_of_citizens: float, number of citizens in the country
+        percentile: float, percentile of the years in percent, e.g. 50 for the median
+        max_years: int, maximum number of years that are considered
+        tax_schedule: TaxSchedule or int, tax schedule or its year
+
+    returns:
+        years: np.ndarray, percentile of the years per policy with the broadcast shape of annual_income_caps and economy_subsidies
+    """
+
+    income_distribution = get_binned_income_distribution(income_distribution)
+    annual_income_caps, economy_subsidies = np.broadcast_arrays(np.asarray(annual_income_caps, dtype=float), np.asarray(economy_subsidies, dtype=float))
+
+    # Support for the grid of unique caps and subsidies, picked per policy afterwards
+    unique_caps, cap_index = np.unique(annual_income_caps, return_inverse=True)
+    unique_subsidies, subsidy_index = np.unique(economy_subsidies, return_inverse=True)
+
+    support_grid, _ = calculate_income_support_batched(income_distribution, unique_caps, number_of_citizens, unique_subsidies, tax_schedule)
+    income_support = support_grid[cap_index.ravel(), subsidy_index.ravel()]
+
+    years, _ = calculate_number_of_years_batched(interest_rate, interest_rate_low_risk, income_distribution.annual_incomes[None, :],
+                                                 annual_income_caps.reshape(-1, 1), income_support, max_years, tax_schedule)
+
+    instrumentation.count("evaluate_policies.policies", annual_income_caps.size)
+
+    return get_weighted_years_percentile(years, income_distribution.weights, percentile).reshape(annual_income_caps.shape)
+
+
+@instrumentation.staged
+def solve_policy(income_distribution: BinnedIncomeDistribution | list, lever: str, target_years: float, bounds: tuple = None,
+                 annual_income_cap: float = 500e3, economy_subsidy: float = 0, interest_rate: float = 0.07, interest_rate_low_risk: float = 0.05,
+                 number_of_citizens: float = 1, percentile: float = 50, tolerance: float = None, max_evaluations: int = 200,
+                 points_per_round: int = 16, max_years: int = 100, tax_schedule: TaxSchedule | int = 2025) -> PolicySolution:
+    """
+    Find the value of a policy lever at which the population-weighted percentile of the years to reach sufficient capital reaches a target,
+    e.g. the economy_subsidy that gets the median years under 20.
+
+    The target is met if the percentile of the years is at most target_years. The search assumes that this is monotone in the lever and
+    returns the value at the boundary between the values that meet the target and the ones that do not, i.e. the value closest to the ones
+    that miss the target (e.g. the smallest subsidy that meets it):
+        1. Bracketing: points_per_round values are evaluated across the bounds at once, the first pair of neighbouring values of which one
+           meets the target and the other does not is the bracket.
+        2. Refinement: points_per_round values inside the bracket are evaluated at once and the bracket shrinks to the pair where the target
+           switches, until it is smaller than the tolerance or the evaluation budget is used up.
+
+    params:
+        income_distribution: BinnedIncomeDistribution or list, list of annual income values and their probabilities
+        lever: str, policy lever to solve for, one of policy_levers
+        target_years: float, target for the percentile of the years
+        bounds: tuple, (lower, upper) values of the lever. By default the caps between the second lowest and the highest income, or
+            the subsidies between 0 and 10 trillion EUR.
+        annual_income_cap: float, annual income cap in EUR if the lever is the economy_subsidy
+        economy_subsidy: float, economy subsidy in EUR if the lever is the annual_income_cap
+        interest_rate: float, annual interest rate for the capital growth phase
+        interest_rate_low_risk: float, annual interest rate for the time when the capital serves as passive income
+        number_of_citizens: float, number of citizens in the country
+        percentile: float, percentile of the years in percent, e.g. 50 for the median
+        tolerance: float, width of the final bracket, by default 1e-4 of the bounds
+        max_evaluations: int, maximum number of evaluated policies
+        points_per_round: int, number of policies that are evaluated at once per round
+        max_years: int, maximum number of years that are considered
+        tax_schedule: TaxSchedule or int, tax schedule or its year
+
+    returns:
+        solution: PolicySolution
+    """
+
+    if lever not in policy_levers:
+        raise ValueError(f"Unknown policy lever {lever}, available levers: {policy_levers}")
+
+    income_distribution = get_binned_income_distribution(income_distribution)
+    IncomeDistribution.check_sum_probability(income_distribution)
+
+    if bounds is None:
+        if lever == "annual_income_cap":
+            # At least one bracket has to be below the cap
+            sorted_incomes = np.sort(income_distribution.annual_incomes)
+            bounds = (sorted_incomes[min(1, len(sorted_incomes) - 1)], sorted_incomes[-1])
+        else:
+            bounds = (0.0, 10e12)
+
+    lower, upper = float(bounds[0]), float(bounds[1])
+    if tolerance is None:
+        tolerance = (upper - lower) * 1e-4
+
+    def evaluate(values):
+        caps, subsidies = (values, economy_subsidy) if lever == "annual_income_cap" else (annual_income_cap, values)
+        return evaluate_policies(income_distribution, caps, subsidies, interest_rate, interest_rate_low_risk, number_of_citizens, percentile,
+                                 max_years, tax_schedule)
+
+    values = np.linspace(lower, upper, points_per_round)
+    metrics = evaluate(values)
+    evaluations = len(values)
+
+    while True:
+        target_met = metrics <= target_years
+        switches = np.flatnonzero(target_met[1:] != target_met[:-1])
+
+        if len(switches) == 0:
+            status = "target_met_everywhere" if target_met[0] else "target_never_met"
+            return PolicySolution(lever=lever, value=np.nan, metric=np.nan, target_years=target_years, status=status, evaluations=evaluations,
+                                  bracket=(lower, upper))
+
+        i = switches[0]
+        lower, upper = values[i], values[i + 1]
+        metric_lower, metric_upper = metrics[i], metrics[i + 1]
+
+        if upper - lower <= tolerance or evaluations + points_per_round > max_evaluations:
+            break
+
+        interior = np.linspace(lower, upper, points_per_round + 2)[1:-1]
+        values = np.concatenate([[lower], interior, [upper]])
+        metrics = np.concatenate([[metric_lower], evaluate(interior), [metric_upper]])
+        evaluations += len(interior)
+
+    status = "converged" if upper - lower <= tolerance else "budget_exhausted"
+    value, metric = (lower, metric_lower) if metric_lower <= target_years else (upper, metric_upper)
+
+    return PolicySolution(lever=lever, value=float(value), metric=float(metric), target_years=target_years, status=status, evaluations=evaluations,
+                          bracket=(float(lower), float(upper)))
+
+
+if __name__ == "__main__":
+
+    logging.basicConfig(level=logging.INFO, format='%(funcName)s:  %(message)s')
+
+    income_distribution = IncomeDistribution.cutoff_income_distribution(IncomeDistribution.income_distribution_germany_annual_pretax_2025, 20e3)
+
+    for target_years in [25, 20, 15]:
+        solution = solve_policy(income_distribution, "economy_subsidy", target_years, annual_income_cap=100e3, interest_rate=0.07,
+                                number_of_citizens=83e6)
+        logging.info(f"Median years at most {target_years} with an annual income cap of 100k: {solution}")
+
+        solution = solve_policy(income_distribution, "annual_income_cap", target_years, economy_subsidy=300e9, interest_rate=0.07,
+                                number_of_citizens=83e6)
+        logging.info(f"Median years at most {target_years} with an economy subsidy of 300b: {solution}")
@@ -0,0 +1,375 @@
+import numpy as np
+
+import os
+import time
+import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import instrumentation
+from tax_autonomy_estimations import (BinnedIncomeDistribution, IncomeDistribution, ScenarioResult, TaxCalculator, TaxSchedule,
+                                      calculate_income_support, calculate_income_support_batched, calculate_number_of_years_batched,
+                                      calculate_years_to_reach_capital, get_binned_income_distribution, get_tax_schedule)
+from scenario_results import ScenarioResultStore
+from result_cache import ResultCache, get_input_fingerprint
+
+
+# Scenario parameters in the order of the columns of the scenario grid
+scenario_parameters = ["annual_income_cap", "economy_subsidy", "interest_rate_low_risk", "interest_rate"]
+
+# Income distribution, number of citizens, tax schedule and result cache of the sweep, set once per worker process
+_sweep_state = {}
+
+
+def build_scenario_grid(annual_income_caps: list, economy_subsidies: list, interest_rates_low_risk: list, interest_rates: list) -> np.ndarray:
+    """
+    Build all combinations of the given scenario parameters.
+
+    params:
+        annual_income_caps: list, annual income caps in EUR
+        economy_subsidies: list, additional income subsidies through economic profits in EUR
+        interest_rates_low_risk: list, annual interest rates for the time when the capital serves as passive income
+        interest_rates: list, annual interest rates for the capital growth phase
+
+    returns:
+        scenarios: np.ndarray, array with one scenario per row and the columns given by scenario_parameters
+    """
+
+    grids = np.meshgrid(np.asarray(annual_income_caps, dtype=float), np.asarray(economy_subsidies, dtype=float),
+                        np.asarray(interest_rates_low_risk, dtype=float), np.asarray(interest_rates, dtype=float), indexing="ij")
+
+    return np.stack([grid.ravel() for grid in grids], axis=1)
+
+
+def get_scenario_columns(number_of_brackets: int) -> dict:
+    """
+    Get the columns of a result store with one row per scenario: the scenario parameters and the values per income bracket.
+
+    params:
+        number_of_brackets: int, number of income brackets of the income distribution
+
+    returns:
+        columns: dict, mapping of column name to (dtype, per-row shape), see ScenarioResultStore
+    """
+
+    columns = {name: ("<f8", ()) for name in scenario_parameters}
+    columns.update({"annual_income": ("<f8", (number_of_brackets,)),
+                    "income_tax": ("<f8", (number_of_brackets,)),
+                    "income_support": ("<f8", (number_of_brackets,)),
+                    "years": ("<i8", (number_of_brackets,)),
+                    "years_no_support": ("<i8", (number_of_brackets,)),
+                    "required_capital": ("<f8", (number_of_brackets,)),
+                    "accumulated_support_difference": ("<f8", ())})
+
+    return columns
+
+
+def _initialize_sweep_state(income_distribution: BinnedIncomeDistribution, number_of_citizens: float, tax_schedule: TaxSchedule | int = 2025,
+                            cache: ResultCache = None) -> None:
+    _sweep_state["income_distribution"] = income_distribution
+    _sweep_state["number_of_citizens"] = number_of_citizens
+    _sweep_state["tax_schedule"] = tax_schedule
+    _sweep_state["cache"] = cache
+
+
+@instrumentation.staged
+def evaluate_scenarios(scenarios: np.ndarray, income_distribution: BinnedIncomeDistribution | list = None, number_of_citizens: float = None,
+                       tax_schedule: TaxSchedule | int = None, cache: ResultCache = None) -> dict:
+    """
+    Evaluate a chunk of scenarios with the batched income support and years-to-capital solvers.
+
+    With a result cache, the reusable parts are cached instead of whole chunks: the income support per (cap, subsidy) and the years per
+    scenario. An extended sweep (e.g. with one more cap) is split into other chunks, but its scenarios are still read from the cache and
+    only the new ones are evaluated, in one batch per chunk.
+
+    params:
+        scenarios: np.ndarray, scenarios as returned by build_scenario_grid
+        income_distribution: BinnedIncomeDistribution or list, list of annual income values and their probabilities, by default the one of the sweep worker
+        number_of_citizens: float, number of citizens in the country, by default the one of the sweep worker
+        tax_schedule: TaxSchedule or int, tax schedule or its year, by default the one of the sweep worker
+        cache: ResultCache, result cache, by default the one of the sweep worker
+
+    returns:
+        results: dict, mapping of column name to an array with one row per scenario
+    """
+
+    if income_distribution is None:
+        income_distribution = _sweep_state["income_distribution"]
+    if number_of_citizens is None:
+        number_of_citizens = _sweep_state["number_of_citizens"]
+    if tax_schedule is None:
+        tax_schedule = _sweep_state["tax_schedule"]
+    if cache is None:
+        cache = _sweep_state.get("cache")
+
+    income_distribution = get_binned_income_distribution(income_distribution)
+    tax_schedule = get_tax_schedule(tax_schedule)
+
+    if cache is None:
+        return _evaluate_scenarios(scenarios, income_distribution, number_of_citizens, tax_schedule)
+
+    keys = [cache.get_key(_evaluate_scenarios, scenario=scenario, income_distribution=income_distribution, number_of_citizens=number_of_citizens,
+                          tax_schedule=tax_schedule)
+            for scenario in scenarios]
+    entries = [cache.get(key) for key in keys]
+    missing = [i for i, entry in enumerate(entries) if entry is None]
+
+    if missing:
+        computed = _evaluate_scenarios(scenarios[missing], income_distribution, number_of_citizens, tax_schedule, cache)
+
+        for row, i in enumerate(missing):
+            entries[i] = {"years": np.stack([computed["years"][row], computed["years_no_support"][row], computed["required_capital"][row]])}
+            cache.put(keys[i], entries[i], evict=False)
+
+        cache.evict()
+
+    # The support is read from the cache (or was just stored there), the years of every scenario come from its entry
+    annual_income_caps, economy_subsidies = scenarios[:, 0], scenarios[:, 1]
+    income_support, accumulated_support_difference = _get_income_support(income_distribution, annual_income_caps, economy_subsidies,
+                                                                          number_of_citizens, tax_schedule, cache)
+    years = np.stack([entry["years"] for entry in entries])
+
+    return _get_scenario_columns(scenarios, income_distribution, income_support, accumulated_support_difference, years[:, 0].astype(int),
+                                 years[:, 1].astype(int), years[:, 2], tax_schedule)
+
+
+def _get_income_support(income_distribution: BinnedIncomeDistribution, annual_income_caps: np.ndarray, economy_subsidies: np.ndarray,
+                        number_of_citizens: float, tax_schedule: TaxSchedule, cache: ResultCache = None) -> tuple:
+    # Support per scenario with the shape (scenarios, income brackets) and the accumulated support difference per scenario. The support
+    # only depends on the cap and the subsidy, so it is computed (or read from the cache) once per unique combination.
+    pairs, pair_index = np.unique(np.stack([annual_income_caps, economy_subsidies], axis=1), axis=0, return_inverse=True)
+    pair_index = pair_index.ravel()
+
+    if cache is None:
+        unique_caps, cap_index = np.unique(pairs[:, 0], return_inverse=True)
+        unique_subsidies, subsidy_index = np.unique(pairs[:, 1], return_inverse=True)
+
+        support_grid, support_difference_grid = calculate_income_support_batched(income_distribution, unique_caps, number_of_citizens,
+                                                                                 unique_subsidies, tax_schedule)
+
+        return support_grid[cap_index, subsidy_index][pair_index], support_difference_grid[cap_index][pair_index]
+
+    keys = [cache.get_key(calculate_income_support, income_distribution=income_distribution, annual_income_cap=annual_income_cap,
+                          number_of_citizens=number_of_citizens, economy_subsidy=economy_subsidy, tax_schedule=tax_schedule)
+            for annual_income_cap, economy_subsidy in pairs]
+    entries = [cache.get(key) for key in keys]
+    missing = [i for i, entry in enumerate(entries) if entry is None]
+
+    if missing:
+        income_support, accumulated_support_difference = _get_income_support(income_distribution, pairs[missing, 0], pairs[missing, 1],
+                                                                              number_of_citizens, tax_schedule)
+
+        for row, i in enumerate(missing):
+            entries[i] = {"income_support": income_support[row], "accumulated_support_difference": accumulated_support_difference[row]}
+            cache.put(keys[i], entries[i], evict=False)
+
+        cache.evict()
+
+    return (np.stack([entry["income_support"] for entry in entries])[pair_index],
+            np.array([entry["accumulated_support_difference"] for entry in entries])[pair_index])
+
+
+def _get_scenario_columns(scenarios: np.ndarray, income_distribution: BinnedIncomeDistribution, income_support: np.ndarray,
+                          accumulated_support_difference: np.ndarray, years: np.ndarray, years_no_support: np.ndarray, required_capital: np.ndarray,
+                          tax_schedule: TaxSchedule) -> dict:
+    annual_income_caps, economy_subsidies, interest_rates_low_risk, interest_rates = scenarios.T
+    annual_incomes = income_distribution.annual_incomes
+
+    return {"annual_income_cap": annual_income_caps,
+            "economy_subsidy": economy_subsidies,
+            "interest_rate_low_risk": interest_rates_low_risk,
+            "interest_rate": interest_rates,
+            # The incomes and income taxes are the same for all scenarios, every row is complete on its own nevertheless
+            "annual_income": np.broadcast_to(annual_incomes, income_support.shape),
+            "income_tax": np.broadcast_to(TaxCalculator.calculate_german_income_tax(annual_incomes, tax_schedule), income_support.shape),
+            "income_support": income_support,
+            "years": years,
+            "years_no_support": years_no_support,
+            "required_capital": required_capital,
+            "accumulated_support_difference": accumulated_support_difference}
+
+
+def _evaluate_scenarios(scenarios: np.ndarray, income_distribution: BinnedIncomeDistribution, number_of_citizens: float, tax_schedule: TaxSchedule,
+                        cache: ResultCache = None) -> dict:
+    instrumentation.count("evaluate_scenarios.scenarios", len(scenarios))
+
+    annual_income_caps, economy_subsidies, interest_rates_low_risk, interest_rates = scenarios.T
+    annual_incomes = income_distribution.annual_incomes
+
+    income_support, accumulated_support_difference = _get_income_support(income_distribution, annual_income_caps, economy_subsidies,
+                                                                          number_of_citizens, tax_schedule, cache)
+
+    years, required_capital = calculate_number_of_years_batched(interest_rates[:, None], interest_rates_low_risk[:, None], annual_incomes[None, :],
+                                                                annual_income_caps[:, None], income_support, tax_schedule=tax_schedule)
+    years_no_support, _ = calculate_number_of_years_batched(interest_rates[:, None], interest_rates_low_risk[:, None], annual_incomes[None, :],
+                                                            annual_income_caps[:, None], 0.0, tax_schedule=tax_schedule)
+
+    return _get_scenario_columns(scenarios, income_distribution, income_support, accumulated_support_difference, years, years_no_support,
+                                 required_capital, tax_schedule)
+
+
+def _evaluate_chunk(scenarios: np.ndarray, profiled: bool) -> tuple:
+    # Evaluation of a chunk in a worker process, with the profile of the worker if the main process records one
+    if not profiled:
+        return evaluate_scenarios(scenarios), None
+
+    with instrumentation.profiling() as profile:
+        results = evaluate_scenarios(scenarios)
+
+    return results, profile
+
+
+@instrumentation.staged
+def run_sweep(income_distribution: BinnedIncomeDistribution | list, output_directory: str, annual_income_caps: list, economy_subsidies: list = [0],
+              interest_rates_low_risk: list = [0.05], interest_rates: list = [0.03, 0.07, 0.14, 0.2], number_of_citizens: float = 1,
+              max_workers: int = None, chunk_size: int = 256, tax_schedule: TaxSchedule | int = 2025, cache: ResultCache = None) -> ScenarioResultStore:
+    """
+    Run all combinations of the scenario parameters across a process pool and stream the results to a ScenarioResultStore.
+
+    Each finished chunk of scenarios is committed to the store right away. When the sweep is started again with the same output directory,
+    all scenarios that are already in the store are skipped, i.e. an interrupted sweep is resumed. The store records a fingerprint of the
+    income distribution, the number of citizens and the tax schedule, and resuming it with other inputs raises a ValueError.
+
+    params:
+        income_distribution: BinnedIncomeDistribution or list, list of annual income values and their probabilities
+        output_directory: str, directory of the result store
+        annual_income_caps: list, annual income caps in EUR
+        economy_subsidies: list, additional income subsidies through economic profits in EUR
+        interest_rates_low_risk: list, annual interest rates for the time when the capital serves as passive income
+        interest_rates: list, annual interest rates for the capital growth phase
+        number_of_citizens: float, number of citizens in the country
+        max_workers: int, number of worker processes, by default the number of cores. With 1 the sweep runs in the current process.
+        chunk_size: int, number of scenarios per task of a worker
+        tax_schedule: TaxSchedule or int, tax schedule or its year that is used for all scenarios
+        cache: ResultCache, if given, chunks of scenarios that were evaluated before (e.g. by a sweep into another output directory) are
+            read from the cache
+
+    returns:
+        store: ScenarioResultStore, store with the results of all scenarios
+    """
+
+    # The distribution is converted once instead of in every chunk
+    income_distribution = get_binned_income_distribution(income_distribution)
+    IncomeDistribution.check_sum_probability(income_distribution)
+
+    # Only scenarios of the same inputs can be resumed, the scenario parameters alone do not identify a result
+    fingerprint = get_input_fingerprint(income_distribution=income_distribution, number_of_citizens=number_of_citizens, tax_schedule=tax_schedule)
+    store = ScenarioResultStore(output_directory, get_scenario_columns(len(income_distribution)), fingerprint)
+
+    scenarios = build_scenario_grid(annual_income_caps, economy_subsidies, interest_rates_low_risk, interest_rates)
+
+    if len(store) > 0:
+        stored_parameters = store.read(scenario_parameters)
+        finished_scenarios = set(zip(*[stored_parameters[name].tolist() for name in scenario_parameters]))
+        scenarios = scenarios[[tuple(scenario) not in finished_scenarios for scenario in scenarios.tolist()]]
+        logging.info(f"Resuming sweep, {len(finished_scenarios)} scenarios already finished")
+
+    chunks = [scenarios[i:i+chunk_size] for i in range(0, len(scenarios), chunk_size)]
+    logging.info(f"Running {len(scenarios)} scenarios in {len(chunks)} chunks")
+
+    if max_workers == 1:
+        _initialize_sweep_state(income_distribution, number_of_citizens, tax_schedule, cache)
+        for chunk in chunks:
+            results = evaluate_scenarios(chunk)
+            with instrumentation.stage("append"):
+                store.append(results)
+        return store
+
+    with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count(), initializer=_initialize_sweep_state,
+                             initargs=(income_distribution, number_of_citizens, tax_schedule, cache)) as executor:
+        profiled = instrumentation.get_profile() is not None
+        futures = [executor.submit(_evaluate_chunk, chunk, profiled) for chunk in chunks]
+
+        for finished_chunks, future in enumerate(as_completed(futures), start=1):
+            results, profile = future.result()
+            instrumentation.merge(profile)
+
+            with instrumentation.stage("append"):
+                store.append(results)
+            logging.info(f"Finished chunk {finished_chunks}/{len(chunks)}")
+
+    return store
+
+
+def export_scenario_result(result: ScenarioResult, output_directory: str) -> ScenarioResultStore:
+    """
+    Append the result of calculate_years_to_reach_capital to a result store of single scenarios, with one row per interest rate and the
+    columns of a sweep plus the fingerprint of the inputs of every row. Rows that are already in the store are skipped, so exporting the
+    same result again does not add duplicates.
+
+    Single scenarios are not meant to be collected in the store of a sweep, whose rows are identified by the scenario parameters when it is
+    resumed. Exporting into the directory of a sweep raises a ValueError because the columns do not match.
+
+    params:
+        result: ScenarioResult, result of calculate_years_to_reach_capital
+        output_directory: str, directory of the result store, which is created if it does not exist
+
+    returns:
+        store: ScenarioResultStore, store with the appended rows
+    """
+
+    number_of_rows, number_of_brackets = result.years_to_reach_capital.shape
+    store = ScenarioResultStore(output_directory, {**get_scenario_columns(number_of_brackets), "input_fingerprint": ("S64", ())})
+
+    # The income support stands in for the income distribution, which is not part of the result
+    fingerprints = np.array([get_input_fingerprint(annual_incomes=result.annual_incomes, income_support=result.income_support,
+                                                   interest_rate_low_risk=result.interest_rate_low_risk, interest_rate=interest_rate,
+                                                   annual_income_cap=result.annual_income_cap, number_of_citizens=result.number_of_citizens,
+                                                   economy_subsidy=result.economy_subsidy, tax_schedule=result.tax_schedule)
+                             for interest_rate in result.interest_rates], dtype="S64")
+    new_rows = ~np.isin(fingerprints, store.read(["input_fingerprint"])["input_fingerprint"])
+
+    if not new_rows.any():
+        logging.info(f"All {number_of_rows} rows of the scenario are already in the result store")
+        return store
+
+    annual_incomes = np.broadcast_to(result.annual_incomes, (number_of_rows, number_of_brackets))
+    annual_income_net = TaxCalculator.calculcate_post_tax_income(np.minimum(result.annual_incomes, result.annual_income_cap),
+                                                                       result.tax_schedule)
+
+    def repeat(value):
+        return np.full(number_of_rows, value, dtype=float)
+
+    rows = {"annual_income_cap": repeat(result.annual_income_cap),
+            "economy_subsidy": repeat(result.economy_subsidy),
+            "interest_rate_low_risk": repeat(result.interest_rate_low_risk),
+            "interest_rate": result.interest_rates,
+            "annual_income": annual_incomes,
+            "income_tax": np.broadcast_to(TaxCalculator.calculate_german_income_tax(result.annual_incomes, result.tax_schedule), annual_incomes.shape),
+            "income_support": np.broadcast_to(result.income_support, annual_incomes.shape),
+            "years": result.years_to_reach_capital,
+            "years_no_support": result.years_to_reach_capital_no_support,
+            "required_capital": np.broadcast_to(annual_income_net / result.interest_rate_low_risk, annual_incomes.shape),
+            "accumulated_support_difference": repeat(result.accumulated_support_difference),
+            "input_fingerprint": fingerprints}
+
+    store.append({name: np.asarray(values)[new_rows] for name, values in rows.items()})
+
+    return store
+
+
+if __name__ == "__main__":
+
+    logging.basicConfig(level=logging.INFO, format='%(funcName)s:  %(message)s')
+
+    income_distribution = IncomeDistribution.cutoff_income_distribution(IncomeDistribution.income_distribution_germany_annual_pretax_2025, 20e3)
+
+    store = run_sweep(income_distribution, "sweep_results",
+                      annual_income_caps=np.arange(50e3, 200e3, 1e3),
+                      economy_subsidies=[0, 300e9, 1000e9],
+                      interest_rates_low_risk=[0.03, 0.05],
+                      interest_rates=[0.03, 0.07, 0.14, 0.2],
+                      number_of_citizens=83e6)
+
+    logging.info(f"{len(store)} scenarios in the sweep store")
+
+    # A single scenario with other interest rates is collected in its own store, running this again does not add it twice
+    result = calculate_years_to_reach_capital(income_distribution, 0.05, [0.05, 0.1], 100e3, 83e6, 300e9)
+    scenario_store = export_scenario_result(result, "scenario_results")
+
+    logging.info(f"{len(scenario_store)} scenarios in the store of single scenarios")
+
+    # Reading back only maps the selected columns, no model run is needed
+    start = time.perf_counter()
+    columns = ScenarioResultStore("sweep_results").read(["annual_income_cap", "years", "required_capital"])
+    logging.info(f"Opened {list(columns)} in {(time.perf_counter() - start)*1e3:.2f} ms, median years at the first income bracket: "
+                 f"{np.median(columns['years'][:, 0]):.0f}")
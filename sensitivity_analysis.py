@@ -0,0 +1,229 @@
+"""
+Sensitivity of the years to reach sufficient capital (with income support) to the model parameters and the income tax coefficients.
+
+Two analyses are run on the same batch of parameter samples:
+    1. Local: elasticities from central finite differences around the base parameters, i.e. the relative change of the years per
+       relative change of a parameter.
+    2. Global: variance-based (Sobol) indices over uniform ranges of all parameters, estimated with the Saltelli / Jansen estimators from
+       two random sample matrices A and B and the matrices AB_i, in which column i of A is taken from B.
+
+All samples are evaluated in one batched pass: every sample is one row of a stacked TaxSchedule (see TaxSchedule), so that the income tax,
+the income support and the years of all samples and income brackets are computed with array operations. The years are evaluated without
+rounding up to whole years (see calculate_number_of_years_batched), otherwise small perturbations would mostly give no change at all.
+"""
+
+import numpy as np
+
+import logging
+from dataclasses import dataclass
+
+import instrumentation
+from tax_autonomy_estimations import (BinnedIncomeDistribution, IncomeDistribution, TaxSchedule, calculate_income_support_stacked,
+                                      calculate_number_of_years_batched, get_binned_income_distribution, get_tax_schedule)
+
+
+# Parameters of the scenario and coefficients of the income tax schedule that are analysed, in the order of the sample columns
+scenario_parameters = ["interest_rate", "interest_rate_low_risk", "annual_income_cap", "economy_subsidy", "number_of_citizens"]
+tax_parameters = ["E0", "E1", "E2", "E3", "sg1", "p1", "sg2", "p2", "sg3", "C3", "sg4", "C4"]
+parameter_names = scenario_parameters + tax_parameters
+
+
+@dataclass(frozen=True, slots=True, eq=False)
+class SensitivityResult:
+    """
+    Sensitivities of the years to reach sufficient capital per parameter (rows, in the order of parameter_names) and income bracket (columns).
+    Sensitivities that are not defined (e.g. the elasticity of a parameter with base value 0 or the indices of brackets whose years do not
+    vary) are nan.
+    """
+
+    annual_incomes: np.ndarray
+    base_parameters: np.ndarray
+
+    # Years per income bracket with the base parameters
+    base_years: np.ndarray
+
+    elasticities: np.ndarray
+    first_order_indices: np.ndarray
+    total_indices: np.ndarray
+
+    # Number of evaluated parameter samples
+    evaluations: int
+
+
+def get_base_parameters(annual_income_cap: float = 500e3, economy_subsidy: float = 0, interest_rate: float = 0.07, interest_rate_low_risk: float = 0.05,
+                        number_of_citizens: float = 1, tax_schedule: TaxSchedule | int = 2025) -> np.ndarray:
+    """
+    Get the base values of all parameters as one sample row.
+
+    returns:
+        base_parameters: np.ndarray, values in the order of parameter_names
+    """
+
+    tax_schedule = get_tax_schedule(tax_schedule)
+    scenario_values = [interest_rate, interest_rate_low_risk, annual_income_cap, economy_subsidy, number_of_citizens]
+
+    return np.array(scenario_values + [getattr(tax_schedule, name) for name in tax_parameters], dtype=float)
+
+
+@instrumentation.staged
+def evaluate_parameter_samples(income_distribution: BinnedIncomeDistribution | list, samples: np.ndarray, max_years: int = 100,
+                               tax_schedule: TaxSchedule | int = 2025, chunk_size: int = 4096) -> np.ndarray:
+    """
+    Evaluate the years to reach sufficient capital with income support for many parameter samples at once.
+
+    The income support is computed with calculate_income_support_stacked, i.e. with one cap, subsidy and tax schedule per sample.
+
+    params:
+        income_distribution: BinnedIncomeDistribution or list, list of annual income values and their probabilities
+        samples: np.ndarray, parameter values with the shape (samples, parameters), the columns in the order of parameter_names
+        max_years: int, maximum number of years that are considered
+        tax_schedule: TaxSchedule or int, tax schedule or its year, provides the year and the social security parameters
+        chunk_size: int, number of samples that are evaluated per array operation, limits the memory
+
+    returns:
+        years: np.ndarray, years (not rounded to whole years) with the shape (samples, income brackets)
+    """
+
+    distribution = get_binned_income_distribution(income_distribution)
+    tax_schedule = get_tax_schedule(tax_schedule)
+    samples = np.atleast_2d(np.asarray(samples, dtype=float))
+
+    annual_incomes, weights = distribution.annual_incomes, distribution.weights
+    years = np.empty((len(samples), len(annual_incomes)))
+
+    for start in range(0, len(samples), chunk_size):
+        chunk = samples[start:start + chunk_size]
+        interest_rate, interest_rate_low_risk, annual_income_cap, economy_subsidy, number_of_citizens = [
+            chunk[:, [parameter_names.index(name)]] for name in scenario_parameters]
+
+        # One schedule per sample, broadcast against the income brackets
+        stacked_schedule = tax_schedule.with_parameters(**{name: chunk[:, [parameter_names.index(name)]] for name in tax_parameters})
+
+        income_support, _ = calculate_income_support_stacked(annual_incomes[None, :], weights, annual_income_cap, number_of_citizens, economy_subsidy,
+                                                             stacked_schedule)
+
+        years[start:start + chunk_size], _ = calculate_number_of_years_batched(interest_rate, interest_rate_low_risk, annual_incomes[None, :],
+                                                                               annual_income_cap, income_support, max_years, stacked_schedule,
+                                                                               whole_years=False)
+
+    instrumentation.count("evaluate_parameter_samples.samples", len(samples))
+
+    return years
+
+
+def get_sobol_indices(years_A: np.ndarray, years_B: np.ndarray, years_AB: np.ndarray) -> tuple:
+    """
+    Estimate the first-order indices (Saltelli 2010) and total indices (Jansen) from the years of the sample matrices.
+
+    The years are centered on their mean first. This does not change the expected value of the first-order estimator, but without it the
+    estimator multiplies years of about 20 with small differences and its error is of the order of the indices themselves. The remaining
+    sampling error can still push an index slightly out of its range, so the estimates are clipped to [0, 1].
+
+    params:
+        years_A: np.ndarray, years of the samples of A with the shape (samples, income brackets)
+        years_B: np.ndarray, years of the samples of B with the shape (samples, income brackets)
+        years_AB: np.ndarray, years of the samples of AB_i with the shape (parameters, samples, income brackets)
+
+    returns:
+        first_order_indices: np.ndarray, first-order indices with the shape (parameters, income brackets)
+        total_indices: np.ndarray, total indices with the shape (parameters, income brackets)
+    """
+
+    years = np.concatenate([years_A, years_B])
+    mean_years, variance = np.mean(years, axis=0), np.var(years, axis=0)
+    safe_variance = np.where(variance > 0, variance, np.nan)
+
+    years_A, years_B, years_AB = years_A - mean_years, years_B - mean_years, years_AB - mean_years
+
+    first_order_indices = np.mean(years_B * (years_AB - years_A), axis=1) / safe_variance
+    total_indices = 0.5 * np.mean(np.square(years_A - years_AB), axis=1) / safe_variance
+
+    return np.clip(first_order_indices, 0, 1), np.clip(total_indices, 0, 1)
+
+
+@instrumentation.staged
+def run_sensitivity_analysis(income_distribution: BinnedIncomeDistribution | list, annual_income_cap: float = 500e3, economy_subsidy: float = 0,
+                             interest_rate: float = 0.07, interest_rate_low_risk: float = 0.05, number_of_citizens: float = 1,
+                             relative_step: float = 0.01, relative_range: float = 0.1, parameter_ranges: dict = None, sample_budget: int = 10_000,
+                             seed: int = 0, max_years: int = 100, tax_schedule: TaxSchedule | int = 2025) -> SensitivityResult:
+    """
+    Run the local and the global sensitivity analysis around the base parameters, see the module docstring.
+
+    The sample budget covers the samples of the global analysis, i.e. the matrices A, B and AB_i with N = sample_budget // (parameters + 2)
+    rows each. The 2 * parameters + 1 samples of the finite differences come on top. Perturbed tax zone boundaries have to stay in order,
+    which holds for the default ranges.
+
+    params:
+        income_distribution: BinnedIncomeDistribution or list, list of annual income values and their probabilities
+        annual_income_cap: float, annual income cap in EUR
+        economy_subsidy: float, additional income subsidy through economic profits in EUR
+        interest_rate: float, annual interest rate for the capital growth phase
+        interest_rate_low_risk: float, annual interest rate for the time when the capital serves as passive income
+        number_of_citizens: float, number of citizens in the country
+        relative_step: float, relative step of the finite differences
+        relative_range: float, the global analysis samples every parameter uniformly within +- relative_range of its base value
+        parameter_ranges: dict, (lower, upper) range of a parameter name that replaces the relative range, e.g. {"economy_subsidy": (0, 500e9)}
+        sample_budget: int, number of samples of the global analysis
+        seed: int, seed of the random samples
+        max_years: int, maximum number of years that are considered
+        tax_schedule: TaxSchedule or int, tax schedule or its year
+
+    returns:
+        result: SensitivityResult
+    """
+
+    distribution = get_binned_income_distribution(income_distribution)
+    IncomeDistribution.check_sum_probability(distribution)
+
+    base_parameters = get_base_parameters(annual_income_cap, economy_subsidy, interest_rate, interest_rate_low_risk, number_of_citizens, tax_schedule)
+    number_of_parameters = len(parameter_names)
+
+    parameter_ranges = parameter_ranges or {}
+    unknown_parameters = set(parameter_ranges) - set(parameter_names)
+    if unknown_parameters:
+        raise ValueError(f"Unknown parameters {sorted(unknown_parameters)}, available parameters: {parameter_names}")
+
+    lower, upper = np.array([parameter_ranges.get(name, (value - abs(value) * relative_range, value + abs(value) * relative_range))
+                             for name, value in zip(parameter_names, base_parameters)], dtype=float).T
+
+    # Finite differences: the base sample, then the samples with every parameter increased and decreased by the relative step
+    steps = np.diag(base_parameters * relative_step)
+    difference_samples = np.concatenate([base_parameters[None, :], base_parameters + steps, base_parameters - steps])
+
+    # Global analysis: A, B and the matrices AB_i
+    number_of_samples = max(sample_budget // (number_of_parameters + 2), 2)
+    rng = np.random.default_rng(seed)
+    samples_A, samples_B = lower + (upper - lower) * rng.random((2, number_of_samples, number_of_parameters))
+
+    samples_AB = np.repeat(samples_A[None, :, :], number_of_parameters, axis=0)
+    samples_AB[np.arange(number_of_parameters), :, np.arange(number_of_parameters)] = samples_B.T
+
+    samples = np.concatenate([difference_samples, samples_A, samples_B, samples_AB.reshape(-1, number_of_parameters)])
+    years = evaluate_parameter_samples(distribution, samples, max_years, tax_schedule)
+
+    base_years = years[0]
+    years_up, years_down = years[1:number_of_parameters + 1], years[number_of_parameters + 1:2 * number_of_parameters + 1]
+    years_A, years_B, years_AB = np.split(years[2 * number_of_parameters + 1:], [number_of_samples, 2 * number_of_samples])
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        elasticities = (years_up - years_down) / (2 * relative_step * base_years[None, :])
+    elasticities = np.where((base_parameters[:, None] != 0) & (base_years[None, :] > 0), elasticities, np.nan)
+
+    first_order_indices, total_indices = get_sobol_indices(years_A, years_B, years_AB.reshape(number_of_parameters, number_of_samples, -1))
+
+    return SensitivityResult(annual_incomes=distribution.annual_incomes, base_parameters=base_parameters, base_years=base_years, elasticities=elasticities,
+                             first_order_indices=first_order_indices, total_indices=total_indices, evaluations=len(samples))
+
+
+if __name__ == "__main__":
+
+    logging.basicConfig(level=logging.INFO, format='%(funcName)s:  %(message)s')
+
+    income_distribution = IncomeDistribution.cutoff_income_distribution(IncomeDistribution.income_distribution_germany_annual_pretax_2025, 20e3)
+
+    result = run_sensitivity_analysis(income_distribution, annual_income_cap=100e3, economy_subsidy=300e9, number_of_citizens=83e6)
+
+    weights = get_binned_income_distribution(income_distribution).weights
+    logging.info(f"{result.evaluations} samples, population-weighted mean over the income brackets:")
+    for name, elasticities, total_indices in zip(parameter_names, result.elasticities, result.total_indices):
+        logging.info(f"{name:>24}: elasticity {np.nansum(elasticities * weights):8.3f}, total index {np.nansum(total_indices * weights):6.3f}")
@@ -1,9 +1,16 @@
 
 import numpy as np
-import matplotlib.pyplot as plt
 import sys
 
 import logging
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+import instrumentation
+
+if TYPE_CHECKING:
+    # Only for the annotation, result_cache imports this module
+    import result_cache
 
 
 class IncomeDistribution:
@@ -123,196 +130,652 @@ class IncomeDistribution:
                                                 [250000.0, 5238000.0]
                                             ]
                                                 
-    def check_sum_probability(distribution: list) -> None:
+    def check_sum_probability(distribution: "BinnedIncomeDistribution | list") -> None:
         """
         This function checks if the sum of the frequences in the income distribution is 1.
 
         params:
-            distribution: list, list of income values and their probabilities
+            distribution: BinnedIncomeDistribution or list, list of income values and their probabilities
         """
 
-        total_probability = sum([x[1] for x in distribution])
+        total_probability = get_binned_income_distribution(distribution).total_weight
         if round(total_probability,1)-1.0 > 1e-6:
             raise Warning("Income distribution does not sum up to 1, it is {:.3f}".format(total_probability))
 
-    def cutoff_income_distribution(income_distribution: list, cutoff: float) -> list:
+    def cutoff_income_distribution(income_distribution: "BinnedIncomeDistribution | list", cutoff: float) -> "BinnedIncomeDistribution | list":
         """
         Cut the income distribution at a certain cutoff value, i.e. removes all incomes that are lower than the cutoff value parameter.
 
         params:
-            income_distribution: list, list of income values and their probabilities
+            income_distribution: BinnedIncomeDistribution or list, list of income values and their probabilities
             cutoff: float, cutoff value in EUR
+
+        returns:
+            income_distribution: BinnedIncomeDistribution or list, same type as the given distribution
         """
+
+        if isinstance(income_distribution, BinnedIncomeDistribution):
+            return income_distribution.cutoff(cutoff)
+
         return [[income, percentage] for income, percentage in income_distribution if income >= cutoff]
 
-    def transform_distrubtion_to_annual_income() -> list:
+    @instrumentation.staged
+    def transform_distrubtion_to_annual_income(income_distribution_monthly_net: "BinnedIncomeDistribution | list" = None, tolerance: float = 0.1,
+                                               tax_schedule: "TaxSchedule | int" = 2025) -> "BinnedIncomeDistribution | list":
         """
         Transform the monthly net income distribution to annual pretax income distribution for Germany in 2025.
-        It uses the official German tax formulas for 2025 to calculate the annual pretax income and an adjusted binary search to find the correct value.
+        It uses the official German tax formulas for 2025 to calculate the annual pretax income and inverts them for all incomes at once,
+        see TaxCalculator.calculate_pretax_income.
+
+        params:
+            income_distribution_monthly_net: BinnedIncomeDistribution or list, list of monthly net income values and their probabilities,
+                by default income_distribution_germany_monthly_net_2025
+            tolerance: float, maximum deviation in EUR of the annual pretax incomes from the exact solution
+            tax_schedule: TaxSchedule or int, tax schedule or its year
 
         returns:
-            income_distribution_germany_annual_pretax_2025: list, list of annual pretax income values and their probabilities                    
+            income_distribution_germany_annual_pretax_2025: BinnedIncomeDistribution or list, list of annual pretax income values and their probabilities,
+                same type as the given distribution
         """
 
-        income_distribution_germany_annual_pretax_2025 = []
+        if income_distribution_monthly_net is None:
+            income_distribution_monthly_net = IncomeDistribution.income_distribution_germany_monthly_net_2025
+
+        distribution = get_binned_income_distribution(income_distribution_monthly_net)
 
-        for income_monthly_net,percentage in IncomeDistribution.income_distribution_germany_monthly_net_2025:
-            logging.debug(f"Now processing income: {income_monthly_net}")
+        income_annual_pretax = TaxCalculator.calculate_pretax_income(distribution.annual_incomes * 12, tolerance, tax_schedule=tax_schedule)
 
-            income_annual_net = income_monthly_net * 12
+        instrumentation.sample("transform_distrubtion_to_annual_income.income_annual_pretax", income_annual_pretax)
 
-            income_annual_delta = 0
-            income_annual_pretax_estimation = 0
-            epsilon_threshold = 0.01
-            epsilon = 1
-            multiplicator = 2
+        if isinstance(income_distribution_monthly_net, BinnedIncomeDistribution):
+            return BinnedIncomeDistribution.create(income_annual_pretax, distribution.weights)
 
-            while np.abs(epsilon) > epsilon_threshold:
-                income_annual_pretax_estimation = income_annual_net*multiplicator
+        return [[float(income), percentage] for income, percentage in zip(income_annual_pretax, [x[1] for x in income_distribution_monthly_net])]
+    
+    def plot_income_distribution_as_bar_chart(income_distribution: "BinnedIncomeDistribution | list", figure_name = "") -> None:
+        """
+        Plots the income distribution as a bar chart and shows it interactively, see figures.render_income_distribution.
 
-                income_annual_posttax_estimation = income_annual_pretax_estimation - TaxCalculator.calculate_german_income_tax(income_annual_pretax_estimation) - TaxCalculator.calculate_german_social_security_tax(income_annual_pretax_estimation)
+        params:
+            income_distribution: BinnedIncomeDistribution or list, list of income values and their probabilities
+            figure_name: str, name of the figure to save the plot
+        """
 
-                income_annual_delta = income_annual_posttax_estimation-income_annual_net
+        import matplotlib.pyplot as plt
+        from figures import render_income_distribution
 
-                
-                if income_annual_delta > 0:
-                    multiplicator = multiplicator - multiplicator/2
-                elif income_annual_delta < 0:
-                    multiplicator = multiplicator + multiplicator/2
+        figure = render_income_distribution(income_distribution, plt.figure())
 
-                epsilon = income_annual_delta / income_annual_net
+        if figure_name != "":
+            figure.savefig(figure_name)
+        plt.show()
     
-            logging.debug("Income net in EUR : " + str(income_annual_net) + " Income pre tax in EUR: " + str(int(income_annual_pretax_estimation)))
-            logging.debug("Monthly Income post tax in EUR: " + str(int(TaxCalculator.calculcate_post_tax_income(income_annual_pretax_estimation)/12)))
 
-            income_distribution_germany_annual_pretax_2025.append([income_annual_pretax_estimation,percentage])
 
-        return income_distribution_germany_annual_pretax_2025
-    
-    def plot_income_distribution_as_bar_chart(income_distribution: list, figure_name = "") -> None:
+def get_bin_edges(annual_incomes: np.ndarray) -> np.ndarray:
+    """
+    Get the edges of the income bins of a binned distribution, of which only the midpoints are known.
+
+    The inner edges lie halfway between neighbouring midpoints, the outer edges are mirrored at the first and last midpoint. Incomes are not negative.
+
+    params:
+        annual_incomes: np.ndarray, sorted midpoints of the income bins in EUR
+
+    returns:
+        bin_edges: np.ndarray, edges of the income bins with one element more than annual_incomes
+    """
+
+    annual_incomes = np.asarray(annual_incomes, dtype=float)
+
+    if len(annual_incomes) == 1:
+        return np.array([annual_incomes[0], annual_incomes[0]])
+
+    inner_edges = (annual_incomes[1:] + annual_incomes[:-1]) / 2
+    lower_edge = max(0.0, 2 * annual_incomes[0] - inner_edges[0])
+    upper_edge = 2 * annual_incomes[-1] - inner_edges[-1]
+
+    return np.concatenate([[lower_edge], inner_edges, [upper_edge]])
+
+
+@dataclass(frozen=True, slots=True, eq=False)
+class BinnedIncomeDistribution:
+    """
+    Immutable income distribution backed by two contiguous arrays: the annual income of every bin and its weight.
+
+    The weights can be probabilities or counts (e.g. income_distribution_us_annual_pretax_2022), normalize turns counts into probabilities.
+    The bins keep the order in which they were given. Where the income within a bin matters (quantiles, rebinning), the income is assumed to be
+    uniformly distributed between the edges of the bin, see get_bin_edges.
+
+    All calculation functions accept a BinnedIncomeDistribution wherever they accept a list of [income, probability], e.g.
+
+        income_distribution = BinnedIncomeDistribution.from_list(IncomeDistribution.income_distribution_us_annual_pretax_2022).normalize()
+    """
+
+    annual_incomes: np.ndarray
+    weights: np.ndarray
+
+    @staticmethod
+    def create(annual_incomes: np.ndarray, weights: np.ndarray) -> "BinnedIncomeDistribution":
+        """
+        Create a distribution from the incomes and the weights of the bins.
+
+        returns:
+            income_distribution: BinnedIncomeDistribution, distribution with read-only copies of the arrays
         """
-        Plots the income distribution as a bar chart.
+
+        def read_only(values):
+            array = np.array(values, dtype=float).ravel()
+            array.flags.writeable = False
+            return array
+
+        annual_incomes, weights = read_only(annual_incomes), read_only(weights)
+
+        if len(annual_incomes) != len(weights):
+            raise ValueError(f"Got {len(annual_incomes)} incomes but {len(weights)} weights")
+
+        return BinnedIncomeDistribution(annual_incomes=annual_incomes, weights=weights)
+
+    @staticmethod
+    def from_list(income_distribution: list) -> "BinnedIncomeDistribution":
+        """
+        Create a distribution from a list of [income, weight].
+        """
+
+        distribution = np.asarray(income_distribution, dtype=float).reshape(-1, 2)
+
+        return BinnedIncomeDistribution.create(distribution[:, 0], distribution[:, 1])
+
+    def to_list(self) -> list:
+        return [[income, weight] for income, weight in zip(self.annual_incomes.tolist(), self.weights.tolist())]
+
+    def __len__(self) -> int:
+        return len(self.annual_incomes)
+
+    @property
+    def total_weight(self) -> float:
+        return float(np.sum(self.weights))
+
+    def normalize(self) -> "BinnedIncomeDistribution":
+        """
+        Scale the weights so that they sum up to 1, e.g. to turn counts into probabilities.
+        """
+
+        return BinnedIncomeDistribution.create(self.annual_incomes, self.weights / self.total_weight)
+
+    def cutoff(self, cutoff: float) -> "BinnedIncomeDistribution":
+        """
+        Remove all bins with an income lower than the cutoff, see IncomeDistribution.cutoff_income_distribution. The weights are not normalized again.
+        """
+
+        keep = self.annual_incomes >= cutoff
+
+        return BinnedIncomeDistribution.create(self.annual_incomes[keep], self.weights[keep])
+
+    def get_bin_edges(self) -> tuple:
+        """
+        Get the edges of the bins in the order of increasing income.
+
+        returns:
+            order: np.ndarray, indices that sort the bins by income
+            bin_edges: np.ndarray, edges of the sorted bins, see get_bin_edges
+        """
+
+        order = np.argsort(self.annual_incomes, kind="stable")
+
+        return order, get_bin_edges(self.annual_incomes[order])
+
+    def get_cumulative_weights(self) -> tuple:
+        """
+        Get the cumulative weight at the bin edges, i.e. the weight of all incomes below each edge.
+
+        returns:
+            bin_edges: np.ndarray, edges of the sorted bins
+            cumulative_weights: np.ndarray, cumulative weight at every edge, starting with 0
+        """
+
+        order, bin_edges = self.get_bin_edges()
+
+        return bin_edges, np.concatenate([[0.0], np.cumsum(self.weights[order])])
+
+    def quantile(self, quantiles: float | np.ndarray) -> float | np.ndarray:
+        """
+        Get weighted quantiles of the income, e.g. quantile(0.5) is the median income.
 
         params:
-            income_distribution: list, list of income values and their probabilities
-            figure_name: str, name of the figure to save the plot
+            quantiles: float or np.ndarray, quantiles between 0 and 1
+
+        returns:
+            annual_incomes: float or np.ndarray, annual incomes in EUR at the quantiles
         """
-        income_values = [x[0] for x in income_distribution]
-        income_probabilities = [x[1]*100 for x in income_distribution]
 
-        bin_width = (income_values[1] - income_values[0])*0.8
+        bin_edges, cumulative_weights = self.get_cumulative_weights()
+        annual_incomes = np.interp(np.asarray(quantiles, dtype=float) * cumulative_weights[-1], cumulative_weights, bin_edges)
 
-        plt.bar(income_values, income_probabilities, width=bin_width, edgecolor="black", alpha = 0.7)
-        plt.xlabel("Annual Pretax Income in EUR")
-        plt.ylabel("Part of Population [%]")
-        plt.grid()
-        if figure_name != "":
-            plt.savefig(figure_name)
-        plt.show()
-    
+        if annual_incomes.ndim == 0:
+            return float(annual_incomes)
 
+        return annual_incomes
 
-class TaxCalculator:
+    def rebin(self, bin_edges: np.ndarray) -> "BinnedIncomeDistribution":
+        """
+        Move the weights into new bins. Weight below the first or above the last new edge is dropped.
+
+        params:
+            bin_edges: np.ndarray, increasing edges of the new bins in EUR
+
+        returns:
+            income_distribution: BinnedIncomeDistribution, distribution with the midpoints of the new bins as incomes
+        """
+
+        bin_edges = np.asarray(bin_edges, dtype=float)
+        old_bin_edges, cumulative_weights = self.get_cumulative_weights()
+
+        weights = np.diff(np.interp(bin_edges, old_bin_edges, cumulative_weights))
+
+        return BinnedIncomeDistribution.create((bin_edges[1:] + bin_edges[:-1]) / 2, weights)
+
+    @staticmethod
+    def merge(income_distributions: list) -> "BinnedIncomeDistribution":
+        """
+        Merge distributions by adding their weights, e.g. the counts of several population groups. Bins with the same income are combined.
+
+        params:
+            income_distributions: list, list of BinnedIncomeDistribution or lists of [income, weight]
+
+        returns:
+            income_distribution: BinnedIncomeDistribution, merged distribution sorted by income
+        """
+
+        income_distributions = [get_binned_income_distribution(income_distribution) for income_distribution in income_distributions]
+
+        annual_incomes, bin_index = np.unique(np.concatenate([x.annual_incomes for x in income_distributions]), return_inverse=True)
+        weights = np.bincount(bin_index, weights=np.concatenate([x.weights for x in income_distributions]), minlength=len(annual_incomes))
+
+        return BinnedIncomeDistribution.create(annual_incomes, weights)
+
+    @staticmethod
+    def mix(income_distributions: list, mixture_weights: list) -> "BinnedIncomeDistribution":
+        """
+        Mix normalized distributions, e.g. mix([a, b], [0.3, 0.7]) describes a population with 30 % from a and 70 % from b.
+
+        params:
+            income_distributions: list, list of BinnedIncomeDistribution or lists of [income, weight]
+            mixture_weights: list, share of each distribution, normalized to sum up to 1
+
+        returns:
+            income_distribution: BinnedIncomeDistribution, mixed distribution with probabilities, sorted by income
+        """
+
+        mixture_weights = np.asarray(mixture_weights, dtype=float) / np.sum(mixture_weights)
+        income_distributions = [get_binned_income_distribution(income_distribution).normalize() for income_distribution in income_distributions]
+
+        return BinnedIncomeDistribution.merge([BinnedIncomeDistribution.create(x.annual_incomes, x.weights * mixture_weight)
+                                               for x, mixture_weight in zip(income_distributions, mixture_weights)])
+
+
+def get_binned_income_distribution(income_distribution: "BinnedIncomeDistribution | list") -> BinnedIncomeDistribution:
     """
-    This class allows to calculate the German income tax and social security tax for 2025 for a given annual income.
+    Get an income distribution as BinnedIncomeDistribution, distributions are returned unchanged.
 
-    The formulas and values are taken from https://de.wikipedia.org/wiki/Einkommensteuer_(Deutschland)#
+    params:
+        income_distribution: BinnedIncomeDistribution or list, distribution or list of [income, weight]
+
+    returns:
+        income_distribution: BinnedIncomeDistribution
     """
 
-    # Tax Brackets for 2025
-    E0 = 12097 # 10348 for 2022
-    E1 = 17444 # 14927 for 2022
-    E2 = 68481 # 58497 for 2022
-    E3 = 277286 # 277826 for 2022
+    if isinstance(income_distribution, BinnedIncomeDistribution):
+        return income_distribution
+
+    return BinnedIncomeDistribution.from_list(income_distribution)
+
+
+@dataclass(frozen=True, slots=True, eq=False)
+class TaxSchedule:
+    """
+    Immutable German income tax and social security schedule of a single year.
 
-    # Progression Zone Coefficients (official values)
-    sg1, p1 = 0.14, 998*1e-8
-    sg2, p2 = 0.2397, 181.19*1e-8
+    The raw parameters follow the official tax formula (see TaxCalculator), E0 ... E3 are the boundaries of the tax zones. Use
+    TaxSchedule.compile to create a schedule: it precompiles the formula into one row of coefficients per tax zone, so that the tax in
+    every zone is evaluated as
 
-    # Proportional Tax Offsets (corrected)
-    sg3, C3 = 0.42, -10911
-    sg4, C4 = 0.45, -19256.67
+        tax = linear * (income - shift) + quadratic * (income - shift)^2 + offset
+
+    with the zone of an income found by a binary search on the zone boundaries.
+
+    The parameters can also be numpy arrays, e.g. E0=np.array([11000, 12000])[:, None], which gives a stacked schedule with one schedule per
+    element: the precompiled zone arrays then have these leading axes and the zones as last axis, and the income tax and social security tax
+    broadcast incomes against them (see TaxCalculator.calculate_german_income_tax). calculate_pretax_income only supports single schedules.
+    """
+
+    year: int
+
+    # Tax zone boundaries
+    E0: float
+    E1: float
+    E2: float
+    E3: float
+
+    # Progression zone coefficients
+    sg1: float
+    p1: float
+    sg2: float
+    p2: float
+
+    # Proportional tax offsets
+    sg3: float
+    C3: float
+    sg4: float
+    C4: float
+
+    # Social security, only the employee part
+    social_security_lower_limit: float
+    social_security_upper_limit: float
+    medical_insurance_rate: float
+    pension_insurance_rate: float
+    unemployment_insurance_rate: float
+
+    # Precompiled values
+    zone_boundaries: np.ndarray
+    zone_shifts: np.ndarray
+    zone_linear_coefficients: np.ndarray
+    zone_quadratic_coefficients: np.ndarray
+    zone_offsets: np.ndarray
+    social_security_rate: float
 
     @staticmethod
-    def calculate_german_income_tax(income: float) -> float:
+    def compile(year: int, E0: float, E1: float, E2: float, E3: float, sg1: float, p1: float, sg2: float, p2: float, sg3: float, C3: float,
+                sg4: float, C4: float, social_security_lower_limit: float, social_security_upper_limit: float, medical_insurance_rate: float,
+                pension_insurance_rate: float, unemployment_insurance_rate: float) -> "TaxSchedule":
         """
-        German income tax calculation for 2025 using the official tax formula according to
-        https://de.wikipedia.org/wiki/Einkommensteuer_(Deutschland)#
+        Create a tax schedule from the parameters of the official tax formula.
 
-        Validity checked according to the 2022 curve with the 2022 values for E0, E1, E2 and E3.
+        returns:
+            tax_schedule: TaxSchedule, schedule with the precompiled zone coefficients
+        """
+
+        # Tax at E1 (S1), i.e. the offset of the second progression zone
+        S1 = sg1 * (E1 - E0) + np.pow(E1 - E0,2)*p1
+
+        def read_only(values):
+            # The zones are the last axis, in front of it are the axes of a stacked schedule
+            array = np.stack(np.broadcast_arrays(*[np.asarray(value, dtype=float) for value in values]), axis=-1)
+            array.flags.writeable = False
+            return array
+
+        return TaxSchedule(year=year, E0=E0, E1=E1, E2=E2, E3=E3, sg1=sg1, p1=p1, sg2=sg2, p2=p2, sg3=sg3, C3=C3, sg4=sg4, C4=C4,
+                           social_security_lower_limit=social_security_lower_limit, social_security_upper_limit=social_security_upper_limit,
+                           medical_insurance_rate=medical_insurance_rate, pension_insurance_rate=pension_insurance_rate,
+                           unemployment_insurance_rate=unemployment_insurance_rate,
+                           zone_boundaries=read_only([E0, E1, E2, E3]),
+                           zone_shifts=read_only([0, E0, E1, 0, 0]),
+                           zone_linear_coefficients=read_only([0, sg1, sg2, sg3, sg4]),
+                           zone_quadratic_coefficients=read_only([0, p1, p2, 0, 0]),
+                           zone_offsets=read_only([0, 0, S1, -np.abs(C3), -np.abs(C4)]),
+                           social_security_rate=medical_insurance_rate + pension_insurance_rate + unemployment_insurance_rate)
+
+    def with_parameters(self, **parameters) -> "TaxSchedule":
+        """
+        Create a copy of the schedule with some parameters changed, e.g. schedule.with_parameters(E0=13000).
+
+        returns:
+            tax_schedule: TaxSchedule, new schedule that is compiled again
+        """
+
+        names = ["year", "E0", "E1", "E2", "E3", "sg1", "p1", "sg2", "p2", "sg3", "C3", "sg4", "C4", "social_security_lower_limit",
+                 "social_security_upper_limit", "medical_insurance_rate", "pension_insurance_rate", "unemployment_insurance_rate"]
+
+        return TaxSchedule.compile(**{**{name: getattr(self, name) for name in names}, **parameters})
+
+    def indexed(self, factor: float | np.ndarray) -> "TaxSchedule":
+        """
+        Create a copy of the schedule that is indexed by a factor, e.g. to inflation. The zone boundaries, the offsets and the social
+        security limits are scaled by the factor and the progression coefficients by its inverse, so that the tax of an income scaled by
+        the factor is scaled by the same factor: tax(factor * income, indexed schedule) = factor * tax(income, schedule).
 
         params:
-            income: float, annual income in EUR
+            factor: float or np.ndarray, indexation factor, an array such as factors[:, None] gives a stacked schedule
 
         returns:
-            tax: float, annual income tax in EUR
+            tax_schedule: TaxSchedule, indexed schedule
         """
 
-        E0 = TaxCalculator.E0
-        E1 = TaxCalculator.E1
-        E2 = TaxCalculator.E2
-        E3 = TaxCalculator.E3
+        factor = np.asarray(factor, dtype=float)
+
+        return self.with_parameters(E0=self.E0 * factor, E1=self.E1 * factor, E2=self.E2 * factor, E3=self.E3 * factor, p1=self.p1 / factor,
+                                    p2=self.p2 / factor, C3=self.C3 * factor, C4=self.C4 * factor,
+                                    social_security_lower_limit=self.social_security_lower_limit * factor,
+                                    social_security_upper_limit=self.social_security_upper_limit * factor)
 
-        sg1, p1 = TaxCalculator.sg1, TaxCalculator.p1
-        sg2, p2 = TaxCalculator.sg2, TaxCalculator.p2
 
-        sg3, C3 = TaxCalculator.sg3, TaxCalculator.C3
-        sg4, C4 = TaxCalculator.sg4, TaxCalculator.C4
+# The social security limits of the model coincide with the first taxed income (E0) and the start of the proportional zone (E2).
+tax_schedules = {
+    2022: TaxSchedule.compile(2022, E0=10348, E1=14927, E2=58597, E3=277826,
+                              sg1=0.14, p1=1088.67*1e-8, sg2=0.2397, p2=206.43*1e-8, sg3=0.42, C3=-9336.45, sg4=0.45, C4=-17671.20,
+                              social_security_lower_limit=10348, social_security_upper_limit=58597,
+                              medical_insurance_rate=(0.146+0.0305) / 2, pension_insurance_rate=0.186 / 2, unemployment_insurance_rate=0.024 / 2),
+    2024: TaxSchedule.compile(2024, E0=11785, E1=17006, E2=66761, E3=277826,
+                              sg1=0.14, p1=954.80*1e-8, sg2=0.2397, p2=181.19*1e-8, sg3=0.42, C3=-10636.31, sg4=0.45, C4=-18971.06,
+                              social_security_lower_limit=11785, social_security_upper_limit=66761,
+                              medical_insurance_rate=(0.146+0.034) / 2, pension_insurance_rate=0.186 / 2, unemployment_insurance_rate=0.026 / 2),
+    2025: TaxSchedule.compile(2025, E0=12097, E1=17444, E2=68481, E3=277286,
+                              sg1=0.14, p1=998*1e-8, sg2=0.2397, p2=181.19*1e-8, sg3=0.42, C3=-10911, sg4=0.45, C4=-19256.67,
+                              social_security_lower_limit=12097, social_security_upper_limit=68481,
+                              medical_insurance_rate=(0.146+0.036) / 2, pension_insurance_rate=0.186 / 2, unemployment_insurance_rate=0.026 / 2),
+}
 
-        if income <= E0:
-            return 0  # No tax in the first zone
 
-        elif E0 < income <= E1:
-            # First progression zone (quadratic tax growth)
-            return round(sg1 * (income - E0) + np.pow(income - E0,2)*p1, 2)
+def get_tax_schedule(tax_schedule: "TaxSchedule | int") -> TaxSchedule:
+    """
+    Get the tax schedule of a year, tax schedules are returned unchanged.
+
+    params:
+        tax_schedule: TaxSchedule or int, tax schedule or year of one of the tax_schedules
+
+    returns:
+        tax_schedule: TaxSchedule
+    """
+
+    if isinstance(tax_schedule, TaxSchedule):
+        return tax_schedule
 
-        elif E1 < income <= E2:
-            # Compute tax at E1 (S1)
-            S1 = sg1 * (E1 - E0) + np.pow(E1 - E0,2)*p1
-            # Second progression zone
-            return round(sg2 * (income - E1) + np.pow(income - E1,2)*p2 + S1, 2)
+    if tax_schedule not in tax_schedules:
+        raise ValueError(f"No tax schedule for {tax_schedule}, available years: {sorted(tax_schedules)}")
 
-        elif E2 < income <= E3:
-            # First proportional tax zone (linear tax with offset)
-            return round(sg3*income - np.abs(C3), 2)
+    return tax_schedules[tax_schedule]
 
-        else:  # income > E3
-            # Highest proportional tax zone (linear tax with offset)
-            return round(sg4 * income - np.abs(C4), 2)
 
-    def calculate_german_social_security_tax(income: float) -> float:
+class TaxCalculator:
+    """
+    This class allows to calculate the German income tax and social security tax for a given annual income.
+
+    The formulas and values are taken from https://de.wikipedia.org/wiki/Einkommensteuer_(Deutschland)#
+
+    All calculations use the 2025 schedule by default, the tax_schedule parameter selects another year of tax_schedules or a custom TaxSchedule.
+    """
+
+    @staticmethod
+    def calculate_german_income_tax(income: float | np.ndarray, tax_schedule: TaxSchedule | int = 2025) -> float | np.ndarray:
+        """
+        German income tax calculation using the official tax formula according to
+        https://de.wikipedia.org/wiki/Einkommensteuer_(Deutschland)#
+
+        Validity checked according to the 2022 curve with the 2022 values for E0, E1, E2 and E3.
+
+        The income can either be a single value or a numpy array of any shape. The tax zone of every income is looked up in the
+        precompiled zone coefficients of the tax schedule, so calling it once for millions of incomes is much faster than looping.
+
+        params:
+            income: float or np.ndarray, annual income in EUR
+            tax_schedule: TaxSchedule or int, tax schedule or its year
+
+        returns:
+            tax: float or np.ndarray (same shape as income), annual income tax in EUR
+        """
+
+        tax_schedule = get_tax_schedule(tax_schedule)
+
+        income_array = np.asarray(income, dtype=float)
+
+        # Zones: no tax up to E0, two progression zones (quadratic tax growth) and two proportional zones (linear tax with offset)
+        if tax_schedule.zone_boundaries.ndim == 1:
+            zone = np.searchsorted(tax_schedule.zone_boundaries, income_array, side="left")
+            zone_shift, zone_linear_coefficient, zone_quadratic_coefficient, zone_offset = (
+                tax_schedule.zone_shifts[zone], tax_schedule.zone_linear_coefficients[zone], tax_schedule.zone_quadratic_coefficients[zone],
+                tax_schedule.zone_offsets[zone])
+        else:
+            # Stacked schedule: every income is looked up in the zones of the schedule it is broadcast against
+            zone = np.sum(income_array[..., None] > tax_schedule.zone_boundaries, axis=-1)
+            zone_shift, zone_linear_coefficient, zone_quadratic_coefficient, zone_offset = [
+                np.take_along_axis(np.broadcast_to(coefficients, zone.shape + coefficients.shape[-1:]), zone[..., None], axis=-1)[..., 0]
+                for coefficients in (tax_schedule.zone_shifts, tax_schedule.zone_linear_coefficients, tax_schedule.zone_quadratic_coefficients,
+                                     tax_schedule.zone_offsets)]
+
+        income_in_zone = income_array - zone_shift
+        tax = (zone_linear_coefficient * income_in_zone + np.square(income_in_zone) * zone_quadratic_coefficient) + zone_offset
+
+        if tax.ndim == 0:
+            return round(float(tax), 2)
+
+        return np.round(tax, 2)
+
+    def calculate_german_social_security_tax(income: float | np.ndarray, tax_schedule: TaxSchedule | int = 2025) -> float | np.ndarray:
         """
-        German social security tax calculation for 2025 using the official tax formula.
+        German social security tax calculation using the official tax formula.
         In does not take into account different tax classes or other tax benefits.
 
+        The income can either be a single value or a numpy array of any shape.
+
         params:
-            income: float, annual income in EUR    
+            income: float or np.ndarray, annual income in EUR    
+            tax_schedule: TaxSchedule or int, tax schedule or its year
 
         returns:
-            tax: float, annual social security tax in EUR
+            tax: float or np.ndarray (same shape as income), annual social security tax in EUR
         """
 
-        lower_tax_limit = 12097
-        upper_tax_limit = 68481
+        tax_schedule = get_tax_schedule(tax_schedule)
 
-        medical_insurance_rate = (0.146+0.036) / 2 # Only the employee part
-        pension_insurance_rate = 0.186 / 2 # Only the employee part
-        unemployment_insurance_rate = 0.026 / 2 # Only the employee part
+        income_array = np.asarray(income, dtype=float)
 
-        if income <= 0:
-            return 0
-        
-        elif 0 < income <= lower_tax_limit:
-            return 0
-        
-        elif lower_tax_limit < income <= upper_tax_limit:
-            return income * (medical_insurance_rate + pension_insurance_rate + unemployment_insurance_rate)
-        
-        elif income > upper_tax_limit:
-            return upper_tax_limit * (medical_insurance_rate + pension_insurance_rate + unemployment_insurance_rate)
+        # No contributions up to the lower limit, contributions are capped at the upper limit
+        taxable_income = np.where(income_array <= tax_schedule.social_security_lower_limit, 0.0,
+                                  np.minimum(income_array, tax_schedule.social_security_upper_limit))
+        tax = taxable_income * tax_schedule.social_security_rate
+
+        if tax.ndim == 0:
+            return float(tax)
+
+        return tax
         
     @staticmethod
-    def print_results_income_tax(income:float) -> None:
+    @instrumentation.staged
+    def calculate_pretax_income(income_net: float | np.ndarray, tolerance: float = 0.1, table_size: int = 2048,
+                                tax_schedule: TaxSchedule | int = 2025) -> float | np.ndarray:
+        """
+        Invert calculcate_post_tax_income, i.e. find the annual pretax income for a given annual net income.
+
+        The net income is continuous and increasing within every tax zone, but it drops when social security starts at its lower limit.
+        Therefore the smallest pretax income that reaches the net income is returned (e.g. a net income just below the lower limit stays untaxed).
+
+        The inversion works on the whole array at once:
+            1. A lookup table of net incomes is computed on a geometric grid of pretax incomes that contains all zone boundaries, so that
+               every table cell lies within a single zone.
+            2. The table cell of each net income is found with a binary search on the running maximum of the table.
+            3. The bracket is narrowed with interpolation (secant) steps, alternating with bisection steps, until it is smaller than the tolerance.
+
+        Since the net income is nearly linear within a zone, a few vectorized steps are usually enough. The bisection steps guarantee the tolerance
+        after at most 2*log2(cell width/tolerance) steps.
+
+        params:
+            income_net: float or np.ndarray, annual net income in EUR
+            tolerance: float, maximum deviation in EUR of the returned pretax income from the exact solution. Note that the income tax
+                is rounded to cents, which limits the attainable precision to a few cents.
+            table_size: int, number of grid points of the lookup table
+            tax_schedule: TaxSchedule or int, tax schedule or its year
+
+        returns:
+            income_pretax: float or np.ndarray (same shape as income_net), annual pretax income in EUR, nan for non-finite net incomes
+        """
+
+        tax_schedule = get_tax_schedule(tax_schedule)
+
+        income_net_array = np.asarray(income_net, dtype=float)
+        if income_net_array.size == 0:
+            return income_net_array.copy()
+
+        # Non-finite net incomes (e.g. missing values of microdata) have no pretax income and must not enter the lookup table
+        finite = np.isfinite(income_net_array.ravel())
+        income_pretax = np.full(income_net_array.size, np.nan)
+        targets = income_net_array.ravel()[finite]
+
+        if targets.size == 0:
+            return float(income_pretax[0]) if income_net_array.ndim == 0 else income_pretax.reshape(income_net_array.shape)
+
+        # Lookup table on a grid that contains all zone boundaries of the income and social security tax
+        grid_start = min(0.0, targets.min()) - 1
+        grid_end = max(targets.max(), 1.0) * 4
+        while TaxCalculator.calculcate_post_tax_income(grid_end, tax_schedule) < targets.max():
+            grid_end *= 2
+
+        zone_boundaries = [*tax_schedule.zone_boundaries, tax_schedule.social_security_lower_limit, tax_schedule.social_security_upper_limit]
+        grid = np.unique(np.concatenate([[grid_start, 0.0], np.geomspace(1, grid_end, table_size), zone_boundaries]))
+        grid = grid[grid <= grid_end]
+        table = np.maximum.accumulate(TaxCalculator.calculcate_post_tax_income(grid, tax_schedule))
+
+        cell = np.clip(np.searchsorted(table, targets, side="left"), 1, len(grid) - 1)
+        lower, upper = grid[cell - 1], grid[cell]
+        net_lower, net_upper = table[cell - 1], table[cell]
+
+        max_iterations = 2 * int(np.ceil(np.log2(max(np.max(upper - lower), tolerance) / tolerance))) + 2
+
+        active = np.flatnonzero((upper - lower) > tolerance)
+
+        for iteration in range(max_iterations):
+            if active.size == 0:
+                break
+
+            instrumentation.count("calculate_pretax_income.iterations")
+            instrumentation.count("calculate_pretax_income.refined_incomes", active.size)
+
+            # Only the brackets that are not yet narrow enough are refined
+            target, low, high = targets[active], lower[active], upper[active]
+            net_low, net_high = net_lower[active], net_upper[active]
+
+            if iteration % 2 == 0:
+                # Secant step, evaluated at both sides of the estimate so that the bracket can collapse in a single step
+                slope = np.where(net_high > net_low, net_high - net_low, 1.0)
+                estimate = low + np.clip((target - net_low) / slope, 0, 1) * (high - low)
+                candidates = np.stack([np.maximum(estimate - 0.45 * tolerance, low), np.minimum(estimate + 0.45 * tolerance, high)])
+            else:
+                midpoint = (low + high) / 2
+                candidates = midpoint[None, :]
+
+            net_candidates = TaxCalculator.calculcate_post_tax_income(candidates, tax_schedule)
+
+            for candidate, net_candidate in zip(candidates, net_candidates):
+                below = (net_candidate < target) & (candidate > low)
+                above = (net_candidate >= target) & (candidate < high)
+                low, net_low = np.where(below, candidate, low), np.where(below, net_candidate, net_low)
+                high, net_high = np.where(above, candidate, high), np.where(above, net_candidate, net_high)
+
+            lower[active], upper[active] = low, high
+            net_lower[active], net_upper[active] = net_low, net_high
+
+            active = active[(high - low) > tolerance]
+
+        instrumentation.count("calculate_pretax_income.incomes", targets.size)
+
+        income_pretax[finite] = (lower + upper) / 2
+        income_pretax = income_pretax.reshape(income_net_array.shape)
+
+        if income_pretax.ndim == 0:
+            return float(income_pretax)
+
+        return income_pretax
+
+    @staticmethod
+    def print_results_income_tax(income:float, tax_schedule: TaxSchedule | int = 2025) -> None:
         """
         Print the results of the income tax calculation for a given annual income.
 
@@ -320,140 +783,317 @@ class TaxCalculator:
 
         params:
             income: float, annual income in EUR
+            tax_schedule: TaxSchedule or int, tax schedule or its year
         """
 
 
-        tax = TaxCalculator.calculate_german_income_tax(income)
+        tax = TaxCalculator.calculate_german_income_tax(income, tax_schedule)
         average_tax = tax / income
         print(f"Monthly income: {income} €. Absolute Tax to pay: {tax} €. Average tax rate: {average_tax*100:.2f}%")
 
     @staticmethod
-    def validate_output_income_tax() -> None:
+    def validate_output_income_tax(tax_schedule: TaxSchedule | int = 2025) -> None:
         """
         Validate the output of the income tax calculation for different annual incomes by comparing it to the expected average tax rate.
 
         Comparison values taken from:
             https://upload.wikimedia.org/wikipedia/commons/thumb/a/a2/ESt_D_Splittingtarif_2022_zvE_bis_150000.svg/2880px-ESt_D_Splittingtarif_2022_zvE_bis_150000.svg.png
+
+        params:
+            tax_schedule: TaxSchedule or int, tax schedule or its year, use 2022 to compare with the values above
         """
 
-        TaxCalculator.print_results_income_tax(10e3) # For 2022 expected average tax rate: 0 %
-        TaxCalculator.print_results_income_tax(20e3) # For 2022 expected aexiverage tax rate: 11 %
-        TaxCalculator.print_results_income_tax(50e3) # For 2022 expected average tax rate: 23 %
-        TaxCalculator.print_results_income_tax(80e3) # For 2022 expected average tax rate: 28 %
-        TaxCalculator.print_results_income_tax(100e3) # For 2022 expected average tax rate: 32 %
-        TaxCalculator.print_results_income_tax(200e3) # For 2022 expected average tax rate: 37 %
+        TaxCalculator.print_results_income_tax(10e3, tax_schedule) # For 2022 expected average tax rate: 0 %
+        TaxCalculator.print_results_income_tax(20e3, tax_schedule) # For 2022 expected aexiverage tax rate: 11 %
+        TaxCalculator.print_results_income_tax(50e3, tax_schedule) # For 2022 expected average tax rate: 23 %
+        TaxCalculator.print_results_income_tax(80e3, tax_schedule) # For 2022 expected average tax rate: 28 %
+        TaxCalculator.print_results_income_tax(100e3, tax_schedule) # For 2022 expected average tax rate: 32 %
+        TaxCalculator.print_results_income_tax(200e3, tax_schedule) # For 2022 expected average tax rate: 37 %
 
     @staticmethod
-    def print_results_social_security_tax(income:float) -> None:
+    def print_results_social_security_tax(income:float, tax_schedule: TaxSchedule | int = 2025) -> None:
         """
         Prints the results of the social security tax calculation for a given annual income.
 
         Used to validate manually the tax calculation.
         """
-        tax = TaxCalculator.calculate_german_social_security_tax(income)
+        tax = TaxCalculator.calculate_german_social_security_tax(income, tax_schedule)
         average_tax = tax / income
         print(f"Monthly income: {income} €. Absolute Tax to pay: {tax} €. Average tax rate: {average_tax*100:.2f}%")
 
-    def validate_output_social_security_tax() -> None:
+    def validate_output_social_security_tax(tax_schedule: TaxSchedule | int = 2025) -> None:
         """
         Validate the output of the social security tax calculation for different annual incomes by comparing it to the expected average tax rate.
+
+        params:
+            tax_schedule: TaxSchedule or int, tax schedule or its year
         """
 
-        TaxCalculator.print_results_social_security_tax(10e3) # For 2022 expected average tax rate: 0 %
-        TaxCalculator.print_results_social_security_tax(20e3) # For 2022 expected average tax rate: 19.7 %
-        TaxCalculator.print_results_social_security_tax(50e3) # For 2022 expected average tax rate: 19.7 %
-        TaxCalculator.print_results_social_security_tax(80e3) # For 2022 expected average tax rate: < 19.7 %
-        TaxCalculator.print_results_social_security_tax(100e3) # For 2022 expected average tax rate: < 19.7 %
+        TaxCalculator.print_results_social_security_tax(10e3, tax_schedule) # For 2022 expected average tax rate: 0 %
+        TaxCalculator.print_results_social_security_tax(20e3, tax_schedule) # For 2022 expected average tax rate: 19.7 %
+        TaxCalculator.print_results_social_security_tax(50e3, tax_schedule) # For 2022 expected average tax rate: 19.7 %
+        TaxCalculator.print_results_social_security_tax(80e3, tax_schedule) # For 2022 expected average tax rate: < 19.7 %
+        TaxCalculator.print_results_social_security_tax(100e3, tax_schedule) # For 2022 expected average tax rate: < 19.7 %
 
-    def calculcate_post_tax_income(income: float) -> float:
+    def calculcate_post_tax_income(income: float | np.ndarray, tax_schedule: TaxSchedule | int = 2025) -> float | np.ndarray:
         """
         Calculate the post tax income for a given annual income.
 
+        The income can either be a single value or a numpy array of any shape.
+
         params:
-            income: float, annual income in EUR
+            income: float or np.ndarray, annual income in EUR
+            tax_schedule: TaxSchedule or int, tax schedule or its year
         returns:
-            post_tax_income: float, annual post tax income in EUR
+            post_tax_income: float or np.ndarray (same shape as income), annual post tax income in EUR
         """
 
-        return income - TaxCalculator.calculate_german_income_tax(income) - TaxCalculator.calculate_german_social_security_tax(income)
+        if np.ndim(income) > 0:
+            income = np.asarray(income, dtype=float)
+
+        tax_schedule = get_tax_schedule(tax_schedule)
+
+        return income - TaxCalculator.calculate_german_income_tax(income, tax_schedule) - TaxCalculator.calculate_german_social_security_tax(income, tax_schedule)
 
 
 
-def calculate_compound_capital_growth(annual_capital_increase_capital: float, interest_rate:float, years: int, monthly_investment: bool) -> float:
+def get_weighted_years_percentile(years: np.ndarray, weights: np.ndarray, percentile: float) -> np.ndarray:
+    """
+    Get a population-weighted percentile of the years to reach sufficient capital over the income brackets.
+
+    params:
+        years: np.ndarray, years per income bracket, the last axis are the income brackets
+        weights: np.ndarray, weight (population share) of every income bracket
+        percentile: float, percentile in percent, e.g. 50 for the median
+
+    returns:
+        years: np.ndarray, smallest number of years that at least the given percentage of the population needs, with the shape of years
+            without the last axis
+    """
+
+    order = np.argsort(years, axis=-1, kind="stable")
+    sorted_years = np.take_along_axis(years, order, axis=-1)
+    cumulative_weights = np.cumsum(np.asarray(weights, dtype=float)[order], axis=-1)
+
+    index = np.argmax(cumulative_weights >= cumulative_weights[..., -1:] * percentile / 100, axis=-1)
+
+    return np.take_along_axis(sorted_years, index[..., None], axis=-1)[..., 0]
+
+
+def calculate_annuity_factor(interest_rate: float | np.ndarray, years: float | np.ndarray) -> float | np.ndarray:
+    """
+    Calculate the future value of a constant annual payment of 1 EUR after the given number of years, i.e. ((1+r)^n - 1) / r.
+
+    Works for scalars and broadcastable numpy arrays and falls back to n for an interest rate of zero.
+
+    params:
+        interest_rate: float or np.ndarray, annual interest rate (e.g. 20% would be 0.2)
+        years: float or np.ndarray, number of annual payments
+
+    returns:
+        annuity_factor: float or np.ndarray, future value per 1 EUR of annual payment
+    """
+
+    interest_rate = np.asarray(interest_rate, dtype=float)
+    years = np.asarray(years, dtype=float)
+
+    growth = np.expm1(years * np.log1p(interest_rate))
+    safe_interest_rate = np.where(interest_rate == 0, 1.0, interest_rate)
+
+    return np.where(interest_rate == 0, years, growth / safe_interest_rate)
+
+
+def calculate_compound_capital_growth(annual_capital_increase_capital: float | np.ndarray, interest_rate: float | np.ndarray, years: int | np.ndarray,
+                                      monthly_investment: bool | np.ndarray, return_trajectory: bool = False) -> float | np.ndarray:
     """
     Calculate the compound growth of a capital over the given number of years.
 
+    The capital is computed in closed form with the annuity factor, e.g. with monthly investments the capital after n years is
+    annual_capital_increase_capital / 12 * ((1 + r/12)^(12 n) - 1) / (r/12). All parameters can be numpy arrays that are broadcast against each other.
+
     params:
-        annual_capita_increase_capital: float, initial capital in EUR
-        interest_rate: float, annual interest rate in percent
-        years: float, number of years to calculate the compound
-        monthly_investment: bool, if True, monthly investment is considered, otherwise only the annual capital increase is considered
-    """
-    total_capital = 0
-    monthly_income = annual_capital_increase_capital / 12
-
-    for _ in range(years):
-        if monthly_investment:
-            for _ in range(12):
-                total_capital = total_capital * (1 + interest_rate / 12) + monthly_income
-        else:
-            total_capital = total_capital * (1 + interest_rate) + annual_capital_increase_capital
+        annual_capita_increase_capital: float or np.ndarray, initial capital in EUR
+        interest_rate: float or np.ndarray, annual interest rate in percent
+        years: int or np.ndarray, number of years to calculate the compound
+        monthly_investment: bool or np.ndarray, if True, monthly investment is considered, otherwise only the annual capital increase is considered
+        return_trajectory: bool, if True, the capital at the end of every year is returned as well
+
+    returns:
+        total_capital: float or np.ndarray, capital in EUR after the given number of years
+        trajectory: np.ndarray, only if return_trajectory is True, capital in EUR at the end of the years 0 ... max(years) with the shape
+            (broadcast shape of the parameters) + (max(years) + 1,). The entries after the number of years of an element are nan.
+    """
+
+    annual_capital_increase_capital, interest_rate, years, monthly_investment = np.broadcast_arrays(
+        np.asarray(annual_capital_increase_capital, dtype=float), np.asarray(interest_rate, dtype=float),
+        np.maximum(np.asarray(years, dtype=int), 0), np.asarray(monthly_investment, dtype=bool))
+
+    total_capital = _calculate_future_value(annual_capital_increase_capital, interest_rate, years, monthly_investment)
+
+    if total_capital.ndim == 0:
+        total_capital = float(total_capital)
+
+    if not return_trajectory:
+        return total_capital
+
+    elapsed_years = np.arange(np.max(years, initial=0) + 1)
+    trajectory = _calculate_future_value(annual_capital_increase_capital[..., None], interest_rate[..., None], elapsed_years, monthly_investment[..., None])
+    trajectory = np.where(elapsed_years <= years[..., None], trajectory, np.nan)
 
-    return total_capital
+    return total_capital, trajectory
 
 
-def calculate_number_of_years(interest_rate_annual: float, interest_rate_low_risk: float, annual_income: float, annual_income_cap: float, income_support: float = 0.0) -> float: 
+def _calculate_future_value(annual_capital_increase_capital: np.ndarray, interest_rate: np.ndarray, years: np.ndarray, monthly_investment: np.ndarray) -> np.ndarray:
+    monthly_capital = annual_capital_increase_capital / 12 * calculate_annuity_factor(interest_rate / 12, 12 * years)
+    annual_capital = annual_capital_increase_capital * calculate_annuity_factor(interest_rate, years)
+
+    return np.where(monthly_investment, monthly_capital, annual_capital)
+
+
+@instrumentation.staged
+def calculate_number_of_years_batched(interest_rate_annual: float | np.ndarray, interest_rate_low_risk: float | np.ndarray, annual_income: float | np.ndarray,
+                                      annual_income_cap: float | np.ndarray, income_support: float | np.ndarray = 0.0, max_years: int = 100,
+                                      tax_schedule: TaxSchedule | int = 2025, whole_years: bool = True) -> tuple:
+    """
+    Calculate the number of years to reach a sufficient capital for a whole grid of scenarios in one array operation.
+
+    All parameters are broadcast against each other, e.g. interest_rate_annual[:, None] together with annual_income[None, :] and
+    income_support[None, :] gives a (interest rates x incomes) grid. Instead of stepping the capital forward year by year the
+    annuity formula is inverted analytically:
+
+        years = ceil( log(1 + total_required_capital * r / annual_payment) / log(1 + r) )
+
+    The integer year semantics of the original loop are kept, including the ceiling: once more than max_years are needed
+    max_years + 1 is returned.
+
+    params:
+        interest_rate_annual: float or np.ndarray, annual interest rate for the capital growth phase (e.g. 20% would be 0.2)
+        interest_rate_low_risk: float or np.ndarray, annual interest rate for the time when the capital serves as passive income
+        annual_income: float or np.ndarray, annual income in EUR
+        annual_income_cap: float or np.ndarray, annual income in EUR that would represent "the maximum income needed" even if the current annual income is higher.
+        income_support: float or np.ndarray, annual income support in EUR that is added to the capital on top of the income tax
+        max_years: int, maximum number of years that are considered
+        tax_schedule: TaxSchedule or int, tax schedule or its year, can be a stacked schedule that is broadcast against the other parameters
+        whole_years: bool, if False, the years are not rounded up to whole years, e.g. for sensitivities that should not jump between years
+
+    returns:
+        years: np.ndarray, number of years to reach the required capital (float if whole_years is False)
+        total_required_capital: np.ndarray, capital in EUR needed to maintain the (capped) annual net income
+    """
+
+    interest_rate_annual, interest_rate_low_risk, annual_income, annual_income_cap, income_support = np.broadcast_arrays(
+        *[np.asarray(x, dtype=float) for x in (interest_rate_annual, interest_rate_low_risk, annual_income, annual_income_cap, income_support)])
+
+    tax_schedule = get_tax_schedule(tax_schedule)
+
+    instrumentation.count("calculate_number_of_years_batched.scenarios", annual_income.size)
+
+    income_tax = TaxCalculator.calculate_german_income_tax(annual_income, tax_schedule)
+
+    # Incomes above the cap only need the capital to maintain the net income at the cap
+    annual_income_net = TaxCalculator.calculcate_post_tax_income(np.minimum(annual_income, annual_income_cap), tax_schedule)
+    total_required_capital = annual_income_net / interest_rate_low_risk
+
+    annual_payment = income_tax + income_support
+    reachable = annual_payment > 0
+    safe_annual_payment = np.where(reachable, annual_payment, 1.0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        capital_ratio = total_required_capital / safe_annual_payment
+        years_estimate = np.where(interest_rate_annual == 0,
+                                  capital_ratio,
+                                  np.log1p(capital_ratio * interest_rate_annual) / np.log1p(interest_rate_annual))
+
+    years_estimate = np.where(reachable & np.isfinite(years_estimate), years_estimate, max_years + 1)
+
+    if not whole_years:
+        return np.where(total_required_capital <= 0, 0.0, np.clip(years_estimate, 0, max_years + 1)), total_required_capital
+
+    years = np.ceil(np.clip(years_estimate, 0, max_years + 1))
+
+    # Guard the ceiling against rounding errors of the logarithm at exact integer boundaries
+    years = np.where((years > 0) & (annual_payment * calculate_annuity_factor(interest_rate_annual, years - 1) >= total_required_capital), years - 1, years)
+    years = np.where((years <= max_years) & (annual_payment * calculate_annuity_factor(interest_rate_annual, years) < total_required_capital), years + 1, years)
+
+    years = np.where(total_required_capital <= 0, 0, years)
+
+    return years.astype(int), total_required_capital
+
+
+def calculate_number_of_years(interest_rate_annual: float, interest_rate_low_risk: float, annual_income: float, annual_income_cap: float, income_support: float = 0.0,
+                              tax_schedule: TaxSchedule | int = 2025) -> float: 
     """
     Calculate the number of years to reach a sufficient capital to maintain annual net income from capital income.
 
+    This is the single value version of calculate_number_of_years_batched.
+
     params:
         interest_rate_annual: float, annual interest rate for the capital growth phase (e.g. 20% would be 0.2)
         interest_rate_low_risk: float, annual interest rate for the time when the capital serves as passive income  
         annual_income: float, annual income in EUR
         annual_income_cap: float, annual income in EUR that would represent "the maximum income needed" even if the current annual income is higher.
+        tax_schedule: TaxSchedule or int, tax schedule or its year
     """
 
-    years = 0 
-    total_capital = 0
+    years, total_required_capital = calculate_number_of_years_batched(interest_rate_annual, interest_rate_low_risk, annual_income, annual_income_cap, income_support,
+                                                                      tax_schedule=tax_schedule)
+    years, total_required_capital = int(years), float(total_required_capital)
 
-    income_tax = TaxCalculator.calculate_german_income_tax(annual_income)
-    social_security_tax = TaxCalculator.calculate_german_social_security_tax(annual_income)
-    annual_income_net = annual_income - income_tax - social_security_tax
+    instrumentation.sample("calculate_number_of_years", lambda: (annual_income, income_support, total_required_capital, years))
+
+    return years, total_required_capital
 
-    total_required_capital = annual_income_net / interest_rate_low_risk
 
-    if annual_income >= annual_income_cap:
-        income_tax_cap = TaxCalculator.calculate_german_income_tax(annual_income_cap)
-        social_security_tax_cap = TaxCalculator.calculate_german_social_security_tax(annual_income_cap)
+@dataclass(frozen=True, slots=True, eq=False)
+class ScenarioResult:
+    """
+    Years to reach sufficient capital for all income brackets and interest rates of a single scenario, see calculate_years_to_reach_capital.
 
-        annual_income_net = annual_income_cap - income_tax_cap - social_security_tax_cap
+    It only contains the computed values, the figures are rendered from it in figures.py.
+    """
 
-        total_required_capital = annual_income_net / interest_rate_low_risk
+    annual_incomes: np.ndarray
+    interest_rates: np.ndarray
 
-    while total_capital < total_required_capital:
-        total_capital = total_capital * (1 + interest_rate_annual) + income_tax + income_support
-        years += 1
+    # Shape (interest rates, income brackets)
+    years_to_reach_capital: np.ndarray
+    years_to_reach_capital_no_support: np.ndarray
 
-        if years > 100:
-            break
+    income_support: np.ndarray
+    accumulated_support_difference: float
 
-    logging.debug("Annual income: " + str(annual_income))
-    logging.debug("Annual income net: " + str(annual_income_net))
-    logging.debug("Income tax: " + str(income_tax))
-    logging.debug("Income support: " + str(income_support))
-    logging.debug("Total required capital: " + str(total_required_capital))
-    logging.debug("Total capital: " + str(total_capital))
-    logging.debug(" Years: " + str(years))
+    interest_rate_low_risk: float
+    annual_income_cap: float
+    number_of_citizens: float
+    economy_subsidy: float
+    tax_schedule: TaxSchedule
 
-    return years, total_required_capital
+    def get_figure_name(self, suffix: str = "") -> str:
+        """
+        Get the file name of the figure of the scenario, e.g. growthtime_estimations_cap_100k_subsidy_300b.png.
 
+        params:
+            suffix: str, appended to the name before the file extension, e.g. "_tm" for the toy model
 
-def create_plot_for_income_and_interest_rate(income_distribution: list, interest_rate_low_risk: float = 0.05, interest_rates: list = [0.03, 0.07, 0.14, 0.2],
-                                             annual_income_cap: float = 500e3, 
-                                             number_of_citizens: float = 1, economy_subsidy:float = 0, 
-                                             save_plot_to_disk: bool = False) -> None:
+        returns:
+            figure_name: str, file name of the figure
+        """
+
+        if self.annual_income_cap > max(self.annual_incomes):
+            return "growthtime_estimations_nocap" + suffix + ".png"
+
+        tag = "_redistributed" if self.income_support[-1] > 0 else ""
+        tag = tag + "_subsidy_" + str(int(self.economy_subsidy/1e9)) + "b" if self.economy_subsidy > 0 else tag
+
+        return "growthtime_estimations_cap_" + str(int(self.annual_income_cap/1e3)) + "k" + tag + suffix + ".png"
+
+
+@instrumentation.staged
+def calculate_years_to_reach_capital(income_distribution: BinnedIncomeDistribution | list, interest_rate_low_risk: float = 0.05, interest_rates: list = [0.03, 0.07, 0.14, 0.2],
+                                     annual_income_cap: float = 500e3, number_of_citizens: float = 1, economy_subsidy: float = 0,
+                                     tax_schedule: TaxSchedule | int = 2025, cache: "result_cache.ResultCache" = None) -> ScenarioResult:
     """
-    Create a plot to show the number of years to reach a sufficient capital for different annual incomes and interest rates.
+    Calculate the number of years to reach a sufficient capital for different annual incomes and interest rates, with and without income support.
 
     Depending on the parameters, either redistribution effects (if the annual_income_cap is lower than the maximum annual income in the income distribution) are considered
     and additional income support through the use of profits from the economy (through the economy_subsidy parameter) are be considered.
@@ -461,7 +1101,7 @@ def create_plot_for_income_and_interest_rate(income_distribution: list, interest
     They are added as an income support for capital build-up for the income brackets below the annual_income_cap.
 
     params:
-        income_distribution: list, list of annual income values and their probabilities
+        income_distribution: BinnedIncomeDistribution or list, list of annual income values and their probabilities
         interest_rate_low_risk: float, assumed annual interest rate for the time when the capital serves as passive income
         interest_rates: list of assumed annual interest rates for the capital growth phase
 
@@ -470,151 +1110,315 @@ def create_plot_for_income_and_interest_rate(income_distribution: list, interest
         number_of_citizens: float, number of citizens in the country - used to compute the additional income subsidy through profits of the companies in a country.
         economy_subsidy: float, additional income subsidy through economic profits in EUR
 
-        save_plot_to_disk: bool, if True, the plot is saved to the disk
-    """     
+        tax_schedule: TaxSchedule or int, tax schedule or its year
+        cache: result_cache.ResultCache, if given, the arrays of the scenario are taken from or stored in the cache
 
+    returns:
+        result: ScenarioResult, years to reach sufficient capital of the scenario
+    """
 
     IncomeDistribution.check_sum_probability(income_distribution)
-   
-    income_support_per_income_bracket,_ = calculate_income_support(income_distribution, annual_income_cap, number_of_citizens, economy_subsidy)
 
-    logging.debug("Annual income cap: " + str(annual_income_cap))
-    logging.debug("Income distribution:")
-    logging.debug(income_distribution)
-    logging.debug("Income support per income bracket:")
-    logging.debug(income_support_per_income_bracket)
-  
+    parameters = dict(income_distribution=income_distribution, interest_rate_low_risk=interest_rate_low_risk, interest_rates=interest_rates,
+                      annual_income_cap=annual_income_cap, number_of_citizens=number_of_citizens, economy_subsidy=economy_subsidy,
+                      tax_schedule=tax_schedule)
 
-    annual_incomes = [x[0] for x in income_distribution]
-    
-    years_to_reach_capital = []
-    years_to_reach_capital_no_support = []
-    
-    for interest_rate in interest_rates:
-        logging.debug("Running for nterest rate: " + str(interest_rate))
+    if cache is None:
+        arrays = _calculate_scenario_arrays(**parameters)
+    else:
+        arrays = cache.get_or_compute(_calculate_scenario_arrays, **parameters)
 
-        for annual_income, income_support in zip(annual_incomes, income_support_per_income_bracket):
+    return ScenarioResult(annual_incomes=arrays["annual_incomes"], interest_rates=arrays["interest_rates"],
+                          years_to_reach_capital=arrays["years_to_reach_capital"], years_to_reach_capital_no_support=arrays["years_to_reach_capital_no_support"],
+                          income_support=arrays["income_support"], accumulated_support_difference=float(arrays["accumulated_support_difference"]),
+                          interest_rate_low_risk=interest_rate_low_risk, annual_income_cap=annual_income_cap,
+                          number_of_citizens=number_of_citizens, economy_subsidy=economy_subsidy, tax_schedule=get_tax_schedule(tax_schedule))
 
-            years, _ = calculate_number_of_years(interest_rate, interest_rate_low_risk, annual_income, annual_income_cap, income_support)
-            years_to_reach_capital.append(years)
 
-            years_no_support, _ = calculate_number_of_years(interest_rate, interest_rate_low_risk, annual_income, annual_income_cap, 0)
-            years_to_reach_capital_no_support.append(years_no_support)
+def _calculate_scenario_arrays(income_distribution: BinnedIncomeDistribution | list, interest_rate_low_risk: float, interest_rates: list, annual_income_cap: float,
+                               number_of_citizens: float, economy_subsidy: float, tax_schedule: TaxSchedule | int) -> dict:
+    income_support_per_income_bracket, accumulated_support_difference = calculate_income_support(income_distribution, annual_income_cap, number_of_citizens,
+                                                                                                 economy_subsidy, tax_schedule)
 
-            logging.debug(" Annual income: " + str(annual_income) + " - Year reduction with support: " + str(years_no_support - years))
+    instrumentation.sample("calculate_years_to_reach_capital.income_support", income_support_per_income_bracket)
 
-        #line_temp, = plt.plot(annual_incomes, np.array(years_to_reach_capital_no_support).copy(), marker="o")
+    annual_incomes = get_binned_income_distribution(income_distribution).annual_incomes
+    interest_rates = np.asarray(interest_rates, dtype=float)
 
-        line_temp, = plt.plot(annual_incomes, np.array(years_to_reach_capital_no_support).copy(), marker="o", alpha=0.5, linestyle="-.")
-        plt.plot(annual_incomes, np.array(years_to_reach_capital).copy(), marker="x", color = line_temp.get_color())
-        
-        years_to_reach_capital = []
-        years_to_reach_capital_no_support = []
+    # Grid of (with support / without support) x interest rates x income brackets
+    income_support_grid = np.stack([np.asarray(income_support_per_income_bracket, dtype=float), np.zeros(len(annual_incomes))])
+    years_grid, _ = calculate_number_of_years_batched(interest_rates[None, :, None], interest_rate_low_risk,
+                                                      annual_incomes[None, None, :], annual_income_cap, income_support_grid[:, None, :],
+                                                      tax_schedule=tax_schedule)
 
-    legend = []
+    instrumentation.sample("calculate_years_to_reach_capital.year_reduction", lambda: years_grid[1] - years_grid[0])
 
-    for interest_rate in interest_rates:
-        legend.append(interest_rate)
-        legend.append(interest_rate)
+    return {"annual_incomes": annual_incomes,
+            "interest_rates": interest_rates,
+            "years_to_reach_capital": years_grid[0],
+            "years_to_reach_capital_no_support": years_grid[1],
+            "income_support": income_support_per_income_bracket,
+            "accumulated_support_difference": accumulated_support_difference}
 
 
-    plt.legend([f"Annual return rate: {interest_rate*100:.1f} %" for interest_rate in legend])
-    
-    plt.xlabel("Annual Income in EUR")
-    plt.gca().get_xaxis().set_major_formatter(plt.FuncFormatter(lambda x, loc: "{:,}".format(int(x))))
-    plt.ylabel("Years to reach sufficient capital")
-    
-    plt.grid()
-    
-    if save_plot_to_disk:
-        if annual_income_cap > max(annual_incomes):
-            plt.savefig("growthtime_estimations_nocap.png")
-        else:
-            tag = "_redistributed" if income_support > 0 else ""
-            tag = tag + "_subsidy_" + str(int(economy_subsidy/1e9)) + "b" if economy_subsidy > 0 else tag
-            plt.savefig("growthtime_estimations_cap_" + str(int(annual_income_cap/1e3)) + "k" + str(tag)+".png")
+def create_plot_for_income_and_interest_rate(income_distribution: BinnedIncomeDistribution | list, interest_rate_low_risk: float = 0.05, interest_rates: list = [0.03, 0.07, 0.14, 0.2],
+                                             annual_income_cap: float = 500e3, 
+                                             number_of_citizens: float = 1, economy_subsidy:float = 0, 
+                                             save_plot_to_disk: bool = False, tax_schedule: TaxSchedule | int = 2025) -> None:
+    """
+    Create an interactive plot to show the number of years to reach a sufficient capital for different annual incomes and interest rates.
+
+    The values are computed with calculate_years_to_reach_capital and drawn with figures.render_years_to_reach_capital. To create figures
+    without showing them, e.g. for a whole sweep on a server, use figures.render_sweep_figures instead.
+
+    params:
+        income_distribution: BinnedIncomeDistribution or list, list of annual income values and their probabilities
+        interest_rate_low_risk: float, assumed annual interest rate for the time when the capital serves as passive income
+        interest_rates: list of assumed annual interest rates for the capital growth phase
+
+        annual_income_cap: float, annual income in EUR that would represent "the maximum income needed" even if the current annual income is higher. 
+
+        number_of_citizens: float, number of citizens in the country - used to compute the additional income subsidy through profits of the companies in a country.
+        economy_subsidy: float, additional income subsidy through economic profits in EUR
+
+        save_plot_to_disk: bool, if True, the plot is saved to the disk
+        tax_schedule: TaxSchedule or int, tax schedule or its year
+    """     
+
+    import matplotlib.pyplot as plt
+    from figures import render_years_to_reach_capital
+
+    result = calculate_years_to_reach_capital(income_distribution, interest_rate_low_risk, interest_rates, annual_income_cap,
+                                              number_of_citizens, economy_subsidy, tax_schedule)
+
+    with instrumentation.stage("render"):
+        figure = render_years_to_reach_capital(result, plt.figure())
+
+        if save_plot_to_disk:
+            figure.savefig(result.get_figure_name())
 
     plt.show()
 
 
-def calculate_income_support(income_distribution: list, annual_income_cap: float, number_of_citizens: float = 1, economy_subsidy: float = 0) -> list:
+@instrumentation.staged
+def calculate_income_support_batched(income_distribution: BinnedIncomeDistribution | list, annual_income_caps: float | np.ndarray, number_of_citizens: float = 1,
+                                     economy_subsidies: float | np.ndarray = 0, tax_schedule: TaxSchedule | int = 2025) -> tuple:
     """
-    This function calculates the income support for each income bracket below the annual income cap.
+    Batched version of calculate_income_support for many annual income caps and economy subsidies at once.
 
-    The support is based on two components:
-        1. Support from the redistribution of the total income tax difference above the income tax at the annual income cap.
-        In this case the annual support is distributed to the income brackets below the annual income cap according their occurence in the income distribution.
-        2. Support from the economy through profits of the companies in the country. It is only distributed to people below the annual income cap.
-        This support is distributed also according to the occurence of the income brackets in the income distribution.
+    The distribution is sorted by income once and the income taxes are computed once. With the cumulative sums of the probabilities
+    and of the probability weighted income taxes, the accumulated tax differences below and above every cap follow from a binary search,
+    i.e. without walking over the distribution again for every cap.
+
+    If no income bracket is below a cap, the support of the brackets at or below that cap is not defined and set to nan.
 
     params:
-        income_distribution: list, list of annual income values and their probabilities
-        annual_income_cap: float, annual income in EUR that would represent "the maximum income needed" even if the current annual income is higher.
+        income_distribution: BinnedIncomeDistribution or list, list of annual income values and their probabilities
+        annual_income_caps: float or np.ndarray, 1D array of annual income caps in EUR
         number_of_citizens: float, number of citizens in the country - used to compute the additional income subsidy through profits of the companies in a country.
-        economy_subsidy: float, additional income subsidy through economic profits in EUR
+        economy_subsidies: float or np.ndarray, 1D array of additional income subsidies through economic profits in EUR
+        tax_schedule: TaxSchedule or int, tax schedule or its year
 
     returns:
-        support_per_income_bracket: list, list of income support for each income bracket below the annual income cap
-        accumulated_support_difference: float, accumulated income tax difference above the annual income cap
+        support_per_income_bracket: np.ndarray, income support with the shape (caps, subsidies, income brackets)
+        accumulated_support_difference: np.ndarray, accumulated income tax difference above each annual income cap with the shape (caps,)
     """
 
-    support_per_income_bracket = np.zeros((len(income_distribution)))
+    annual_income_caps = np.atleast_1d(np.asarray(annual_income_caps, dtype=float))
+    economy_subsidies = np.atleast_1d(np.asarray(economy_subsidies, dtype=float))
 
+    sorted_income_taxes = sort_income_taxes(income_distribution, tax_schedule)
+    taxes_at_caps = accumulate_income_taxes_at_caps(sorted_income_taxes, annual_income_caps, tax_schedule)
+    support_per_income_bracket = distribute_income_support(sorted_income_taxes, taxes_at_caps, number_of_citizens, economy_subsidies)
 
-    accumulated_income_tax_under_cap = 0
-    accumulated_income_tax_over_cap = 0
+    accumulated_support_difference = taxes_at_caps["accumulated_support_difference"]
 
-    total_percentage_below_income_cap = 0
-    
-    for i in range(len(income_distribution)):
-        annual_income, percentage = income_distribution[i]
-  
+    return support_per_income_bracket, accumulated_support_difference
 
-        if annual_income < annual_income_cap:
-            income_tax = TaxCalculator.calculate_german_income_tax(annual_income)
-            income_tax_at_cap = TaxCalculator.calculate_german_income_tax(annual_income_cap)
 
-            income_tax_deviation_from_cap = income_tax_at_cap - income_tax
-            accumulated_income_tax_under_cap += income_tax_deviation_from_cap * percentage
-            total_percentage_below_income_cap += percentage
+def calculate_income_support_stacked(annual_incomes: np.ndarray, weights: np.ndarray, annual_income_caps: float | np.ndarray, number_of_citizens: float | np.ndarray = 1,
+                                     economy_subsidies: float | np.ndarray = 0, tax_schedule: TaxSchedule | int = 2025) -> tuple:
+    """
+    Version of calculate_income_support with its own incomes, cap, subsidy and (stacked) tax schedule per row, e.g. one row per year of a
+    cohort simulation or per parameter sample of a sensitivity analysis.
 
-        if annual_income >= annual_income_cap:
+    As in calculate_income_support_batched, the support of the brackets at or below a cap without any income bracket below it is nan.
+
+    The income brackets are the last axis. The sums over the brackets are masked sums instead of the prefix sums of
+    calculate_income_support_batched, since the incomes and the tax schedule can differ between the rows.
+
+    params:
+        annual_incomes: np.ndarray, annual incomes in EUR with the shape (rows..., income brackets)
+        weights: np.ndarray, probabilities of the income brackets, broadcast against annual_incomes
+        annual_income_caps: float or np.ndarray, annual income caps in EUR with the shape (rows..., 1)
+        number_of_citizens: float or np.ndarray, number of citizens in the country with the shape (rows..., 1)
+        economy_subsidies: float or np.ndarray, additional income subsidies through economic profits in EUR with the shape (rows..., 1)
+        tax_schedule: TaxSchedule or int, tax schedule or its year, can be a stacked schedule with the shape (rows..., 1) of its parameters
+
+    returns:
+        support_per_income_bracket: np.ndarray, income support with the broadcast shape of the parameters
+        accumulated_support_difference: np.ndarray, accumulated income tax difference above the cap with the shape (rows...)
+    """
 
-            
-            income_tax = TaxCalculator.calculate_german_income_tax(annual_income)
-            income_tax_at_cap = TaxCalculator.calculate_german_income_tax(annual_income_cap)
+    annual_income_caps = np.asarray(annual_income_caps, dtype=float)
 
-            logging.debug(f"Annual income: {annual_income}")
-            logging.debug(f"Income tax: {income_tax}")
-            logging.debug("Income tax at cap:" + str(income_tax_at_cap))
+    income_taxes = TaxCalculator.calculate_german_income_tax(annual_incomes, tax_schedule)
+    income_taxes_at_cap = TaxCalculator.calculate_german_income_tax(annual_income_caps, tax_schedule)
 
-            income_tax_deviation_from_cap = income_tax_at_cap - income_tax
-            accumulated_income_tax_over_cap += income_tax_deviation_from_cap * percentage
+    below_cap = annual_incomes < annual_income_caps
+    total_percentage_below_income_cap = np.sum(weights * below_cap, axis=-1, keepdims=True)
 
-            support_per_income_bracket[i] = income_tax_deviation_from_cap
+    accumulated_income_tax_under_cap = np.sum(weights * below_cap * (income_taxes_at_cap - income_taxes), axis=-1, keepdims=True)
+    accumulated_income_tax_over_cap = np.sum(weights * ~below_cap * (income_taxes_at_cap - income_taxes), axis=-1, keepdims=True)
 
-            logging.debug("Support per income bracked: " +str(support_per_income_bracket[i]))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Without brackets below the cap the support is not defined, also with a subsidy (which would be divided by zero citizens)
+        support_per_citizen_below_cap = np.where(total_percentage_below_income_cap > 0,
+                                                 np.abs(accumulated_income_tax_over_cap)
+                                                 + economy_subsidies / (number_of_citizens * total_percentage_below_income_cap), np.nan)
+        support_per_income_bracket = np.where(annual_incomes <= annual_income_caps,
+                                              support_per_citizen_below_cap * weights / total_percentage_below_income_cap,
+                                              income_taxes_at_cap - income_taxes)
 
     accumulated_support_difference = accumulated_income_tax_under_cap - np.abs(accumulated_income_tax_over_cap)
-    
+
+    return support_per_income_bracket, accumulated_support_difference[..., 0]
+
+
+def sort_income_taxes(income_distribution: BinnedIncomeDistribution | list, tax_schedule: TaxSchedule | int = 2025) -> dict:
+    """
+    Sort the income brackets by income and compute their income taxes and prefix sums, the first step of calculate_income_support_batched.
+
+    The result only depends on the distribution and the tax schedule, so it can be kept and reused for any caps and subsidies
+    (see accumulate_income_taxes_at_caps and distribute_income_support).
+
+    params:
+        income_distribution: BinnedIncomeDistribution or list, list of annual income values and their probabilities
+        tax_schedule: TaxSchedule or int, tax schedule or its year
+
+    returns:
+        sorted_income_taxes: dict, with the sort order, the sorted annual incomes, percentages and income taxes and the prefix sums (with
+            a leading zero, so that index k holds the sum over the k lowest income brackets) of the percentages and of the percentage
+            weighted income taxes
+    """
+
+    distribution = get_binned_income_distribution(income_distribution)
+    order = np.argsort(distribution.annual_incomes, kind="stable")
+    annual_incomes, percentages = distribution.annual_incomes[order], distribution.weights[order]
+
+    income_taxes = TaxCalculator.calculate_german_income_tax(annual_incomes, tax_schedule)
+
+    return {"order": order, "annual_incomes": annual_incomes, "percentages": percentages, "income_taxes": income_taxes,
+            "cumulative_percentage": np.concatenate([[0.0], np.cumsum(percentages)]),
+            "cumulative_weighted_income_tax": np.concatenate([[0.0], np.cumsum(percentages * income_taxes)])}
+
+
+def accumulate_income_taxes_at_caps(sorted_income_taxes: dict, annual_income_caps: np.ndarray, tax_schedule: TaxSchedule | int = 2025) -> dict:
+    """
+    Accumulate the income tax differences below and above every cap with a binary search on the sorted brackets.
+
+    params:
+        sorted_income_taxes: dict, as returned by sort_income_taxes
+        annual_income_caps: np.ndarray, 1D array of annual income caps in EUR
+        tax_schedule: TaxSchedule or int, tax schedule or its year, the one of sort_income_taxes
+
+    returns:
+        taxes_at_caps: dict, with the caps, the income taxes at the caps, the percentages below the caps, the accumulated income tax
+            differences above the caps and the accumulated support differences, each with the shape (caps,)
+    """
+
+    cumulative_percentage = sorted_income_taxes["cumulative_percentage"]
+    cumulative_weighted_income_tax = sorted_income_taxes["cumulative_weighted_income_tax"]
+
+    income_taxes_at_cap = TaxCalculator.calculate_german_income_tax(annual_income_caps, tax_schedule)
+
+    number_below_cap = np.searchsorted(sorted_income_taxes["annual_incomes"], annual_income_caps, side="left")
+
+    total_percentage_below_income_cap = cumulative_percentage[number_below_cap]
+    weighted_income_tax_below_cap = cumulative_weighted_income_tax[number_below_cap]
+
+    accumulated_income_tax_under_cap = income_taxes_at_cap * total_percentage_below_income_cap - weighted_income_tax_below_cap
+    accumulated_income_tax_over_cap = (income_taxes_at_cap * (cumulative_percentage[-1] - total_percentage_below_income_cap)
+                                       - (cumulative_weighted_income_tax[-1] - weighted_income_tax_below_cap))
+
+    return {"annual_income_caps": annual_income_caps, "income_taxes_at_cap": income_taxes_at_cap,
+            "total_percentage_below_income_cap": total_percentage_below_income_cap,
+            "accumulated_income_tax_over_cap": accumulated_income_tax_over_cap,
+            "accumulated_support_difference": accumulated_income_tax_under_cap - np.abs(accumulated_income_tax_over_cap)}
+
+
+def distribute_income_support(sorted_income_taxes: dict, taxes_at_caps: dict, number_of_citizens: float, economy_subsidies: np.ndarray) -> np.ndarray:
+    """
+    Distribute the income support of every cap and subsidy to the income brackets, see calculate_income_support.
+
+    params:
+        sorted_income_taxes: dict, as returned by sort_income_taxes
+        taxes_at_caps: dict, as returned by accumulate_income_taxes_at_caps
+        number_of_citizens: float, number of citizens in the country
+        economy_subsidies: np.ndarray, 1D array of additional income subsidies through economic profits in EUR
+
+    returns:
+        support_per_income_bracket: np.ndarray, income support with the shape (caps, subsidies, income brackets) in the original order of
+            the brackets
+    """
+
+    annual_incomes, percentages, income_taxes = (sorted_income_taxes["annual_incomes"], sorted_income_taxes["percentages"],
+                                                 sorted_income_taxes["income_taxes"])
+    annual_income_caps, income_taxes_at_cap = taxes_at_caps["annual_income_caps"], taxes_at_caps["income_taxes_at_cap"]
+    total_percentage_below_income_cap = taxes_at_caps["total_percentage_below_income_cap"]
+
     number_of_citizens_below_income_cap = number_of_citizens * total_percentage_below_income_cap
 
-    logging.debug("total percentage below income cap: " + str(total_percentage_below_income_cap))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Without brackets below the cap the support is not defined, also with a subsidy (which would be divided by zero citizens)
+        support_per_citizen_below_cap = np.where((total_percentage_below_income_cap > 0)[:, None],
+                                                 np.abs(taxes_at_caps["accumulated_income_tax_over_cap"])[:, None]
+                                                 + economy_subsidies[None, :] / number_of_citizens_below_income_cap[:, None], np.nan)
+        normalized_percentages = percentages[None, :] / total_percentage_below_income_cap[:, None]
 
+    # Brackets above the cap give the difference to the income tax at the cap, all others receive their share of the support
+    at_or_below_cap = annual_incomes[None, :] <= annual_income_caps[:, None]
+    support_sorted = np.where(at_or_below_cap[:, None, :],
+                              support_per_citizen_below_cap[:, :, None] * normalized_percentages[:, None, :],
+                              (income_taxes_at_cap[:, None] - income_taxes[None, :])[:, None, :])
 
-    for i in range(len(income_distribution)):
-        annual_income, percentage = income_distribution[i]
-        
-        logging.debug(f"percentage pre normalization: {percentage}")
-        
-        percentage = percentage / total_percentage_below_income_cap
+    support_per_income_bracket = np.empty_like(support_sorted)
+    support_per_income_bracket[..., sorted_income_taxes["order"]] = support_sorted
 
-        logging.debug(f"percentage post normalization: {percentage}")
-        
-        if annual_income <= annual_income_cap:
-            support_per_income_bracket[i] = (np.abs(accumulated_income_tax_over_cap)+economy_subsidy/number_of_citizens_below_income_cap) * percentage
+    return support_per_income_bracket
 
-    return support_per_income_bracket, accumulated_support_difference
+
+def calculate_income_support(income_distribution: BinnedIncomeDistribution | list, annual_income_cap: float, number_of_citizens: float = 1, economy_subsidy: float = 0,
+                             tax_schedule: TaxSchedule | int = 2025) -> list:
+    """
+    This function calculates the income support for each income bracket below the annual income cap.
+
+    The support is based on two components:
+        1. Support from the redistribution of the total income tax difference above the income tax at the annual income cap.
+        In this case the annual support is distributed to the income brackets below the annual income cap according their occurence in the income distribution.
+        2. Support from the economy through profits of the companies in the country. It is only distributed to people below the annual income cap.
+        This support is distributed also according to the occurence of the income brackets in the income distribution.
+
+    To evaluate many caps or subsidies use calculate_income_support_batched.
+
+    params:
+        income_distribution: BinnedIncomeDistribution or list, list of annual income values and their probabilities
+        annual_income_cap: float, annual income in EUR that would represent "the maximum income needed" even if the current annual income is higher.
+        number_of_citizens: float, number of citizens in the country - used to compute the additional income subsidy through profits of the companies in a country.
+        economy_subsidy: float, additional income subsidy through economic profits in EUR
+        tax_schedule: TaxSchedule or int, tax schedule or its year
+
+    returns:
+        support_per_income_bracket: list, list of income support for each income bracket below the annual income cap
+        accumulated_support_difference: float, accumulated income tax difference above the annual income cap
+    """
+
+    support_per_income_bracket, accumulated_support_difference = calculate_income_support_batched(income_distribution, annual_income_cap,
+                                                                                                  number_of_citizens, economy_subsidy, tax_schedule)
+
+    instrumentation.sample("calculate_income_support.support_per_income_bracket", support_per_income_bracket[0, 0])
+
+    return support_per_income_bracket[0, 0], float(accumulated_support_difference[0])
     
 
 
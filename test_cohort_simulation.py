@@ -0,0 +1,47 @@
+"""
+Tests of the multi-year cohort simulation. Run with: python -m pytest -q
+"""
+
+import numpy as np
+import pytest
+
+from cohort_simulation import simulate_cohort
+from tax_autonomy_estimations import IncomeDistribution, calculate_years_to_reach_capital
+
+
+income_distribution = IncomeDistribution.cutoff_income_distribution(IncomeDistribution.income_distribution_germany_annual_pretax_2025, 20e3)
+interest_rates = [0.03, 0.07, 0.14]
+
+
+@pytest.mark.parametrize("annual_income_cap, economy_subsidy", [(100e3, 0), (100e3, 300e9), (500e3, 300e9)])
+def test_without_growth_equals_static_model(annual_income_cap, economy_subsidy):
+    cohort = simulate_cohort(income_distribution, 0.05, interest_rates, annual_income_cap, 83e6, economy_subsidy, wage_growth=0,
+                             indexation_rate=0, horizon=100)
+    result = calculate_years_to_reach_capital(income_distribution, 0.05, interest_rates, annual_income_cap, 83e6, economy_subsidy)
+
+    # Every year repeats the first one, the horizon of 100 years is the limit of the static model
+    np.testing.assert_allclose(cohort.income_support, np.broadcast_to(result.income_support, cohort.income_support.shape))
+    np.testing.assert_allclose(cohort.incomes, np.broadcast_to(cohort.annual_incomes, cohort.incomes.shape))
+
+    np.testing.assert_array_equal(cohort.years_to_reach_capital, result.years_to_reach_capital)
+    np.testing.assert_array_equal(cohort.years_to_reach_capital_no_support, result.years_to_reach_capital_no_support)
+
+
+def test_capital_accumulates_the_payments_of_the_previous_years():
+    cohort = simulate_cohort(income_distribution, interest_rates=[0.07], annual_income_cap=100e3, number_of_citizens=83e6, economy_subsidy=300e9,
+                             horizon=10)
+    annual_payments = cohort.income_taxes + cohort.income_support
+
+    capital = np.zeros(annual_payments.shape[1])
+    for year in range(11):
+        np.testing.assert_allclose(cohort.capital[0, year], capital)
+        capital = capital * 1.07 + annual_payments[year]
+
+    assert cohort.capital.shape == (1, 11, len(income_distribution))
+
+
+def test_wage_growth_grows_incomes_and_unreached_capital_is_past_the_horizon():
+    cohort = simulate_cohort(income_distribution, interest_rates=[0.0], wage_growth=0.03, indexation_rate=0.02, horizon=5)
+
+    np.testing.assert_allclose(cohort.incomes[5], cohort.annual_incomes * 1.03 ** 5)
+    np.testing.assert_array_equal(cohort.years_to_reach_capital, 6)
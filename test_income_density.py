@@ -0,0 +1,89 @@
+"""
+Tests of the continuous income density and its quadrature. Run with: python -m pytest -q
+"""
+
+import numpy as np
+import pytest
+
+from income_density import IncomeDensity, calculate_accumulated_income_taxes, get_monotone_slopes
+from tax_autonomy_estimations import IncomeDistribution, calculate_income_support_batched
+
+
+income_distribution = IncomeDistribution.income_distribution_germany_annual_pretax_2025
+income_density = IncomeDensity.fit(income_distribution)
+
+
+def test_density_keeps_the_weights_of_the_bins():
+    weights = np.array(income_distribution)[:, 1]
+
+    np.testing.assert_allclose(np.diff(income_density.cdf(income_density.knots)), weights[:-1], atol=1e-12)
+    assert income_density.cdf(1e12) == pytest.approx(income_density.total_weight)
+    assert income_density.total_weight == pytest.approx(weights.sum())
+    assert income_density.cdf(income_density.knots[0] - 1) == 0
+
+    # The cumulative weight never decreases, so the density is non-negative
+    incomes = np.linspace(0, 2 * income_density.tail_start, 100_001)
+    assert np.all(np.diff(income_density.cdf(incomes)) >= -1e-15)
+    assert np.all(income_density.pdf(incomes) >= -1e-15)
+
+
+def test_monotone_slopes_keep_monotone_data_monotone():
+    x = np.array([0.0, 1.0, 1.5, 4.0, 5.0])
+    y = np.array([0.0, 0.1, 0.1, 0.9, 1.0])
+
+    slopes = get_monotone_slopes(x, y)
+
+    assert np.all(slopes >= 0)
+    assert slopes[1] == slopes[2] == 0
+    np.testing.assert_allclose(get_monotone_slopes(x[:2], y[:2]), [0.1, 0.1])
+
+
+def test_integrals_match_closed_forms():
+    weight, weight_error = income_density.integrate(lambda income: np.ones_like(income), tolerance=1e-9)
+    assert weight == pytest.approx(income_density.total_weight, abs=1e-9)
+    assert weight_error < 1e-9
+
+    # The mean income of the tail is tail_start * pareto_alpha / (pareto_alpha - 1)
+    tail_mean, _ = income_density.integrate(lambda income: np.where(income > income_density.tail_start, income, 0.0),
+                                            breakpoints=[income_density.tail_start], tolerance=1e-6)
+    alpha = income_density.pareto_alpha
+    assert tail_mean == pytest.approx(income_density.tail_weight * income_density.tail_start * alpha / (alpha - 1), rel=1e-8)
+
+    # The mean income of the body from the integral of the cumulative weight: int x dF = x F(x) - int F dx
+    incomes = np.linspace(income_density.knots[0], income_density.tail_start, 2_000_001)
+    body_mean = income_density.tail_start * income_density.cumulative_weights[-1] - np.trapezoid(income_density.cdf(incomes), incomes)
+    mean, _ = income_density.integrate(lambda income: income, tolerance=1e-6)
+    assert mean - tail_mean == pytest.approx(body_mean, rel=1e-6)
+
+
+def test_integrate_stacks_the_function_values():
+    scales = np.array([1.0, 2.0, 3.0])
+
+    values, _ = income_density.integrate(lambda income: scales[:, None] * income, tolerance=1e-6)
+    value, _ = income_density.integrate(lambda income: income, tolerance=1e-6)
+
+    assert values.shape == (3,)
+    np.testing.assert_allclose(values, scales * value, rtol=1e-9)
+
+
+def test_accumulated_income_taxes_are_close_to_the_binned_ones():
+    annual_income_caps = np.array([50e3, 100e3, 150e3])
+
+    taxes_at_caps = calculate_accumulated_income_taxes(income_density, annual_income_caps, tolerance=0.01)
+    _, accumulated_support_difference = calculate_income_support_batched(income_distribution, annual_income_caps)
+
+    assert taxes_at_caps["error"] < 0.01
+    # The binned model puts all incomes of a bin at its income, which shifts the taxes by a few hundred EUR
+    np.testing.assert_allclose(taxes_at_caps["accumulated_support_difference"], accumulated_support_difference, atol=1e3)
+
+    # A looser tolerance stays within it
+    loose_taxes_at_caps = calculate_accumulated_income_taxes(income_density, annual_income_caps, tolerance=1)
+    np.testing.assert_allclose(loose_taxes_at_caps["accumulated_support_difference"], taxes_at_caps["accumulated_support_difference"], atol=1)
+    np.testing.assert_allclose(taxes_at_caps["total_percentage_below_income_cap"], income_density.cdf(annual_income_caps))
+
+
+def test_too_few_bins_and_infinite_mean_are_rejected():
+    with pytest.raises(ValueError):
+        IncomeDensity.fit([[20e3, 0.5], [40e3, 0.5]])
+    with pytest.raises(ValueError):
+        IncomeDensity.fit(income_distribution, pareto_alpha=1.0)
@@ -0,0 +1,76 @@
+"""
+Tests of the income distributions from microdata. Run with: python -m pytest -q
+"""
+
+import numpy as np
+import pytest
+
+from income_microdata import bin_income_chunks, default_bin_edges, read_binary_chunks, read_csv_chunks, read_income_microdata
+from tax_autonomy_estimations import TaxCalculator
+
+
+rng = np.random.default_rng(11)
+incomes = rng.lognormal(np.log(40e3), 0.7, 20_000)
+weights = rng.uniform(0.5, 2.0, 20_000)
+
+
+def get_chunks(chunk_size: int):
+    return [(incomes[start:start + chunk_size], weights[start:start + chunk_size]) for start in range(0, len(incomes), chunk_size)]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 999, 7_000, 20_000])
+def test_binning_does_not_depend_on_the_chunk_size(chunk_size):
+    single_chunk = bin_income_chunks([(incomes, weights)])
+    chunked = bin_income_chunks(get_chunks(chunk_size))
+
+    np.testing.assert_allclose(chunked.annual_incomes, single_chunk.annual_incomes, rtol=1e-12)
+    np.testing.assert_allclose(chunked.weights, single_chunk.weights, rtol=1e-12)
+
+
+def test_bins_hold_weighted_mean_incomes():
+    income_distribution = bin_income_chunks(get_chunks(5_000))
+    bin_index = np.searchsorted(default_bin_edges, incomes, side="right") - 1
+    non_empty = np.unique(bin_index)
+
+    expected_weights = np.bincount(bin_index, weights)[non_empty]
+    expected_incomes = np.bincount(bin_index, weights * incomes)[non_empty] / expected_weights
+
+    np.testing.assert_allclose(income_distribution.annual_incomes, expected_incomes)
+    np.testing.assert_allclose(income_distribution.weights, expected_weights / weights.sum())
+    assert income_distribution.total_weight == pytest.approx(1.0)
+
+
+def test_incomes_outside_the_bins_are_dropped():
+    income_distribution = bin_income_chunks([(np.array([-5.0, np.nan, 50e3, 1e9]), None), (np.array([np.inf, 50e3]), None)])
+
+    assert len(income_distribution) == 1
+    assert income_distribution.annual_incomes[0] == pytest.approx(50e3)
+
+    with pytest.raises(ValueError):
+        bin_income_chunks([(np.array([-1.0, np.nan]), None)])
+
+
+def test_monthly_net_incomes_are_converted_before_binning():
+    monthly_net_incomes = np.array([1500.0, 2500.0, 4000.0])
+    income_distribution = bin_income_chunks([(monthly_net_incomes, None)], bin_edges=[0, 1e9], monthly=True, net_incomes=True)
+
+    pretax_incomes = TaxCalculator.calculate_pretax_income(12 * monthly_net_incomes, 0.1)
+    assert income_distribution.annual_incomes[0] == pytest.approx(pretax_incomes.mean())
+
+
+def test_csv_and_binary_files_give_the_same_distribution(tmp_path):
+    csv_path = tmp_path / "incomes.csv"
+    np.savetxt(csv_path, np.column_stack([weights, incomes]), delimiter=",", header="weight,income", comments="")
+    npy_path = tmp_path / "incomes.npy"
+    np.save(npy_path, np.column_stack([incomes, weights]))
+
+    from_csv = read_income_microdata(str(csv_path), income_column="income", weight_column="weight", chunk_size=3_000)
+    from_npy = read_income_microdata(str(npy_path), chunk_size=3_000)
+
+    np.testing.assert_allclose(from_csv.annual_incomes, from_npy.annual_incomes)
+    np.testing.assert_allclose(from_csv.weights, from_npy.weights)
+    assert [len(chunk_incomes) for chunk_incomes, _ in read_csv_chunks(str(csv_path), "income", chunk_size=8_000)] == [8_000, 8_000, 4_000]
+    assert [len(chunk_incomes) for chunk_incomes, _ in read_binary_chunks(str(npy_path), chunk_size=8_000)] == [8_000, 8_000, 4_000]
+
+    with pytest.raises(ValueError):
+        next(read_csv_chunks(str(csv_path), "net_income"))
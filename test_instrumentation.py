@@ -0,0 +1,57 @@
+"""
+Tests of the stage instrumentation. Run with: python -m pytest -q
+"""
+
+import instrumentation
+
+
+@instrumentation.staged
+def staged_function(n: int) -> int:
+    with instrumentation.stage("inner"):
+        instrumentation.count("staged_function.calls")
+        return n + 1
+
+
+def test_nothing_is_recorded_while_disabled():
+    calls = []
+
+    assert instrumentation.get_profile() is None
+    assert staged_function(1) == 2
+    instrumentation.sample("value", lambda: calls.append(1))
+
+    assert calls == []
+    assert instrumentation.disable() is None
+
+
+def test_stages_counters_and_samples():
+    with instrumentation.profiling(sample_every=2, max_samples=3) as profile:
+        for i in range(10):
+            staged_function(i)
+            instrumentation.sample("value", lambda: i * 10)
+
+    assert instrumentation.get_profile() is None
+    assert profile.stages["staged_function"]["calls"] == 10
+    assert profile.stages["staged_function/inner"]["calls"] == 10
+    assert profile.counters == {"staged_function.calls": 10}
+    # Every second value, at most three of them
+    assert profile.samples["value"] == [0, 20, 40]
+
+    report = profile.report()
+    assert report["wall_time"] >= report["stages"]["staged_function"]["total_time"]
+    assert "staged_function/inner" in profile.format_report()
+
+
+def test_merge_adds_worker_profile_under_current_stage():
+    with instrumentation.profiling() as worker_profile:
+        staged_function(0)
+        instrumentation.sample("value", 1)
+
+    with instrumentation.profiling() as profile:
+        staged_function(0)
+        with instrumentation.stage("run"):
+            instrumentation.merge(worker_profile)
+
+    assert profile.stages["run/staged_function/inner"]["calls"] == 1
+    assert profile.stages["staged_function"]["calls"] == 1
+    assert profile.counters["staged_function.calls"] == 2
+    assert profile.samples["value"] == [1]
@@ -0,0 +1,49 @@
+"""
+Tests of the medical insurance contribution model. Run with: python -m pytest -q
+"""
+
+import numpy as np
+import pytest
+
+from medical_insurance import calculate_medical_insurance_contribution, calculate_medical_insurance_model
+from tax_autonomy_estimations import IncomeDistribution, tax_schedules
+
+
+def test_contribution_follows_the_social_security_limits():
+    tax_schedule = tax_schedules[2025]
+    incomes = np.array([0, tax_schedule.social_security_lower_limit, 40e3, tax_schedule.social_security_upper_limit, 200e3])
+
+    contributions = calculate_medical_insurance_contribution(incomes, 2025, include_employer_part=False)
+
+    expected = np.array([0, 0, 40e3, tax_schedule.social_security_upper_limit, tax_schedule.social_security_upper_limit]) * tax_schedule.medical_insurance_rate
+    np.testing.assert_allclose(contributions, expected)
+    np.testing.assert_allclose(calculate_medical_insurance_contribution(incomes, 2025), 2 * expected)
+    assert isinstance(calculate_medical_insurance_contribution(40e3), float)
+
+
+def test_break_even_without_cost_per_insured():
+    income_distribution = IncomeDistribution.income_distribution_germany_annual_pretax_2025
+    result = calculate_medical_insurance_model(income_distribution, 58e6, 16e6)
+
+    assert result.balance == pytest.approx(0, abs=1e-6 * result.total_contributions)
+    assert result.cost_per_insured == pytest.approx(result.total_contributions / 74e6)
+    assert result.non_contributor_cost == pytest.approx(result.cost_per_insured * 16e6)
+
+    # Members with high incomes pay for others, members without contributions are paid for
+    assert result.cross_subsidies[np.argmax(result.annual_incomes)] > 0
+    assert result.cross_subsidies[np.argmin(result.annual_incomes)] < 0
+
+
+def test_stacked_rates_match_single_rates():
+    income_distribution = IncomeDistribution.income_distribution_germany_annual_pretax_2025
+    medical_insurance_rates = np.array([0.07, 0.085, 0.1])
+    stacked_schedule = tax_schedules[2025].with_parameters(medical_insurance_rate=medical_insurance_rates[:, None])
+
+    stacked = calculate_medical_insurance_model(income_distribution, annual_cost_per_insured=4000, tax_schedule=stacked_schedule)
+
+    assert stacked.balance.shape == (3,)
+    for i, medical_insurance_rate in enumerate(medical_insurance_rates):
+        single = calculate_medical_insurance_model(income_distribution, annual_cost_per_insured=4000,
+                                                   tax_schedule=tax_schedules[2025].with_parameters(medical_insurance_rate=medical_insurance_rate))
+        np.testing.assert_allclose(stacked.contributions[i], single.contributions)
+        assert stacked.balance[i] == pytest.approx(single.balance)
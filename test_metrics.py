@@ -0,0 +1,77 @@
+"""
+Tests of the inequality and fiscal balance metrics. Run with: python -m pytest -q
+"""
+
+import math
+
+import numpy as np
+import pytest
+
+from metrics import calculate_redistribution_metrics, calculate_scenario_metrics, compensated_sum, get_gini_coefficient, get_lorenz_curve, get_top_share
+from tax_autonomy_estimations import IncomeDistribution
+
+
+income_distribution = IncomeDistribution.cutoff_income_distribution(IncomeDistribution.income_distribution_germany_annual_pretax_2025, 20e3)
+
+
+def test_equal_incomes_have_no_inequality():
+    population_shares, income_shares = get_lorenz_curve(np.full(7, 30e3), np.random.default_rng(1).uniform(0.1, 1, 7))
+
+    np.testing.assert_allclose(income_shares, population_shares)
+    assert get_gini_coefficient(population_shares, income_shares) == pytest.approx(0, abs=1e-12)
+    assert get_top_share(population_shares, income_shares) == pytest.approx(0.1)
+
+
+def test_gini_and_top_share_of_uniform_incomes():
+    # Incomes uniformly distributed on [0, 1] have the Lorenz curve p^2, the Gini coefficient 1/3 and the top decile share 0.19
+    incomes = np.random.default_rng(2).permutation(np.linspace(0, 1, 10_001))
+    population_shares, income_shares = get_lorenz_curve(incomes, 1.0)
+
+    assert population_shares[0] == income_shares[0] == 0
+    assert population_shares[-1] == income_shares[-1] == 1
+    assert get_gini_coefficient(population_shares, income_shares) == pytest.approx(1 / 3, abs=1e-3)
+    assert get_top_share(population_shares, income_shares) == pytest.approx(0.19, abs=1e-3)
+
+
+def test_all_income_with_a_single_bracket():
+    population_shares, income_shares = get_lorenz_curve(np.array([0.0, 0.0, 0.0, 1.0]), np.array([0.3, 0.3, 0.3, 0.1]))
+
+    assert get_gini_coefficient(population_shares, income_shares) == pytest.approx(0.9)
+    assert get_top_share(population_shares, income_shares) == pytest.approx(1.0)
+
+
+def test_compensated_sum_is_exact_and_does_not_depend_on_the_order():
+    values = np.random.default_rng(3).lognormal(0, 3, (2, 100_001)) * np.array([[1.0], [-1.0]])
+    values[:, ::7] *= 1e12
+
+    totals = compensated_sum(values)
+
+    assert totals.tolist() == [math.fsum(values[0]), math.fsum(values[1])]
+    assert compensated_sum(values[:, ::-1]).tolist() == totals.tolist()
+    assert compensated_sum(values.T, axis=0).tolist() == totals.tolist()
+    assert compensated_sum(np.zeros((3, 0))).tolist() == [0, 0, 0]
+
+
+def test_scenario_metrics_have_the_scenario_axes():
+    annual_income_caps, economy_subsidies = np.array([60e3, 100e3, 1e9]), np.array([0, 300e9])
+
+    metrics = calculate_scenario_metrics(income_distribution, annual_income_caps, 83e6, economy_subsidies)
+
+    assert metrics.gini_after.shape == metrics.gini_before.shape == metrics.fiscal_balance.shape == (3, 2)
+    assert metrics.income_shares_after.shape == (3, 2, len(income_distribution) + 1)
+    np.testing.assert_array_equal(metrics.fiscal_balance, metrics.total_support_collected - metrics.total_support_paid)
+
+    # The support below the cap reduces the inequality, more support reduces it further
+    assert np.all(metrics.gini_after[:2] < metrics.gini_before[:2])
+    assert np.all(metrics.gini_after[:, 1] <= metrics.gini_after[:, 0])
+
+
+def test_no_support_keeps_the_metrics():
+    annual_incomes, weights = np.array(income_distribution).T
+
+    metrics = calculate_redistribution_metrics(annual_incomes, weights, np.zeros((2, len(annual_incomes))), 83e6)
+
+    np.testing.assert_allclose(metrics.gini_after, metrics.gini_before)
+    np.testing.assert_allclose(metrics.top_decile_share_after, metrics.top_decile_share_before)
+    assert metrics.fiscal_balance.tolist() == [0, 0]
+    assert metrics.total_income_tax[0] > 0
@@ -0,0 +1,57 @@
+"""
+Tests of the chunked microsimulation. Run with: python -m pytest -q
+"""
+
+import numpy as np
+
+from microsimulation import get_years_percentile, run_microsimulation, sample_individuals
+from tax_autonomy_estimations import IncomeDistribution, calculate_years_to_reach_capital, get_bin_edges
+
+
+income_distribution = IncomeDistribution.cutoff_income_distribution(IncomeDistribution.income_distribution_germany_annual_pretax_2025, 20e3)
+
+
+def test_individuals_are_drawn_within_their_bins():
+    chunks = list(sample_individuals(income_distribution, 25_000, seed=3, chunk_size=10_000))
+    annual_incomes = np.array(income_distribution)[:, 0]
+    bin_edges = get_bin_edges(annual_incomes)
+
+    assert [len(chunk_incomes) for _, chunk_incomes in chunks] == [10_000, 10_000, 5_000]
+
+    bin_index = np.concatenate([chunk_bin_index for chunk_bin_index, _ in chunks])
+    incomes = np.concatenate([chunk_incomes for _, chunk_incomes in chunks])
+    assert np.all((incomes >= bin_edges[bin_index]) & (incomes <= bin_edges[bin_index + 1]))
+
+    # The same seed gives the same population
+    for (bin_index, incomes), (other_bin_index, other_incomes) in zip(chunks, sample_individuals(income_distribution, 25_000, 3, 10_000)):
+        np.testing.assert_array_equal(bin_index, other_bin_index)
+        np.testing.assert_array_equal(incomes, other_incomes)
+
+
+def test_single_bin_equals_binned_model():
+    # All individuals of a single bin have the income of the bin, so the microsimulation must reproduce the binned model
+    single_bin = [[60e3, 1.0]]
+    interest_rates = [0.03, 0.07, 0.14]
+
+    statistics = run_microsimulation(single_bin, 5_000, 0.05, interest_rates, annual_income_cap=100e3, number_of_citizens=83e6,
+                                     economy_subsidy=300e9, chunk_size=2_000)
+    result = calculate_years_to_reach_capital(single_bin, 0.05, interest_rates, 100e3, 83e6, 300e9)
+
+    np.testing.assert_allclose(statistics["mean_income_support_per_bin"], result.income_support)
+    np.testing.assert_array_equal(statistics["mean_years_per_bin"], result.years_to_reach_capital)
+    assert statistics["years_histogram"].sum(axis=1).tolist() == [5_000] * len(interest_rates)
+
+
+def test_no_support_without_cap_and_subsidy():
+    statistics = run_microsimulation(income_distribution, 20_000, interest_rates=[0.07], annual_income_cap=1e9, chunk_size=7_000)
+
+    assert statistics["mean_income_support"] == 0
+    np.testing.assert_array_equal(statistics["years_histogram"], statistics["years_no_support_histogram"])
+    assert statistics["counts_per_bin"].sum() == 20_000
+
+
+def test_years_percentile_of_histogram():
+    years_histogram = np.array([[0, 2, 2, 0, 6], [10, 0, 0, 0, 0]])
+
+    assert get_years_percentile(years_histogram, 50).tolist() == [4, 0]
+    assert get_years_percentile(years_histogram, 20).tolist() == [1, 0]
@@ -0,0 +1,45 @@
+"""
+Tests of the Monte Carlo years to reach sufficient capital. Run with: python -m pytest -q
+"""
+
+import numpy as np
+import pytest
+
+from monte_carlo import draw_annual_returns, simulate_years_to_capital
+from tax_autonomy_estimations import IncomeDistribution, calculate_income_support, calculate_number_of_years_batched
+
+
+income_distribution = IncomeDistribution.cutoff_income_distribution(IncomeDistribution.income_distribution_germany_annual_pretax_2025, 20e3)
+annual_incomes = np.array(income_distribution)[:, 0]
+
+
+@pytest.mark.parametrize("mean", [0.03, 0.07, 0.14])
+def test_zero_volatility_equals_deterministic_years(mean):
+    income_support, _ = calculate_income_support(income_distribution, 100e3, number_of_citizens=83e6, economy_subsidy=300e9)
+
+    years_histogram = simulate_years_to_capital(annual_incomes, [{"mean": mean, "volatility": 0.0}, {"historical_returns": [mean]}],
+                                                annual_income_cap=100e3, income_support=income_support, number_of_paths=50, chunk_size=20)
+    years, _ = calculate_number_of_years_batched(mean, 0.05, annual_incomes, 100e3, income_support)
+
+    # Every path has the fixed return, so all paths of a bracket need the deterministic number of years
+    for model_histogram in years_histogram:
+        assert model_histogram.sum(axis=1).tolist() == [50] * len(annual_incomes)
+        np.testing.assert_array_equal(np.argmax(model_histogram, axis=1), years)
+        np.testing.assert_array_equal(model_histogram.max(axis=1), 50)
+
+
+def test_result_does_not_depend_on_the_workers():
+    return_models = [{"mean": 0.07, "volatility": 0.15}]
+    parameters = dict(annual_income_cap=100e3, number_of_paths=3_000, chunk_size=1_000, seed=5)
+
+    in_process = simulate_years_to_capital(annual_incomes, return_models, max_workers=1, **parameters)
+    parallel = simulate_years_to_capital(annual_incomes, return_models, max_workers=2, **parameters)
+
+    np.testing.assert_array_equal(in_process, parallel)
+
+
+def test_lognormal_returns_have_the_given_mean():
+    annual_returns = draw_annual_returns(np.random.default_rng(0), {"mean": 0.07, "volatility": 0.15}, 200_000, 5)
+
+    assert annual_returns.shape == (200_000, 5)
+    assert abs(annual_returns.mean() - 0.07) < 2e-3
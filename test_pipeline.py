@@ -0,0 +1,61 @@
+"""
+Tests of the incremental scenario pipeline. Run with: python -m pytest -q
+"""
+
+import numpy as np
+import pytest
+
+from pipeline import create_scenario_pipeline
+from tax_autonomy_estimations import IncomeDistribution, calculate_years_to_reach_capital
+
+
+income_distribution = IncomeDistribution.cutoff_income_distribution(IncomeDistribution.income_distribution_germany_annual_pretax_2025, 20e3)
+interest_rates = [0.07, 0.14]
+
+
+def create_pipeline(**inputs):
+    return create_scenario_pipeline(income_distribution, interest_rates=interest_rates, annual_income_cap=100e3, number_of_citizens=83e6, **inputs)
+
+
+def assert_matches_direct_computation(pipeline, annual_income_cap, economy_subsidy, tax_schedule=2025):
+    result = calculate_years_to_reach_capital(income_distribution, 0.05, interest_rates, annual_income_cap, 83e6, economy_subsidy, tax_schedule)
+
+    np.testing.assert_allclose(pipeline.get("income_support"), result.income_support)
+    np.testing.assert_array_equal(pipeline.get("years"), result.years_to_reach_capital)
+    np.testing.assert_array_equal(pipeline.get("years_no_support"), result.years_to_reach_capital_no_support)
+    assert pipeline.get("aggregates")["accumulated_support_difference"] == pytest.approx(result.accumulated_support_difference)
+
+
+def get_recomputed_stages(pipeline, **inputs) -> list:
+    computations = dict(pipeline.computations)
+
+    pipeline.set(**inputs)
+    pipeline.get("aggregates")
+
+    return [name for name in pipeline.stages if pipeline.computations[name] > computations[name]]
+
+
+def test_pipeline_equals_direct_computation():
+    pipeline = create_pipeline(economy_subsidy=300e9)
+    assert_matches_direct_computation(pipeline, 100e3, 300e9)
+
+    pipeline.set(annual_income_cap=150e3, economy_subsidy=0)
+    assert_matches_direct_computation(pipeline, 150e3, 0)
+
+
+def test_only_downstream_stages_are_recomputed():
+    pipeline = create_pipeline()
+    pipeline.get("aggregates")
+
+    assert get_recomputed_stages(pipeline, economy_subsidy=300e9) == ["income_support", "years", "aggregates"]
+    assert get_recomputed_stages(pipeline, annual_income_cap=150e3) == ["taxes_at_cap", "income_support", "years", "years_no_support", "aggregates"]
+    assert get_recomputed_stages(pipeline, interest_rates=[0.05, 0.1]) == ["years", "years_no_support", "aggregates"]
+
+    # An equal value does not recompute anything, not even for a new list with the same values
+    assert get_recomputed_stages(pipeline, economy_subsidy=300e9, interest_rates=[0.05, 0.1]) == []
+    assert all(computations >= 1 for computations in pipeline.computations.values())
+
+
+def test_unknown_input_is_rejected():
+    with pytest.raises(ValueError):
+        create_pipeline().set(interest_rate=0.07)
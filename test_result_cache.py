@@ -0,0 +1,80 @@
+"""
+Tests of the persistent result cache. Run with: python -m pytest -q
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+import instrumentation
+from result_cache import ResultCache
+from scenario_sweep import build_scenario_grid, evaluate_scenarios
+from tax_autonomy_estimations import IncomeDistribution, calculate_years_to_reach_capital
+
+
+@pytest.fixture(scope="module")
+def income_distribution():
+    return IncomeDistribution.cutoff_income_distribution(IncomeDistribution.income_distribution_germany_annual_pretax_2025, 20e3)
+
+
+def test_cache_round_trip_and_eviction(tmp_path):
+    cache = ResultCache(str(tmp_path), max_bytes=3000)
+    arrays = {"support": np.arange(100.0), "difference": 1.5}
+
+    key = cache.get_key(evaluate_scenarios, scenario=np.array([1.0, 2.0]), tax_schedule=2025)
+    assert key == cache.get_key(evaluate_scenarios, scenario=[1, 2], tax_schedule=2025)
+    assert key != cache.get_key(evaluate_scenarios, scenario=[1, 2], tax_schedule=2024)
+    assert cache.get(key) is None
+
+    cache.put(key, arrays)
+    entry = cache.get(key)
+    np.testing.assert_array_equal(entry["support"], arrays["support"])
+    assert float(entry["difference"]) == 1.5
+
+    # Each entry takes about 1 kB, the least recently used entries are removed once the cache exceeds its budget
+    keys = [key] + [cache.get_key(evaluate_scenarios, scenario=[i]) for i in range(3)]
+    for access_time, other_key in enumerate(keys[1:], start=1):
+        cache.put(other_key, arrays, evict=False)
+        os.utime(os.path.join(str(tmp_path), other_key), (access_time, access_time))
+    os.utime(os.path.join(str(tmp_path), key), (10, 10))
+
+    cache.evict()
+
+    assert sum(size for _, size, _ in cache.get_entries()) <= cache.max_bytes
+    assert cache.get(keys[1]) is None
+    assert cache.get(key) is not None and cache.get(keys[-1]) is not None
+
+
+def test_extended_sweep_is_read_from_the_cache(tmp_path, income_distribution):
+    scenarios = build_scenario_grid([50e3, 100e3], [0, 300e9], [0.05], [0.03, 0.14])
+    extended_scenarios = build_scenario_grid([50e3, 100e3, 150e3], [0, 300e9], [0.05], [0.03, 0.14])
+    cache = ResultCache(str(tmp_path))
+
+    evaluate_scenarios(scenarios, income_distribution, 83e6, 2025, cache)
+
+    with instrumentation.profiling() as profile:
+        cached = evaluate_scenarios(extended_scenarios, income_distribution, 83e6, 2025, cache)
+
+    # Only the scenarios of the new cap are evaluated
+    assert profile.counters["evaluate_scenarios.scenarios"] == 4
+
+    uncached = evaluate_scenarios(extended_scenarios, income_distribution, 83e6, 2025)
+    for name, values in uncached.items():
+        np.testing.assert_array_equal(cached[name], values)
+        assert np.asarray(cached[name]).dtype == np.asarray(values).dtype
+
+
+def test_cached_scenario_matches_computed_scenario(tmp_path, income_distribution):
+    cache = ResultCache(str(tmp_path))
+    parameters = dict(interest_rate_low_risk=0.05, interest_rates=[0.05, 0.1], annual_income_cap=100e3, number_of_citizens=83e6,
+                      economy_subsidy=300e9, tax_schedule=2024)
+
+    computed = calculate_years_to_reach_capital(income_distribution, **parameters, cache=cache)
+    with instrumentation.profiling() as profile:
+        cached = calculate_years_to_reach_capital(income_distribution, **parameters, cache=cache)
+
+    assert profile.counters["result_cache.hits"] == 1
+    np.testing.assert_array_equal(cached.years_to_reach_capital, computed.years_to_reach_capital)
+    np.testing.assert_array_equal(cached.income_support, computed.income_support)
+    assert cached.tax_schedule == computed.tax_schedule
@@ -0,0 +1,69 @@
+"""
+Round trips through the columnar result store. Run with: python -m pytest -q
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+from scenario_results import ScenarioResultStore
+
+
+columns = {"scenario": ("f8", ()), "values": ("f4", (3,)), "years": ("i8", (3,))}
+
+
+def get_rows(start: int, number_of_rows: int) -> dict:
+    scenario = np.arange(start, start + number_of_rows, dtype=float)
+
+    return {"scenario": scenario,
+            "values": np.stack([scenario, scenario / 2, -scenario], axis=1),
+            "years": np.tile(np.arange(3), (number_of_rows, 1)) + np.arange(start, start + number_of_rows)[:, None]}
+
+
+def test_store_round_trip(tmp_path):
+    store = ScenarioResultStore(str(tmp_path), columns)
+    store.append(get_rows(0, 4))
+    store.append(get_rows(4, 3))
+
+    reopened = ScenarioResultStore(str(tmp_path))
+    expected = get_rows(0, 7)
+
+    assert len(reopened) == 7
+    for name, values in reopened.read().items():
+        np.testing.assert_array_equal(values, expected[name])
+
+    assert list(reopened.read(["years"])) == ["years"]
+    with pytest.raises(ValueError):
+        reopened.read(["unknown"])
+    with pytest.raises(ValueError):
+        ScenarioResultStore(str(tmp_path), {"scenario": ("f8", ())})
+
+
+def test_store_discards_uncommitted_rows(tmp_path):
+    store = ScenarioResultStore(str(tmp_path), columns)
+    store.append(get_rows(0, 5))
+
+    # An interrupted append: the data of some columns is written, but the row count in the schema is not updated
+    partial_rows = get_rows(5, 2)
+    for name in ["scenario", "values"]:
+        with open(os.path.join(str(tmp_path), name + ".bin"), "ab") as column_file:
+            column_file.write(np.ascontiguousarray(partial_rows[name], dtype=store.columns[name][0]).tobytes())
+
+    reopened = ScenarioResultStore(str(tmp_path))
+    assert len(reopened) == 5
+    assert os.path.getsize(os.path.join(str(tmp_path), "scenario.bin")) == 5 * 8
+
+    reopened.append(get_rows(5, 2))
+    expected = get_rows(0, 7)
+    for name, values in ScenarioResultStore(str(tmp_path)).read().items():
+        np.testing.assert_array_equal(values, expected[name])
+
+
+def test_store_refuses_other_fingerprint(tmp_path):
+    ScenarioResultStore(str(tmp_path), columns, "a").append(get_rows(0, 2))
+
+    assert len(ScenarioResultStore(str(tmp_path), columns, "a")) == 2
+    assert len(ScenarioResultStore(str(tmp_path))) == 2
+    with pytest.raises(ValueError):
+        ScenarioResultStore(str(tmp_path), columns, "b")
@@ -0,0 +1,94 @@
+"""
+Tests of the scenario query server. Run with: python -m pytest -q
+"""
+
+import json
+import asyncio
+
+import numpy as np
+
+from scenario_server import ScenarioServer, send_requests
+from tax_autonomy_estimations import IncomeDistribution, calculate_years_to_reach_capital
+
+
+income_distribution = IncomeDistribution.cutoff_income_distribution(IncomeDistribution.income_distribution_germany_annual_pretax_2025, 20e3)
+
+
+def run_with_server(client, **options):
+    # Start a server on a free port, run the client coroutine with the port and stop the server again
+    async def run():
+        scenario_server = ScenarioServer(income_distribution, number_of_citizens=83e6, **options)
+        server = await scenario_server.start(port=0)
+
+        async with server:
+            return await client(server.sockets[0].getsockname()[1])
+
+    return asyncio.run(run())
+
+
+def test_pipelined_requests_are_coalesced_into_one_batch():
+    requests = [{"id": i, "query": ["years", "support", "metrics"][i % 3], "annual_income_cap": [60e3, 100e3][i % 2],
+                 "economy_subsidy": [0, 300e9][i // 6 % 2]} for i in range(12)]
+
+    async def client(port):
+        responses = await send_requests(requests, port=port)
+        statistics = (await send_requests([{"query": "stats"}], port=port))[0]
+        return responses, statistics
+
+    # The window is long enough that all requests of the connection arrive before the batch is evaluated
+    responses, statistics = run_with_server(client, batch_window=0.2)
+
+    assert statistics["requests"] == 12
+    assert statistics["batches"] == 1
+    assert sorted(response["id"] for response in responses) == list(range(12))
+
+    for response in responses:
+        request = requests[response["id"]]
+        result = calculate_years_to_reach_capital(income_distribution, 0.05, [0.07, 0.14], request["annual_income_cap"], 83e6,
+                                                  request["economy_subsidy"])
+
+        if request["query"] == "years":
+            np.testing.assert_array_equal(response["years_to_reach_capital"], result.years_to_reach_capital)
+            np.testing.assert_array_equal(response["years_to_reach_capital_no_support"], result.years_to_reach_capital_no_support)
+        elif request["query"] == "support":
+            np.testing.assert_allclose(response["income_support"], result.income_support)
+        else:
+            assert response["gini_after"] < response["gini_before"]
+
+
+def test_max_batch_size_splits_the_batches():
+    async def client(port):
+        await send_requests([{"id": i, "query": "support"} for i in range(10)], port=port)
+        return (await send_requests([{"query": "stats"}], port=port))[0]
+
+    statistics = run_with_server(client, batch_window=0.2, max_batch_size=4)
+
+    assert statistics["requests"] == 10
+    assert statistics["batches"] == 3
+
+
+def test_invalid_requests_get_an_error_response():
+    lines = [b'"valid"', b'["id"]', b'not json', b'{"id": 1, "query": "taxes"}', b'{"id": 2, "query": "support", "interest_rate": 0.07}',
+             b'{"id": 3, "query": "support"}']
+
+    async def client(port):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"\n".join(lines) + b"\n")
+        await writer.drain()
+
+        # A request that is never answered would block the connection forever
+        responses = [json.loads(await asyncio.wait_for(reader.readline(), 10)) for _ in lines]
+
+        writer.close()
+        await writer.wait_closed()
+        return responses
+
+    responses = run_with_server(client)
+
+    errors = [response for response in responses if "error" in response]
+    assert len(errors) == 5
+    assert sorted(response.get("id", 0) for response in errors) == [0, 0, 0, 1, 2]
+    assert sum("A request must be a JSON object" in response["error"] for response in errors) == 2
+
+    # The connection keeps answering after the invalid requests
+    assert [response["id"] for response in responses if "error" not in response] == [3]
@@ -0,0 +1,46 @@
+"""
+Tests of the inverse policy solver. Run with: python -m pytest -q
+"""
+
+import numpy as np
+import pytest
+
+from scenario_solver import evaluate_policies, solve_policy
+from tax_autonomy_estimations import IncomeDistribution, calculate_years_to_reach_capital, get_weighted_years_percentile
+
+
+income_distribution = IncomeDistribution.cutoff_income_distribution(IncomeDistribution.income_distribution_germany_annual_pretax_2025, 20e3)
+
+
+def test_policies_match_single_scenarios():
+    years = evaluate_policies(income_distribution, [80e3, 150e3], [[0], [300e9]], number_of_citizens=83e6)
+
+    for i, economy_subsidy in enumerate([0, 300e9]):
+        for j, annual_income_cap in enumerate([80e3, 150e3]):
+            result = calculate_years_to_reach_capital(income_distribution, 0.05, [0.07], annual_income_cap, 83e6, economy_subsidy)
+            assert years[i, j] == get_weighted_years_percentile(result.years_to_reach_capital[0], np.array(income_distribution)[:, 1], 50)
+
+
+@pytest.mark.parametrize("lever, target_years, fixed", [("economy_subsidy", 20, dict(annual_income_cap=100e3)),
+                                                        ("annual_income_cap", 25, dict(economy_subsidy=300e9))])
+def test_solution_meets_target_within_tolerance(lever, target_years, fixed):
+    solution = solve_policy(income_distribution, lever, target_years, number_of_citizens=83e6, **fixed)
+
+    assert solution.status == "converged"
+    assert solution.metric <= target_years
+    lower, upper = solution.bracket
+    assert upper - lower <= 1e-4 * (10e12 if lever == "economy_subsidy" else np.ptp(np.array(income_distribution)[:, 0]))
+
+    # The other end of the final bracket misses the target
+    other_value = upper if solution.value == lower else lower
+    parameters = {**fixed, lever: other_value}
+    assert evaluate_policies(income_distribution, parameters["annual_income_cap"], parameters["economy_subsidy"], number_of_citizens=83e6) > target_years
+
+
+def test_unreachable_target_and_unknown_lever():
+    solution = solve_policy(income_distribution, "economy_subsidy", 0.5, bounds=(0, 1e9), annual_income_cap=100e3, number_of_citizens=83e6)
+
+    assert solution.status == "target_never_met"
+    assert np.isnan(solution.value)
+    with pytest.raises(ValueError):
+        solve_policy(income_distribution, "interest_rate", 20)
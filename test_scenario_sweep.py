@@ -0,0 +1,75 @@
+"""
+Tests of the resumable scenario sweep and of the export of single scenarios. Run with: python -m pytest -q
+"""
+
+import numpy as np
+import pytest
+
+from scenario_results import ScenarioResultStore
+from scenario_sweep import export_scenario_result, run_sweep, scenario_parameters
+from tax_autonomy_estimations import IncomeDistribution, TaxCalculator, calculate_years_to_reach_capital
+
+
+@pytest.fixture(scope="module")
+def income_distribution():
+    return IncomeDistribution.cutoff_income_distribution(IncomeDistribution.income_distribution_germany_annual_pretax_2025, 20e3)
+
+
+def get_sorted_rows(store: ScenarioResultStore) -> dict:
+    rows = {name: np.asarray(values) for name, values in store.read().items()}
+    order = np.lexsort([rows[name] for name in reversed(scenario_parameters)])
+
+    return {name: values[order] for name, values in rows.items()}
+
+
+def test_sweep_resumes_to_the_full_sweep(tmp_path, income_distribution):
+    grid = dict(economy_subsidies=[0, 300e9], interest_rates_low_risk=[0.05], interest_rates=[0.03, 0.14], number_of_citizens=83e6, chunk_size=3)
+
+    full_store = run_sweep(income_distribution, str(tmp_path / "full"), [50e3, 100e3, 150e3], max_workers=1, **grid)
+
+    # A sweep over fewer caps, extended afterwards, runs only the missing scenarios
+    run_sweep(income_distribution, str(tmp_path / "resumed"), [50e3, 150e3], max_workers=1, **grid)
+    resumed_store = run_sweep(income_distribution, str(tmp_path / "resumed"), [50e3, 100e3, 150e3], max_workers=1, **grid)
+
+    assert len(resumed_store) == len(full_store) == 12
+    full_rows, resumed_rows = get_sorted_rows(full_store), get_sorted_rows(resumed_store)
+    for name in full_rows:
+        np.testing.assert_array_equal(resumed_rows[name], full_rows[name])
+
+    # Resuming with other inputs would mix incompatible results
+    with pytest.raises(ValueError):
+        run_sweep(income_distribution, str(tmp_path / "resumed"), [50e3], max_workers=1, **{**grid, "number_of_citizens": 80e6})
+    with pytest.raises(ValueError):
+        run_sweep(income_distribution, str(tmp_path / "resumed"), [50e3], max_workers=1, tax_schedule=2024, **grid)
+
+
+def test_parallel_sweep_matches_sweep_in_process(tmp_path, income_distribution):
+    grid = dict(economy_subsidies=[0, 300e9], interest_rates=[0.03, 0.14], number_of_citizens=83e6, chunk_size=2)
+
+    in_process = run_sweep(income_distribution, str(tmp_path / "in_process"), [50e3, 100e3], max_workers=1, **grid)
+    parallel = run_sweep(income_distribution, str(tmp_path / "parallel"), [50e3, 100e3], max_workers=2, **grid)
+
+    in_process_rows, parallel_rows = get_sorted_rows(in_process), get_sorted_rows(parallel)
+    for name in in_process_rows:
+        np.testing.assert_array_equal(parallel_rows[name], in_process_rows[name])
+
+
+def test_export_skips_rows_already_in_the_store(tmp_path, income_distribution):
+    result = calculate_years_to_reach_capital(income_distribution, 0.05, [0.05, 0.1], 100e3, 83e6, 300e9, tax_schedule=2022)
+
+    export_scenario_result(result, str(tmp_path / "scenarios"))
+    store = export_scenario_result(result, str(tmp_path / "scenarios"))
+
+    assert len(store) == 2
+    columns = store.read(["years", "income_tax"])
+    np.testing.assert_array_equal(columns["years"], result.years_to_reach_capital)
+    # The taxes are those of the schedule of the result, not of the default schedule
+    np.testing.assert_allclose(columns["income_tax"][0], TaxCalculator.calculate_german_income_tax(result.annual_incomes, 2022))
+
+    other_result = calculate_years_to_reach_capital(income_distribution, 0.05, [0.1, 0.2], 100e3, 83e6, 300e9, tax_schedule=2022)
+    assert len(export_scenario_result(other_result, str(tmp_path / "scenarios"))) == 3
+
+    # Single scenarios are not mixed into the store of a sweep
+    run_sweep(income_distribution, str(tmp_path / "sweep"), [100e3], max_workers=1)
+    with pytest.raises(ValueError):
+        export_scenario_result(result, str(tmp_path / "sweep"))
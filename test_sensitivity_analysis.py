@@ -0,0 +1,54 @@
+"""
+Tests of the batched sensitivity analysis. Run with: python -m pytest -q
+"""
+
+import numpy as np
+import pytest
+
+from sensitivity_analysis import get_sobol_indices, parameter_names, run_sensitivity_analysis
+from tax_autonomy_estimations import IncomeDistribution, calculate_years_to_reach_capital
+
+
+income_distribution = IncomeDistribution.cutoff_income_distribution(IncomeDistribution.income_distribution_germany_annual_pretax_2025, 20e3)
+
+
+@pytest.fixture(scope="module")
+def result():
+    return run_sensitivity_analysis(income_distribution, annual_income_cap=100e3, economy_subsidy=300e9, number_of_citizens=83e6,
+                                    sample_budget=20_000)
+
+
+def test_sobol_indices_of_an_additive_model():
+    # y = x0 + 2 x1 with uniform x: the variance shares are 1/5 and 4/5, x2 has no influence
+    rng = np.random.default_rng(0)
+    samples_A, samples_B = rng.random((2, 20_000, 3))
+    samples_AB = np.repeat(samples_A[None], 3, axis=0)
+    samples_AB[np.arange(3), :, np.arange(3)] = samples_B.T
+
+    def model(samples):
+        return (samples[..., 0] + 2 * samples[..., 1])[..., None] + 20
+
+    first_order_indices, total_indices = get_sobol_indices(model(samples_A), model(samples_B), model(samples_AB))
+
+    np.testing.assert_allclose(first_order_indices[:, 0], [0.2, 0.8, 0.0], atol=0.02)
+    np.testing.assert_allclose(total_indices[:, 0], [0.2, 0.8, 0.0], atol=0.02)
+
+
+def test_sobol_indices_are_in_the_unit_interval(result):
+    for indices in [result.first_order_indices, result.total_indices]:
+        assert indices.shape == (len(parameter_names), len(income_distribution))
+        defined = indices[np.isfinite(indices)]
+        assert defined.size > 0 and np.all((defined >= 0) & (defined <= 1))
+
+    # The first-order share of a parameter cannot be larger than its total share, up to the sampling error
+    assert np.nanmax(result.first_order_indices - result.total_indices) < 0.05
+
+
+def test_base_years_match_the_scenario(result):
+    scenario = calculate_years_to_reach_capital(income_distribution, 0.05, [0.07], 100e3, 83e6, 300e9)
+
+    # The analysis does not round up to whole years
+    np.testing.assert_array_equal(np.ceil(result.base_years), scenario.years_to_reach_capital[0])
+
+    # Higher returns need fewer years
+    assert np.all(result.elasticities[parameter_names.index("interest_rate")] < 0)
@@ -0,0 +1,244 @@
+"""
+Tests of tax_autonomy_estimations. The vectorized functions are compared with the scalar loops they replaced, the constants of these
+references are taken from the tax schedule so that all schedules can be checked. Run with: python -m pytest -q
+"""
+
+import numpy as np
+import pytest
+
+from tax_autonomy_estimations import (BinnedIncomeDistribution, IncomeDistribution, TaxCalculator, calculate_income_support, calculate_income_support_batched, calculate_number_of_years,
+                                      calculate_number_of_years_batched, tax_schedules)
+
+
+def reference_income_tax(income: float, tax_schedule) -> float:
+    s = tax_schedule
+
+    if income <= s.E0:
+        return 0
+    elif s.E0 < income <= s.E1:
+        return round(s.sg1 * (income - s.E0) + np.pow(income - s.E0, 2)*s.p1, 2)
+    elif s.E1 < income <= s.E2:
+        S1 = s.sg1 * (s.E1 - s.E0) + np.pow(s.E1 - s.E0, 2)*s.p1
+        return round(s.sg2 * (income - s.E1) + np.pow(income - s.E1, 2)*s.p2 + S1, 2)
+    elif s.E2 < income <= s.E3:
+        return round(s.sg3*income - np.abs(s.C3), 2)
+    else:
+        return round(s.sg4 * income - np.abs(s.C4), 2)
+
+
+def reference_social_security_tax(income: float, tax_schedule) -> float:
+    s = tax_schedule
+    rate = s.medical_insurance_rate + s.pension_insurance_rate + s.unemployment_insurance_rate
+
+    if income <= s.social_security_lower_limit:
+        return 0
+    elif income <= s.social_security_upper_limit:
+        return income * rate
+    else:
+        return s.social_security_upper_limit * rate
+
+
+def reference_post_tax_income(income: float, tax_schedule) -> float:
+    return income - reference_income_tax(income, tax_schedule) - reference_social_security_tax(income, tax_schedule)
+
+
+def reference_number_of_years(interest_rate_annual: float, interest_rate_low_risk: float, annual_income: float, annual_income_cap: float,
+                              income_support: float, tax_schedule) -> tuple:
+    years = 0
+    total_capital = 0
+
+    income_tax = reference_income_tax(annual_income, tax_schedule)
+    total_required_capital = reference_post_tax_income(min(annual_income, annual_income_cap), tax_schedule) / interest_rate_low_risk
+
+    while total_capital < total_required_capital:
+        total_capital = total_capital * (1 + interest_rate_annual) + income_tax + income_support
+        years += 1
+
+        if years > 100:
+            break
+
+    return years, total_required_capital
+
+
+def reference_income_support(income_distribution: list, annual_income_cap: float, number_of_citizens: float, economy_subsidy: float,
+                             tax_schedule) -> tuple:
+    support_per_income_bracket = np.zeros(len(income_distribution))
+    income_tax_at_cap = reference_income_tax(annual_income_cap, tax_schedule)
+
+    accumulated_income_tax_under_cap = 0
+    accumulated_income_tax_over_cap = 0
+    total_percentage_below_income_cap = 0
+
+    for i, (annual_income, percentage) in enumerate(income_distribution):
+        income_tax_deviation_from_cap = income_tax_at_cap - reference_income_tax(annual_income, tax_schedule)
+
+        if annual_income < annual_income_cap:
+            accumulated_income_tax_under_cap += income_tax_deviation_from_cap * percentage
+            total_percentage_below_income_cap += percentage
+        else:
+            accumulated_income_tax_over_cap += income_tax_deviation_from_cap * percentage
+            support_per_income_bracket[i] = income_tax_deviation_from_cap
+
+    accumulated_support_difference = accumulated_income_tax_under_cap - np.abs(accumulated_income_tax_over_cap)
+    number_of_citizens_below_income_cap = number_of_citizens * total_percentage_below_income_cap
+
+    for i, (annual_income, percentage) in enumerate(income_distribution):
+        if annual_income <= annual_income_cap:
+            support_per_income_bracket[i] = ((np.abs(accumulated_income_tax_over_cap) + economy_subsidy/number_of_citizens_below_income_cap)
+                                             * percentage / total_percentage_below_income_cap)
+
+    return support_per_income_bracket, accumulated_support_difference
+
+
+def get_random_income_distribution(rng: np.random.Generator, number_of_brackets: int = 40) -> list:
+    annual_incomes = np.sort(rng.choice(np.arange(5e3, 600e3, 250.0), number_of_brackets, replace=False))
+    probabilities = rng.random(number_of_brackets)
+
+    return [[float(annual_income), float(probability)] for annual_income, probability in zip(annual_incomes, probabilities / probabilities.sum())]
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(7)
+
+
+@pytest.mark.parametrize("year", sorted(tax_schedules))
+def test_income_taxes_match_scalar_formula(rng, year):
+    tax_schedule = tax_schedules[year]
+    # Random incomes and all zone boundaries, where the zone lookup matters most
+    boundaries = np.array([tax_schedule.E0, tax_schedule.E1, tax_schedule.E2, tax_schedule.E3])
+    incomes = np.concatenate([rng.uniform(-1e3, 1e6, 2000), boundaries, boundaries + 0.01, [0.0]])
+
+    income_tax = TaxCalculator.calculate_german_income_tax(incomes, year)
+    social_security_tax = TaxCalculator.calculate_german_social_security_tax(incomes, year)
+
+    np.testing.assert_allclose(income_tax, [reference_income_tax(income, tax_schedule) for income in incomes], rtol=0, atol=0.011)
+    np.testing.assert_allclose(social_security_tax, [reference_social_security_tax(income, tax_schedule) for income in incomes], rtol=1e-12)
+    np.testing.assert_allclose(TaxCalculator.calculcate_post_tax_income(incomes, year),
+                               [reference_post_tax_income(income, tax_schedule) for income in incomes], rtol=0, atol=0.011)
+
+    # Single values give floats, arrays keep their shape
+    assert isinstance(TaxCalculator.calculate_german_income_tax(50e3, year), float)
+    assert TaxCalculator.calculate_german_income_tax(incomes[:2000].reshape(-1, 2), year).shape == (1000, 2)
+
+
+@pytest.mark.parametrize("year", sorted(tax_schedules))
+def test_number_of_years_matches_yearly_loop(rng, year):
+    tax_schedule = tax_schedules[year]
+    size = 2000
+
+    interest_rates = rng.choice([0.01, 0.03, 0.05, 0.07, 0.14, 0.2], size)
+    interest_rates_low_risk = rng.choice([0.02, 0.03, 0.05], size)
+    annual_incomes = rng.uniform(5e3, 500e3, size)
+    annual_income_caps = rng.choice([50e3, 100e3, 200e3, 1e9], size)
+    income_support = rng.choice([0.0, 500.0, 5e3], size)
+
+    years, required_capital = calculate_number_of_years_batched(interest_rates, interest_rates_low_risk, annual_incomes, annual_income_caps,
+                                                                income_support, tax_schedule=year)
+    reference = [reference_number_of_years(*scenario, tax_schedule)
+                 for scenario in zip(interest_rates, interest_rates_low_risk, annual_incomes, annual_income_caps, income_support)]
+
+    np.testing.assert_array_equal(years, [reference_years for reference_years, _ in reference])
+    np.testing.assert_allclose(required_capital, [reference_capital for _, reference_capital in reference], rtol=1e-9)
+
+    assert calculate_number_of_years(0.07, 0.05, 60e3, 100e3, 1e3, year) == reference_number_of_years(0.07, 0.05, 60e3, 100e3, 1e3, tax_schedule)
+
+
+@pytest.mark.parametrize("year", sorted(tax_schedules))
+def test_pretax_income_inverts_post_tax_income(rng, year):
+    tax_schedule = tax_schedules[year]
+    tolerance = 0.1
+
+    # Above the social security limit the net income is increasing, so the pretax income is unique
+    income_pretax = rng.uniform(1.5 * tax_schedule.social_security_lower_limit, 2e6, 2000)
+    income_net = TaxCalculator.calculcate_post_tax_income(income_pretax, year)
+
+    inverted = TaxCalculator.calculate_pretax_income(income_net, tolerance, tax_schedule=year)
+
+    # The income tax is rounded to cents, which adds up to a cent per EUR of the marginal rate
+    np.testing.assert_allclose(inverted, income_pretax, rtol=0, atol=tolerance + 0.05)
+    np.testing.assert_allclose(TaxCalculator.calculate_pretax_income(float(income_net[0]), tolerance, tax_schedule=year), income_pretax[0],
+                               rtol=0, atol=tolerance + 0.05)
+
+    # Below the first taxed income nothing is deducted
+    np.testing.assert_allclose(TaxCalculator.calculate_pretax_income(np.array([0.0, 5e3]), tolerance, tax_schedule=year), [0.0, 5e3],
+                               rtol=0, atol=tolerance)
+
+
+def test_pretax_income_of_non_finite_net_income_is_nan():
+    inverted = TaxCalculator.calculate_pretax_income(np.array([[np.nan, 40e3], [np.inf, -np.inf]]))
+
+    assert inverted.shape == (2, 2)
+    assert np.isnan(inverted[0, 0]) and np.isnan(inverted[1]).all()
+    assert np.isfinite(inverted[0, 1])
+    assert np.isnan(TaxCalculator.calculate_pretax_income(np.nan))
+
+
+@pytest.mark.parametrize("year", sorted(tax_schedules))
+def test_income_support_matches_loop_over_brackets(rng, year):
+    tax_schedule = tax_schedules[year]
+    income_distribution = get_random_income_distribution(rng)
+    annual_incomes = np.array(income_distribution)[:, 0]
+
+    # Caps between brackets and exactly at a bracket, every cap has brackets below it
+    annual_income_caps = np.concatenate([rng.uniform(annual_incomes[1], annual_incomes[-1] * 1.5, 8), annual_incomes[[5, 20]]])
+    economy_subsidies = np.array([0, 300e9, 1000e9])
+    number_of_citizens = 83e6
+
+    support, support_difference = calculate_income_support_batched(income_distribution, annual_income_caps, number_of_citizens, economy_subsidies, year)
+
+    for i, annual_income_cap in enumerate(annual_income_caps):
+        for j, economy_subsidy in enumerate(economy_subsidies):
+            reference_support, reference_difference = reference_income_support(income_distribution, annual_income_cap, number_of_citizens,
+                                                                               economy_subsidy, tax_schedule)
+            single_support, single_difference = calculate_income_support(income_distribution, annual_income_cap, number_of_citizens,
+                                                                         economy_subsidy, year)
+
+            np.testing.assert_allclose(support[i, j], reference_support, rtol=1e-9, atol=1e-6)
+            np.testing.assert_allclose(single_support, reference_support, rtol=1e-9, atol=1e-6)
+            np.testing.assert_allclose([support_difference[i], single_difference], reference_difference, rtol=1e-9, atol=1e-3)
+
+
+def test_income_support_without_brackets_below_the_cap_is_nan():
+    income_distribution = [[30e3, 0.5], [60e3, 0.5]]
+
+    # At the first bracket, there is no bracket below the cap among which its support could be distributed
+    support, _ = calculate_income_support_batched(income_distribution, np.array([30e3, 45e3]), 83e6, np.array([0, 300e9]))
+
+    assert np.isnan(support[0, :, 0]).all()
+    assert np.isfinite(support[0, :, 1]).all() and np.isfinite(support[1]).all()
+
+
+def test_binned_distribution_normalizes_rebins_and_merges():
+    counts = BinnedIncomeDistribution.from_list(IncomeDistribution.income_distribution_us_annual_pretax_2022)
+    income_distribution = counts.normalize()
+
+    assert income_distribution.total_weight == pytest.approx(1.0)
+    assert income_distribution.to_list() == [[income, weight / counts.total_weight] for income, weight in counts.to_list()]
+    with pytest.raises(ValueError):
+        income_distribution.annual_incomes[0] = 0
+
+    # Rebinning to every second old edge adds up the weights of neighbouring bins
+    bin_edges, cumulative_weights = income_distribution.get_cumulative_weights()
+    rebinned = income_distribution.rebin(bin_edges[::2])
+    np.testing.assert_allclose(rebinned.weights, np.diff(cumulative_weights[::2]))
+    np.testing.assert_allclose(rebinned.annual_incomes, (bin_edges[:-2:2] + bin_edges[2::2]) / 2)
+
+    # Merging two halves of a distribution gives the distribution again, mixing normalized distributions gives probabilities
+    merged = BinnedIncomeDistribution.merge([counts.to_list()[::2], counts.to_list()[1::2]])
+    order = np.argsort(counts.annual_incomes)
+    np.testing.assert_array_equal(merged.annual_incomes, counts.annual_incomes[order])
+    np.testing.assert_allclose(merged.weights, counts.weights[order])
+    assert BinnedIncomeDistribution.mix([counts, [[50e3, 1.0]]], [0.5, 0.5]).total_weight == pytest.approx(1.0)
+
+
+def test_binned_distribution_gives_the_same_results_as_lists():
+    income_distribution = IncomeDistribution.cutoff_income_distribution(IncomeDistribution.income_distribution_germany_annual_pretax_2025, 20e3)
+    binned = BinnedIncomeDistribution.from_list(income_distribution)
+
+    support, difference = calculate_income_support(income_distribution, 100e3, 83e6, 300e9)
+    binned_support, binned_difference = calculate_income_support(binned, 100e3, 83e6, 300e9)
+
+    np.testing.assert_array_equal(binned_support, support)
+    assert binned_difference == difference
+    assert binned.get_bin_edges()[1][0] == binned.quantile(0.0) < binned.quantile(0.5) < binned.quantile(1.0) == binned.get_bin_edges()[1][-1]